@@ -0,0 +1,2 @@
+"""Performance benchmarks of the indexer, each module can be run with
+`python -m benchmarks.<module> --help`"""
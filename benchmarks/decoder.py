@@ -0,0 +1,106 @@
+"""Decoded events per second before and after the precompiled decoder registry
+
+    python -m benchmarks.decoder --events 20000
+
+"before" is the per-event deserialization that was used by the handler: the
+contract is looked up, the events ABI is rebuilt, a new CairoSerializer is
+created and the deserializers signatures are inspected for every event.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import click
+from apibara import Info
+from apibara.model import BlockHeader, StarkNetEvent
+from cachetools import LRUCache
+from starknet_py.utils.data_transformer.data_transformer import CairoSerializer
+
+from dao.indexer.deserializer import DecoderRegistry, deserializers
+from dao.indexer.handler import ALL_EVENTS
+from dao.utils import async_cached, function_accepts, get_contract_events
+
+from . import events
+
+
+def legacy_deserializer(contract):
+    @async_cached(cache=LRUCache(maxsize=128))
+    async def get_contract(address, client):
+        return contract
+
+    async def deserialize_starknet_event(
+        fields: dict, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
+    ) -> dict:
+        contract = await get_contract(
+            starknet_event.address.hex(), info.context["starknet_client"]
+        )
+        contract_events = get_contract_events(contract)
+        emitted_event_abi = contract_events[starknet_event.name]
+        cairo_serializer = CairoSerializer(contract.data.identifier_manager)
+        event_data = [int.from_bytes(b, "big") for b in starknet_event.data]
+        python_data = cairo_serializer.to_python(
+            value_types=emitted_event_abi["data"], values=event_data
+        )
+
+        kwargs = {}
+        for name, field_type in fields.items():
+            deserializer = deserializers[field_type]
+            value = getattr(python_data, name)
+            if function_accepts(deserializer, ("info", "block", "starknet_event")):
+                value = deserializer(
+                    value, info=info, block=block, starknet_event=starknet_event
+                )
+            else:
+                value = deserializer(value)
+            if asyncio.iscoroutine(value):
+                value = await value
+            kwargs[name] = value
+        return kwargs
+
+    return deserialize_starknet_event
+
+
+async def run(count: int) -> dict[str, float]:
+    contract = events.build_contract(ALL_EVENTS)
+    block = events.build_block(1)
+    event_mix = events.random_event_mix(ALL_EVENTS, count, block.number)
+    info = SimpleNamespace(context={"starknet_client": contract.client})
+
+    legacy = legacy_deserializer(contract)
+    start = time.perf_counter()
+    for starknet_event in event_mix:
+        await legacy(
+            fields=ALL_EVENTS[starknet_event.name].__annotations__,
+            info=info,
+            block=block,
+            starknet_event=starknet_event,
+        )
+    before = count / (time.perf_counter() - start)
+
+    registry = DecoderRegistry()
+    registry.add_contract(events.felt(events.CONTRACT_ADDRESS), contract)
+    start = time.perf_counter()
+    for starknet_event in event_mix:
+        await registry.decode(
+            event_class=ALL_EVENTS[starknet_event.name],
+            info=info,
+            block=block,
+            starknet_event=starknet_event,
+        )
+    after = count / (time.perf_counter() - start)
+
+    return {"before": before, "after": after}
+
+
+@click.command()
+@click.option("--events", "count", default=10_000, show_default=True)
+def main(count):
+    """Benchmark the deserialization of a mix of DAO events."""
+    result = asyncio.run(run(count))
+    print(f"before: {result['before']:>10.0f} events/s")
+    print(f"after:  {result['after']:>10.0f} events/s")
+    print(f"speedup: {result['after'] / result['before']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,119 @@
+"""Synthetic StarkNet events built from the indexer event classes"""
+import random
+from datetime import datetime, timezone
+from typing import Type
+
+from apibara.model import BlockHeader, StarkNetEvent
+from starknet_py.contract import Contract
+from starknet_py.net.gateway_client import GatewayClient
+
+from dao import config
+from dao.indexer.base_event import BaseEvent
+from dao.indexer.deserializer import BlockNumber
+from dao.utils import str_to_felt
+
+CONTRACT_ADDRESS = 0xDA0
+
+# Share of each event in a typical DAO activity
+EVENT_MIX = {
+    "VoteSubmitted": 35,
+    "UserTokenBalanceIncreased": 20,
+    "UserTokenBalanceDecreased": 15,
+    "MemberUpdated": 8,
+    "ProposalAdded": 5,
+    "ProposalStatusUpdated": 5,
+    "MemberAdded": 4,
+    "OnboardProposalAdded": 3,
+    "RoleGranted": 2,
+    "SwapProposalAdded": 1,
+    "TokenWhitelisted": 1,
+    "WhitelistProposalAdded": 1,
+}
+
+
+def felt(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def build_abi(event_classes: dict[str, Type[BaseEvent]]) -> list[dict]:
+    """Build the events ABI of the DAO contract, all fields are felts"""
+    return [
+        {
+            "name": name,
+            "type": "event",
+            "keys": [],
+            "data": [
+                {"name": field, "type": "felt"} for field in event_class.__annotations__
+            ],
+        }
+        for name, event_class in event_classes.items()
+    ]
+
+
+def build_contract(event_classes: dict[str, Type[BaseEvent]]) -> Contract:
+    return Contract(
+        address=CONTRACT_ADDRESS,
+        abi=build_abi(event_classes),
+        client=GatewayClient(config.starknet_network_url),
+    )
+
+
+def build_block(number: int) -> BlockHeader:
+    return BlockHeader(
+        hash=felt(number),
+        parent_hash=felt(number - 1),
+        number=number,
+        timestamp=datetime.fromtimestamp(1_668_729_600 + number * 60, timezone.utc),
+    )
+
+
+def random_felt(field_type: Type, block_number: int, rng: random.Random) -> int:
+    if field_type is BlockNumber:
+        return block_number
+    if field_type is bool:
+        return rng.randint(0, 1)
+    if field_type is str:
+        return str_to_felt(rng.choice(["Signaling", "Onboard", "Token", "admin"]))
+    if field_type is bytes:
+        return rng.randint(1, 2**64)
+    return rng.randint(0, 10**6)
+
+
+def build_event(
+    name: str,
+    values: list[int],
+    log_index: int,
+    transaction_hash: int,
+) -> StarkNetEvent:
+    return StarkNetEvent(
+        address=felt(CONTRACT_ADDRESS),
+        log_index=log_index,
+        topics=[],
+        data=[felt(value) for value in values],
+        transaction_hash=felt(transaction_hash),
+        name=name,
+    )
+
+
+def random_event_mix(
+    event_classes: dict[str, Type[BaseEvent]],
+    count: int,
+    block_number: int,
+    seed: int = 0,
+) -> list[StarkNetEvent]:
+    """Random events following EVENT_MIX, values have the right types but no
+    meaning"""
+    rng = random.Random(seed)
+    names = rng.choices(list(EVENT_MIX), weights=list(EVENT_MIX.values()), k=count)
+    return [
+        build_event(
+            name=name,
+            values=[
+                random_felt(field_type, block_number, rng)
+                for field_type in event_classes[name].__annotations__.values()
+            ],
+            log_index=index,
+            transaction_hash=index,
+        )
+        for index, name in enumerate(names)
+    ]
@@ -0,0 +1,80 @@
+"""Bytes written per event with the copy and the delta versioning
+
+    python -m benchmarks.versioning --members 100 --transfers 2000
+
+"copy" inserts a new version of a document for every update, "delta" updates
+the document in place and writes the previous values of the changed fields to
+the undo log. Both run the same synthetic workload, see benchmarks.workload.
+"""
+import asyncio
+import os
+
+import click
+import mongomock
+
+from dao import config
+from dao.indexer.batch import COPY_VERSIONING, DELTA_VERSIONING
+
+from . import ingestion, workload
+
+
+def stored_bytes(db) -> int:
+    return sum(
+        ingestion.bson_size(*db[collection].find())
+        for collection in db.list_collection_names()
+    )
+
+
+async def run(dao_workload: workload.Workload) -> dict[str, dict]:
+    # mongomock doesn't support validators
+    os.environ["USING_MONGOMOCK"] = "true"
+
+    results = {}
+    for versioning in (COPY_VERSIONING, DELTA_VERSIONING):
+        config.set("versioning", versioning)
+        db = mongomock.MongoClient(tz_aware=True).benchmark_versioning
+        report = await ingestion.run(db, dao_workload)
+        results[versioning] = {
+            "bytes_per_event": report["bytes_per_event"],
+            "operations_per_event": report["operations_per_event"],
+            "stored_bytes": stored_bytes(db),
+        }
+    return results
+
+
+@click.command()
+@click.option("--members", default=100, show_default=True)
+@click.option("--proposals", default=50, show_default=True)
+@click.option("--votes-per-proposal", default=20, show_default=True)
+@click.option("--transfers", default=500, show_default=True)
+@click.option("--events-per-block", default=20, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+def main(members, proposals, votes_per_proposal, transfers, events_per_block, seed):
+    """Compare the bytes written per event of the versioning strategies."""
+    results = asyncio.run(
+        run(
+            workload.Workload(
+                members=members,
+                proposals=proposals,
+                votes_per_proposal=votes_per_proposal,
+                transfers=transfers,
+                events_per_block=events_per_block,
+                seed=seed,
+            )
+        )
+    )
+
+    print(f"{'versioning':<12}{'bytes/event':>14}{'ops/event':>12}{'stored bytes':>16}")
+    for versioning, result in results.items():
+        print(
+            f"{versioning:<12}{result['bytes_per_event']:>14.0f}"
+            f"{result['operations_per_event']:>12.2f}{result['stored_bytes']:>16}"
+        )
+    copy, delta = results[COPY_VERSIONING], results[DELTA_VERSIONING]
+    print(
+        f"delta writes {copy['bytes_per_event'] / delta['bytes_per_event']:.2f}x less"
+    )
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,117 @@
+"""Synthetic DAO activity: onboarding, proposals, votes and token transfers"""
+import random
+from dataclasses import dataclass
+from typing import Iterator
+
+from apibara.model import NewEvents, StarkNetEvent
+
+from dao import config
+from dao.utils import str_to_felt
+
+from .events import build_block, build_event
+
+TOKEN_ADDRESS = 0x70CE
+PROPOSAL_TYPE = "Signaling"
+# Placeholder of the BlockNumber values, replaced by the emitting block number
+CURRENT_BLOCK = None
+
+
+@dataclass
+class Workload:
+    members: int = 100
+    proposals: int = 50
+    votes_per_proposal: int = 20
+    transfers: int = 500
+    events_per_block: int = 20
+    seed: int = 0
+
+
+def member_address(index: int) -> int:
+    return 0x1000 + index
+
+
+def activity(workload: Workload) -> Iterator[tuple[str, list[int]]]:
+    """Yields the name and the values of the events, in the order a DAO would
+    emit them"""
+    rng = random.Random(workload.seed)
+    members = [member_address(index) for index in range(workload.members)]
+
+    yield "ProposalParamsUpdated", [str_to_felt(PROPOSAL_TYPE), 50, 30, 60, 60]
+    yield "TokenWhitelisted", [str_to_felt("Token"), TOKEN_ADDRESS]
+
+    for address in members:
+        yield "MemberAdded", [address, rng.randint(1, 100), 0, CURRENT_BLOCK]
+    yield "RoleGranted", [members[0], str_to_felt("admin"), members[0]]
+
+    transfers_per_proposal = workload.transfers // max(workload.proposals, 1)
+    for proposal_id in range(workload.proposals):
+        submitter = rng.choice(members)
+        yield "ProposalAdded", [
+            proposal_id,
+            str_to_felt(f"Proposal {proposal_id}"),
+            str_to_felt(PROPOSAL_TYPE),
+            str_to_felt("https://"),
+            CURRENT_BLOCK,
+            submitter,
+        ]
+
+        voters = rng.sample(members, min(workload.votes_per_proposal, len(members)))
+        yes = 0
+        for voter in voters:
+            vote = rng.random() < 0.6
+            yes += vote
+            yield "VoteSubmitted", [voter, proposal_id, int(vote), voter]
+
+        status = "approved" if yes * 2 > len(voters) else "rejected"
+        yield "ProposalStatusUpdated", [proposal_id, str_to_felt(status)]
+
+        for _ in range(transfers_per_proposal):
+            member = rng.choice(members + [config.bank_address])
+            name = rng.choice(
+                ["UserTokenBalanceIncreased", "UserTokenBalanceDecreased"]
+            )
+            yield name, [member, TOKEN_ADDRESS, rng.randint(1, 1000)]
+
+        if rng.random() < 0.2:
+            yield "MemberUpdated", [
+                submitter,
+                submitter,
+                rng.randint(1, 100),
+                0,
+                0,
+                proposal_id,
+                CURRENT_BLOCK,
+            ]
+
+
+def generate(workload: Workload, first_block: int = 1) -> list[NewEvents]:
+    """Group the DAO activity in blocks of `events_per_block` events"""
+    blocks: list[NewEvents] = []
+    events: list[StarkNetEvent] = []
+    block_number = first_block
+
+    def close_block():
+        nonlocal events, block_number
+        blocks.append(NewEvents(block=build_block(block_number), events=events))
+        events = []
+        block_number += 1
+
+    for name, values in activity(workload):
+        events.append(
+            build_event(
+                name=name,
+                values=[
+                    block_number if value is CURRENT_BLOCK else value
+                    for value in values
+                ],
+                log_index=len(events),
+                transaction_hash=block_number * 1000 + len(events),
+            )
+        )
+        if len(events) == workload.events_per_block:
+            close_block()
+
+    if events:
+        close_block()
+
+    return blocks
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 import strawberry
 from strawberry.types import Info
@@ -23,37 +24,50 @@ class UnWhitelistedToken:
 
 @strawberry.type
 class Bank(FromMongoMixin):
+    daoAddress: Optional[HexValue] = None
     bankAddress: HexValue
     whitelistedTokens: list[WhitelistedToken]
     unWhitelistedTokens: list[UnWhitelistedToken]
     balances: list[Balance]
-    transactions: list[Transaction]
     totalShares: int = 0
     totalLoot: int = 0
 
+    @strawberry.field
+    async def transactions(
+        self, info, skip: int = 0, limit: int = 10
+    ) -> list[Transaction]:
+        transactions = await storage.list_transactions(
+            info=info,
+            owner_address=self.bankAddress,
+            skip=skip,
+            limit=limit,
+            dao_address=self.daoAddress,
+        )
+        return [Transaction.from_mongo(doc) for doc in transactions]
+
     @classmethod
     def from_mongo(cls, data: dict):
         data["balances"] = [Balance(**balance) for balance in data.get("balances", [])]
-        data["transactions"] = [
-            Transaction(**transaction) for transaction in data.get("transactions", [])
-        ]
+        # Transactions are resolved from their own collection
+        data.pop("transactions", None)
 
+        unwhitelisted_tokens = data.get("unWhitelistedTokens", [])
         unwhitelisted_addresses = [
-            token["tokenAddress"] for token in data["unWhitelistedTokens"]
+            token["tokenAddress"] for token in unwhitelisted_tokens
         ]
         data["whitelistedTokens"] = [
             WhitelistedToken(**token)
-            for token in data["whitelistedTokens"]
+            for token in data.get("whitelistedTokens", [])
             if token["tokenAddress"] not in unwhitelisted_addresses
         ]
 
         data["unWhitelistedTokens"] = [
-            UnWhitelistedToken(**token) for token in data["unWhitelistedTokens"]
+            UnWhitelistedToken(**token) for token in unwhitelisted_tokens
         ]
 
         return super().from_mongo(data)
 
 
-def get_bank(info: Info) -> Bank:
-    bank = storage.get_bank(info=info)
+async def get_bank(info: Info, daoAddress: Optional[HexValue] = None) -> Bank:
+    bank = await storage.get_bank(info=info, dao_address=daoAddress)
     return Bank.from_mongo(bank)
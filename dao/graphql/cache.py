@@ -0,0 +1,229 @@
+"""Response cache of the GraphQL server
+
+The data only changes when the indexer writes a block, the responses of the
+queries are cached until the indexed head block moves. The fields depending on
+the time of the request, like the status of a proposal, give the time their
+value changes with `cache_hint`, and the response expires at the earliest one.
+
+An outdated response is still served during `stale_while_revalidate` seconds
+while the query runs again in the background, the concurrent requests of a
+query missing from the cache share one execution.
+"""
+import asyncio
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+from cachetools import LRUCache
+from graphql import (
+    GraphQLError,
+    OperationDefinitionNode,
+    OperationType,
+    parse,
+    print_ast,
+)
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+from strawberry.aiohttp.handlers import HTTPHandler
+from strawberry.http import GraphQLRequestData
+from strawberry.types import Info
+
+from dao import utils
+from dao.indexer.undo import FLUSHED_COLLECTION
+
+from . import logger
+
+Execute = Callable[[], Awaitable[tuple[dict, Optional[datetime]]]]
+
+
+def cache_hint(info: Optional[Info], expires_at: datetime):
+    """The field resolved changes at `expires_at` even if no block is indexed,
+    the response of the request isn't served from the cache after it"""
+    if info is None:
+        return
+    current = info.context.get("cache_expires_at")
+    if current is None or expires_at < current:
+        info.context["cache_expires_at"] = expires_at
+
+
+def cache_key(request_data: GraphQLRequestData) -> Optional[str]:
+    """Key of the response of a query, the query is normalized so its formatting
+    doesn't matter. None for the requests which aren't cached: mutations,
+    subscriptions and invalid documents."""
+    try:
+        document = parse(request_data.query)
+    except GraphQLError:
+        return None
+
+    operations = [
+        definition
+        for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+        and (
+            request_data.operation_name is None
+            or (
+                definition.name and definition.name.value == request_data.operation_name
+            )
+        )
+    ]
+    if len(operations) != 1 or operations[0].operation is not OperationType.QUERY:
+        return None
+
+    return json.dumps(
+        [print_ast(document), request_data.variables, request_data.operation_name],
+        sort_keys=True,
+    )
+
+
+class IndexedHead:
+    """Last block whose writes were all flushed by the indexer, polled every
+    `interval` seconds from the marker of the undo log, see
+    undo.FLUSHED_COLLECTION. The `indexed_to` block of apibara runs ahead of
+    the writes during a backfill. A reorganization rewinding the indexer and
+    indexing the same number of blocks between two polls isn't seen.
+
+    The `listeners` are awaited with the head block after each poll.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, interval: float):
+        self.db = db
+        self.interval = interval
+        self.block_number: Optional[int] = None
+        self.changed_at = utils.utcnow()
+        self.listeners: list[Callable[[Optional[int]], Awaitable[None]]] = []
+
+    async def poll(self):
+        state = await self.db[FLUSHED_COLLECTION].find_one({"_id": FLUSHED_COLLECTION})
+        block_number = (state or {}).get("block")
+        if block_number != self.block_number:
+            logger.debug("Indexed head block=%s", block_number)
+            self.block_number = block_number
+            self.changed_at = utils.utcnow()
+
+        for listener in self.listeners:
+            await listener(block_number)
+
+    async def watch(self):
+        while True:
+            try:
+                await self.poll()
+            except PyMongoError as error:
+                logger.warning("Cannot read the indexed head block: %s", error)
+            await asyncio.sleep(self.interval)
+
+
+@dataclass
+class CachedResponse:
+    data: dict
+    # Indexed head block when the query was executed
+    block_number: Optional[int]
+    # Earliest change of a time dependent field, see cache_hint
+    expires_at: Optional[datetime]
+
+
+class ResponseCache:
+    """Responses of the queries by cache_key, for the indexed `head` block
+
+    The `max_entries` most recently used responses are kept.
+    """
+
+    def __init__(
+        self, head: IndexedHead, max_entries: int, stale_while_revalidate: float
+    ):
+        self.head = head
+        self.stale_while_revalidate = timedelta(seconds=stale_while_revalidate)
+        self._responses: LRUCache = LRUCache(maxsize=max_entries)
+        self._pending: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def stale_since(self, response: CachedResponse) -> Optional[datetime]:
+        """When the response became outdated, None while it's up to date"""
+        outdated = []
+        if response.block_number != self.head.block_number:
+            outdated.append(self.head.changed_at)
+        if response.expires_at is not None and response.expires_at <= utils.utcnow():
+            outdated.append(response.expires_at)
+        return min(outdated, default=None)
+
+    async def get(self, key: str, execute: Execute) -> tuple[dict, str]:
+        """Response of the query of `key` and whether it was a cache "HIT", a
+        "STALE" hit or a "MISS". `execute` runs the query and returns its
+        response with the time it expires."""
+        response = self._responses.get(key)
+        if response is not None:
+            stale_since = self.stale_since(response)
+            if stale_since is None:
+                self.hits += 1
+                return response.data, "HIT"
+            if utils.utcnow() - stale_since <= self.stale_while_revalidate:
+                self.stale_hits += 1
+                self._execute(key, execute)
+                return response.data, "STALE"
+
+        self.misses += 1
+        # Shielded, a cancelled request doesn't cancel the other requests waiting
+        # for the query
+        return await asyncio.shield(self._execute(key, execute)), "MISS"
+
+    def _execute(self, key: str, execute: Execute) -> asyncio.Future:
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._store(key, execute))
+            self._pending[key].add_done_callback(self._log_error)
+        return self._pending[key]
+
+    async def _store(self, key: str, execute: Execute) -> dict:
+        # Read before the execution, a block indexed meanwhile outdates the response
+        block_number = self.head.block_number
+        try:
+            data, expires_at = await execute()
+            if not data.get("errors"):
+                self._responses[key] = CachedResponse(
+                    data=data, block_number=block_number, expires_at=expires_at
+                )
+            return data
+        finally:
+            del self._pending[key]
+
+    @staticmethod
+    def _log_error(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                "Query of the response cache failed", exc_info=future.exception()
+            )
+
+
+class CachingHTTPHandler(HTTPHandler):
+    """Answers the queries from the response cache, the other requests are
+    executed as usual"""
+
+    def __init__(self, cache: ResponseCache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    async def execute_request(
+        self, request: web.Request, request_data: GraphQLRequestData, method
+    ) -> web.StreamResponse:
+        key = cache_key(request_data)
+        if key is None:
+            return await super().execute_request(
+                request=request, request_data=request_data, method=method
+            )
+
+        async def execute() -> tuple[dict, Optional[datetime]]:
+            context = await self.get_context(request, web.Response())
+            result = await self.schema.execute(
+                query=request_data.query,
+                root_value=await self.get_root_value(request),
+                variable_values=request_data.variables,
+                context_value=context,
+                operation_name=request_data.operation_name,
+            )
+            data = await self.process_result(request, result)
+            return data, context.get("cache_expires_at")
+
+        data, status = await self.cache.get(key, execute)
+        return web.json_response(data, headers={"X-Cache": status})
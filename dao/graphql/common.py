@@ -56,7 +56,7 @@ class Balance:
 
 
 @strawberry.type
-class Transaction:
+class Transaction(FromMongoMixin):
     tokenAddress: HexValue
     timestamp: datetime
     amount: int
@@ -0,0 +1,269 @@
+"""Static cost of the GraphQL queries
+
+The cost of a query is computed from its document before it's executed: each
+field reading MongoDB has a weight, see FIELD_WEIGHTS, and the cost of the
+fields selected on the items of a list is multiplied by the `limit` of the
+list. The queries over `graphql_query_max_cost` or nested deeper than
+`graphql_query_max_depth` are rejected.
+
+The queries executed concurrently share the `graphql_cost_capacity` of the
+server, a query waits for its cost to be available up to
+`graphql_cost_queue_timeout` seconds, see Admission.
+"""
+import asyncio
+from typing import Optional, Union
+
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLInterfaceType,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+)
+from graphql.execution import ExecutionResult as GraphQLExecutionResult
+from graphql.execution.values import get_argument_values, get_variable_values
+from strawberry.extensions import Extension
+
+from dao import config
+
+ParentType = Union[GraphQLObjectType, GraphQLInterfaceType]
+
+# Cost units of the fields by "Type.field", the other fields are read from the
+# documents already loaded and cost nothing. The fields of the proposal types
+# are weighted on the Proposal interface.
+FIELD_WEIGHTS = {
+    # One query per list, or per item for the transactions
+    "Query.proposals": 1,
+    "Query.members": 1,
+    "Query.bank": 1,
+    "Member.transactions": 1,
+    "Bank.transactions": 1,
+    # The bank and its totals
+    "Member.percentageOfTreasury": 1,
+    "Member.votingWeight": 1,
+    # The members who can vote on the proposal
+    "Proposal.totalVotableShares": 2,
+    "Proposal.currentQuorum": 2,
+    # The status, which needs the quorum once the voting period ended
+    "Proposal.status": 2,
+    "Proposal.active": 2,
+    "Proposal.timeRemaining": 2,
+    "Proposal.approvedToProcessAt": 2,
+    "Proposal.rejectedToProcessAt": 2,
+    "Proposal.approvedAt": 2,
+    "Proposal.rejectedAt": 2,
+    "Proposal.processedAt": 2,
+}
+
+
+class QueryCostError(Exception):
+    pass
+
+
+def field_weight(parent_type: ParentType, field_name: str) -> int:
+    for type_ in (parent_type, *parent_type.interfaces):
+        weight = FIELD_WEIGHTS.get(f"{type_.name}.{field_name}")
+        if weight is not None:
+            return weight
+    return 0
+
+
+def list_size(arguments: dict) -> int:
+    """Items of a list of the response, a list without a positive `limit` is
+    counted as `graphql_query_unbounded_list_size` items"""
+    limit = arguments.get("limit")
+    if limit is not None and limit <= 0:
+        return config.graphql_query_unbounded_list_size
+    return limit or 1
+
+
+class QueryCostCalculator:
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        fragments: dict[str, FragmentDefinitionNode],
+        variables: dict,
+    ):
+        self.schema = schema
+        self.fragments = fragments
+        # Coerced to the types of the variable definitions
+        self.variables = variables
+
+    def selection_cost(
+        self, parent_type: ParentType, selection_set: SelectionSetNode, depth: int
+    ) -> tuple[int, int]:
+        """Cost and depth of the fields selected at `depth` on `parent_type`"""
+        cost = 0
+        max_depth = depth - 1
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self.field_cost(parent_type, selection, depth)
+            else:
+                if isinstance(selection, FragmentSpreadNode):
+                    fragment = self.fragments[selection.name.value]
+                else:
+                    fragment = selection
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = self.schema.get_type(
+                        fragment.type_condition.name.value
+                    )
+                field_cost, field_depth = self.selection_cost(
+                    fragment_type, fragment.selection_set, depth
+                )
+            cost += field_cost
+            max_depth = max(max_depth, field_depth)
+        return cost, max_depth
+
+    def field_cost(
+        self, parent_type: ParentType, node: FieldNode, depth: int
+    ) -> tuple[int, int]:
+        name = node.name.value
+        # Introspection
+        if name.startswith("__"):
+            return 0, 0
+
+        field = parent_type.fields[name]
+        cost = field_weight(parent_type, name)
+        if node.selection_set is None:
+            return cost, depth
+
+        items_cost, items_depth = self.selection_cost(
+            get_named_type(field.type), node.selection_set, depth + 1
+        )
+        if is_list_type(get_nullable_type(field.type)):
+            items_cost *= list_size(get_argument_values(field, node, self.variables))
+        return cost + items_cost, items_depth
+
+
+def query_cost(
+    schema: GraphQLSchema,
+    document: DocumentNode,
+    operation_name: Optional[str],
+    variables: Optional[dict],
+) -> tuple[int, int]:
+    """Cost and depth of the operation of a validated document, (0, 0) when its
+    variables are invalid: the execution rejects them with their errors"""
+    fragments = {}
+    operation = None
+    for definition in document.definitions:
+        if isinstance(definition, FragmentDefinitionNode):
+            fragments[definition.name.value] = definition
+        elif isinstance(definition, OperationDefinitionNode) and (
+            operation_name is None
+            or (definition.name and definition.name.value == operation_name)
+        ):
+            operation = definition
+    if operation is None:
+        return 0, 0
+
+    coerced_variables = get_variable_values(
+        schema, operation.variable_definitions or (), variables or {}
+    )
+    if isinstance(coerced_variables, list):
+        return 0, 0
+
+    root_type = schema.get_root_type(operation.operation)
+    return QueryCostCalculator(schema, fragments, coerced_variables).selection_cost(
+        root_type, operation.selection_set, depth=1
+    )
+
+
+class Admission:
+    """Cost units of the queries executing concurrently, bounded by `capacity`.
+    A query costing more than the capacity runs alone."""
+
+    def __init__(self, capacity: int, timeout: float):
+        self.capacity = capacity
+        self.timeout = timeout
+        self.available = capacity
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, cost: int):
+        """Wait for `cost` units to be available, raises QueryCostError after
+        `timeout` seconds"""
+        cost = min(cost, self.capacity)
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.available >= cost),
+                    self.timeout,
+                )
+            except asyncio.TimeoutError as error:
+                raise QueryCostError(
+                    "The server is busy with other queries, retry later"
+                ) from error
+            self.available -= cost
+
+    async def release(self, cost: int):
+        async with self._condition:
+            self.available += min(cost, self.capacity)
+            self._condition.notify_all()
+
+
+class QueryCost(Extension):
+    """Checks the cost of the queries before executing them, the admission of
+    the server is taken from the `admission` of the context when there is one.
+    The cost is given in the `cost` extension of the response."""
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self.cost: Optional[int] = None
+        self.depth: Optional[int] = None
+        self.admission: Optional[Admission] = None
+
+    async def on_executing_start(self):
+        context = self.execution_context.context
+        admission = context.get("admission") if isinstance(context, dict) else None
+        try:
+            await self.admit(admission)
+        except QueryCostError as error:
+            self.execution_context.result = GraphQLExecutionResult(
+                data=None, errors=[GraphQLError(str(error), original_error=error)]
+            )
+
+    async def admit(self, admission: Optional[Admission]):
+        # pylint: disable=protected-access
+        self.cost, self.depth = query_cost(
+            self.execution_context.schema._schema,
+            self.execution_context.graphql_document,
+            self.execution_context.operation_name,
+            self.execution_context.variables,
+        )
+        if self.depth > config.graphql_query_max_depth:
+            raise QueryCostError(
+                f"The query depth {self.depth} is over the limit of"
+                f" {config.graphql_query_max_depth}"
+            )
+        if self.cost > config.graphql_query_max_cost:
+            raise QueryCostError(
+                f"The query cost {self.cost} is over the limit of"
+                f" {config.graphql_query_max_cost}"
+            )
+        if admission is not None and self.cost:
+            await admission.acquire(self.cost)
+            self.admission = admission
+
+    async def on_executing_end(self):
+        if self.admission is not None:
+            await self.admission.release(self.cost)
+
+    def get_results(self) -> dict:
+        if self.cost is None:
+            return {}
+        return {
+            "cost": {
+                "requested": self.cost,
+                "maximum": config.graphql_query_max_cost,
+                "depth": self.depth,
+            }
+        }
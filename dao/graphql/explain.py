@@ -0,0 +1,193 @@
+# pylint: disable=redefined-builtin
+"""Query plans of the reads of the GraphQL server
+
+The storage functions are run against a recording database which keeps their
+queries instead of sending them, MongoDB then explains each query to check that
+it is answered from an index rather than a scan of its collection.
+"""
+import dataclasses
+from types import SimpleNamespace
+from typing import Any, Iterator, Optional
+
+from pymongo.database import Database
+
+from dao import utils
+
+from . import pagination, storage
+
+# Size of the pages of the explained lists
+PAGE_SIZE = 10
+
+
+@dataclasses.dataclass
+class Query:
+    """A find or an aggregation of a storage function"""
+
+    name: str
+    collection: str
+    filter: Optional[dict] = None
+    sort: Optional[list[tuple[str, int]]] = None
+    skip: int = 0
+    limit: int = 0
+    pipeline: Optional[list[dict]] = None
+
+    def command(self) -> dict:
+        if self.pipeline is not None:
+            return {
+                "aggregate": self.collection,
+                "pipeline": self.pipeline,
+                "cursor": {},
+            }
+
+        command: dict[str, Any] = {"find": self.collection, "filter": self.filter}
+        if self.sort:
+            command["sort"] = dict(self.sort)
+        if self.skip:
+            command["skip"] = self.skip
+        if self.limit:
+            command["limit"] = self.limit
+        return command
+
+    def explain(self, db: Database) -> dict:
+        return db.command("explain", self.command(), verbosity="queryPlanner")
+
+
+class RecordingCursor:
+    """Cursor of a recorded query, it finds nothing"""
+
+    def __init__(self, query: Query):
+        self.query = query
+
+    def sort(self, sort: list[tuple[str, int]]) -> "RecordingCursor":
+        self.query.sort = list(sort)
+        return self
+
+    def skip(self, skip: int) -> "RecordingCursor":
+        self.query.skip = skip
+        return self
+
+    def limit(self, limit: int) -> "RecordingCursor":
+        self.query.limit = limit
+        return self
+
+    async def to_list(self, length: Optional[int]) -> list[dict]:
+        return []
+
+
+class RecordingCollection:
+    def __init__(self, db: "RecordingDatabase", name: str):
+        self.db = db
+        self.name = name
+
+    def find(self, filter: dict) -> RecordingCursor:
+        return RecordingCursor(self.db.record(self.name, filter=filter))
+
+    def aggregate(self, pipeline: list[dict]) -> RecordingCursor:
+        return RecordingCursor(self.db.record(self.name, pipeline=pipeline))
+
+
+class RecordingDatabase:
+    """Stands for the motor database of the storage functions, the queries are
+    recorded under the name of the read being run"""
+
+    def __init__(self):
+        self.queries: list[Query] = []
+        self.read = ""
+
+    def __getitem__(self, collection: str) -> RecordingCollection:
+        return RecordingCollection(self, collection)
+
+    def record(self, collection: str, **kwargs) -> Query:
+        query = Query(name=self.read, collection=collection, **kwargs)
+        self.queries.append(query)
+        return query
+
+
+async def record_queries(dao_address: bytes) -> list[Query]:
+    """Queries of the storage functions for the DAO, and for all the DAOs where
+    the API allows it. The loaders are called directly, the totals of all the
+    members aren't explained: they are only computed for the banks indexed
+    before the totals, see indexer.storage.init_bank_totals."""
+    db = RecordingDatabase()
+    info = SimpleNamespace(context={"db": db})
+    now = utils.utcnow()
+    member_cursor = pagination.encode_cursor(
+        pagination.MEMBERS_SORT,
+        {"onboardedAt": now, "daoAddress": dao_address, "memberAddress": b"\x00"},
+    )
+    proposal_cursor = pagination.encode_cursor(
+        pagination.PROPOSALS_SORT,
+        {"submittedAt": now, "daoAddress": dao_address, "id": 0},
+    )
+
+    reads = {
+        "list_members": storage.list_members(
+            info, dao_address=dao_address, limit=PAGE_SIZE
+        ),
+        "list_members after": storage.list_members(
+            info, dao_address=dao_address, after=member_cursor, limit=PAGE_SIZE
+        ),
+        "list_members of all the DAOs": storage.list_members(info, limit=PAGE_SIZE),
+        "list_members of all the DAOs after": storage.list_members(
+            info, after=member_cursor, limit=PAGE_SIZE
+        ),
+        "list_proposals": storage.list_proposals(
+            info, dao_address=dao_address, limit=PAGE_SIZE
+        ),
+        "list_proposals after": storage.list_proposals(
+            info, dao_address=dao_address, after=proposal_cursor, limit=PAGE_SIZE
+        ),
+        "list_proposals of all the DAOs": storage.list_proposals(info, limit=PAGE_SIZE),
+        "list_proposals of all the DAOs after": storage.list_proposals(
+            info, after=proposal_cursor, limit=PAGE_SIZE
+        ),
+        "list_transactions": storage.list_transactions(
+            info, owner_address=b"\x00", dao_address=dao_address
+        ),
+        "load_banks": storage.load_banks(db, [dao_address]),
+        "load_banks of the configured bank": storage.load_banks(db, [None]),
+        "load_totals": storage.load_totals(db, [dao_address]),
+        "load_members": storage.load_members(db, [(dao_address, b"\x00")]),
+        "load_members of any DAO": storage.load_members(db, [(None, b"\x00")]),
+        "load_votable_members": storage.load_votable_members(
+            db, [(dao_address, now, now)]
+        ),
+    }
+    for name, read in reads.items():
+        db.read = name
+        await read
+
+    return db.queries
+
+
+def plan_stages(plan: Any) -> Iterator[dict]:
+    """Stages of the winning plans of an explain output, of the aggregation
+    stages and of the shards included"""
+    if isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+    elif isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for key, value in plan.items():
+            if key != "rejectedPlans":
+                yield from plan_stages(value)
+
+
+def plan_indexes(plan: dict) -> list[str]:
+    """Indexes of the plan, empty when any stage scans a collection"""
+    stages = list(plan_stages(plan))
+    if any(stage["stage"] == "COLLSCAN" for stage in stages):
+        return []
+    return [stage["indexName"] for stage in stages if "indexName" in stage]
+
+
+async def check_indexes(
+    db: Database, dao_address: bytes
+) -> list[tuple[Query, list[str]]]:
+    """Indexes used by each query of the storage functions, an empty list for the
+    queries scanning their collection"""
+    return [
+        (query, plan_indexes(query.explain(db)))
+        for query in await record_queries(dao_address)
+    ]
@@ -1,35 +1,112 @@
 import asyncio
+from functools import partial
+from typing import Optional
 
 from aiohttp import web
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from strawberry.aiohttp.views import GraphQLView
 
+from dao import config
+
 from . import logger
+from .cache import CachingHTTPHandler, IndexedHead, ResponseCache
+from .cost import Admission
 from .schema import schema
+from .storage import Loaders
+from .subscriptions import IndexerTail
 
 
 class IndexerGraphQLView(GraphQLView):
-    def __init__(self, db, **kwargs):
+    def __init__(
+        self,
+        db,
+        tail: IndexerTail,
+        admission: Admission,
+        cache: Optional[ResponseCache] = None,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self._db = db
+        self._tail = tail
+        self._admission = admission
+        if cache is not None:
+            self.http_handler_class = partial(CachingHTTPHandler, cache)
+
+    # Called with keyword arguments by the websocket handlers
+    async def get_context(self, request, response):  # pylint: disable=unused-argument
+        return {
+            "db": self._db,
+            "loaders": Loaders(self._db),
+            "tail": self._tail,
+            "admission": self._admission,
+        }
+
+
+def create_mongo_client(mongo_url: str) -> AsyncIOMotorClient:
+    """The resolvers share the connection pool of the client, sized for the
+    concurrent requests of the server"""
+    return AsyncIOMotorClient(
+        mongo_url,
+        tz_aware=True,
+        maxPoolSize=config.graphql_mongo_max_pool_size,
+        serverSelectionTimeoutMS=config.graphql_mongo_server_selection_timeout_ms,
+        socketTimeoutMS=config.graphql_mongo_socket_timeout_ms,
+        readPreference=config.graphql_mongo_read_preference,
+    )
+
+
+def create_app(db, response_cache: bool = True) -> web.Application:
+    """The indexed head block is followed by the subscriptions, see
+    subscriptions.IndexerTail, and by the response cache, see
+    cache.ResponseCache. The cache is disabled when `response_cache` is False or
+    `graphql_cache_max_entries` is 0."""
+    app = web.Application()
+
+    head = IndexedHead(db, interval=config.graphql_head_poll_interval)
+    tail = IndexerTail(
+        db,
+        queue_size=config.graphql_subscription_queue_size,
+        max_blocks=config.graphql_subscription_max_blocks,
+    )
+    head.listeners.append(tail.follow)
+
+    cache = None
+    if response_cache and config.graphql_cache_max_entries:
+        cache = ResponseCache(
+            head,
+            max_entries=config.graphql_cache_max_entries,
+            stale_while_revalidate=config.graphql_cache_stale_while_revalidate,
+        )
 
-    async def get_context(self, _request, _response):
-        return {"db": self._db}
+    async def watch_head(_app: web.Application):
+        await head.poll()
+        task = asyncio.create_task(head.watch())
+        yield
+        task.cancel()
+
+    app.cleanup_ctx.append(watch_head)
+
+    # The queries are checked by cost.QueryCost
+    admission = Admission(
+        capacity=config.graphql_cost_capacity,
+        timeout=config.graphql_cost_queue_timeout,
+    )
+
+    view = IndexerGraphQLView(
+        db, tail=tail, admission=admission, cache=cache, schema=schema
+    )
+    app.router.add_route("*", "/graphql", view)
+    return app
 
 
 async def run_graphql(
     mongo_url: str, db_name: str, host: str = "localhost", port: int = 8080
 ):
-    mongo = MongoClient(mongo_url, tz_aware=True)
-    db = mongo[db_name]
-
-    view = IndexerGraphQLView(db, schema=schema)
+    mongo = create_mongo_client(mongo_url)
+    app = create_app(mongo[db_name])
 
     logger.info(schema.as_str())
 
-    app = web.Application()
-    app.router.add_route("*", "/graphql", view)
-
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, host, port)
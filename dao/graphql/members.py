@@ -4,12 +4,13 @@ from typing import Optional
 import strawberry
 from strawberry.types import Info
 
-from . import storage
+from . import pagination, storage
 from .common import Balance, FromMongoMixin, HexValue, Transaction
 
 
 @strawberry.type
 class Member(FromMongoMixin):
+    daoAddress: Optional[HexValue] = None
     memberAddress: HexValue
     delegateAddress: Optional[HexValue] = None
     shares: int
@@ -18,33 +19,56 @@ class Member(FromMongoMixin):
     yesVotes: list[HexValue] = strawberry.field(default_factory=list)
     noVotes: list[HexValue] = strawberry.field(default_factory=list)
     balances: list[Balance] = strawberry.field(default_factory=list)
-    transactions: list[Transaction] = strawberry.field(default_factory=list)
     roles: list[str] = strawberry.field(default_factory=list)
     jailedAt: Optional[datetime] = None
     exitedAt: Optional[datetime] = None
 
     @strawberry.field
-    def percentageOfTreasury(self, info) -> float:
-        bank = storage.get_bank(info)
+    async def transactions(
+        self, info, skip: int = 0, limit: int = 10
+    ) -> list[Transaction]:
+        transactions = await storage.list_transactions(
+            info=info,
+            owner_address=self.memberAddress,
+            skip=skip,
+            limit=limit,
+            dao_address=self.daoAddress,
+        )
+        return [Transaction.from_mongo(doc) for doc in transactions]
+
+    @strawberry.field
+    async def percentageOfTreasury(self, info) -> float:
+        bank = await storage.get_bank(info, dao_address=self.daoAddress)
         total = bank.get("totalShares", 0) + bank.get("totalLoot", 0)
         return (self.shares + self.loot) / total
 
     @strawberry.field
-    def votingWeight(self, info) -> float:
-        bank = storage.get_bank(info)
+    async def votingWeight(self, info) -> float:
+        bank = await storage.get_bank(info, dao_address=self.daoAddress)
         totalShares = bank.get("totalShares", 0)
         return self.shares / totalShares
 
+    @strawberry.field
+    def cursor(self) -> str:
+        """Cursor of the page following the member"""
+        return pagination.encode_cursor(pagination.MEMBERS_SORT, vars(self))
+
     @classmethod
     def from_mongo(cls, data: dict):
         data["balances"] = [Balance(**balance) for balance in data.get("balances", [])]
-        data["transactions"] = [
-            Transaction(**transaction) for transaction in data.get("transactions", [])
-        ]
+        # Transactions are resolved from their own collection
+        data.pop("transactions", None)
         return super().from_mongo(data)
 
 
-# pylint: disable=unused-argument
-def get_members(info: Info, limit: int = 10, skip: int = 0) -> list[Member]:
-    members = storage.list_members(info=info)
+async def get_members(
+    info: Info,
+    limit: int = 10,
+    skip: int = 0,
+    after: Optional[str] = None,
+    daoAddress: Optional[HexValue] = None,
+) -> list[Member]:
+    members = await storage.list_members(
+        info=info, dao_address=daoAddress, after=after, skip=skip, limit=limit
+    )
     return [Member.from_mongo(doc) for doc in members]
@@ -0,0 +1,72 @@
+"""Keyset pagination of the lists of the GraphQL API
+
+A page starts after the last document of the previous page, identified by an
+opaque cursor holding the values of the sort fields of this document. Unlike
+$skip, the page is found with the index of the sort, whatever its depth.
+"""
+import base64
+import binascii
+from typing import Optional
+
+import bson
+from bson.codec_options import CodecOptions
+from pymongo import ASCENDING, DESCENDING
+
+Sort = list[tuple[str, int]]
+
+# Newest proposals first, the id orders the proposals of a DAO submitted in the
+# same block
+PROPOSALS_SORT: Sort = [("submittedAt", DESCENDING), ("id", DESCENDING)]
+MEMBERS_SORT: Sort = [("onboardedAt", ASCENDING), ("memberAddress", ASCENDING)]
+
+
+def sort_fields(sort: Sort, dao_address: Optional[bytes]) -> Sort:
+    """Sort of the documents of a DAO, or of all the DAOs when `dao_address`
+    is None, their keys are only unique in a DAO"""
+    if dao_address is not None:
+        return sort
+    first, *others = sort
+    return [first, ("daoAddress", first[1]), *others]
+
+
+def encode_cursor(sort: Sort, document: dict) -> str:
+    """Cursor of the page following `document`, for the sort of any DAO"""
+    fields = [field for field, _ in sort_fields(sort, None)]
+    values = {field: document.get(field) for field in fields}
+    return base64.urlsafe_b64encode(bson.encode(values)).decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        return bson.decode(
+            base64.urlsafe_b64decode(cursor.encode()),
+            codec_options=CodecOptions(tz_aware=True),
+        )
+    except (binascii.Error, bson.errors.BSONError, ValueError) as error:
+        raise ValueError(f"Invalid cursor '{cursor}'") from error
+
+
+def after_filter(sort: Sort, cursor: Optional[str]) -> dict:
+    """Filter on the documents following the cursor in the `sort` order"""
+    if cursor is None:
+        return {}
+
+    values = decode_cursor(cursor)
+    if any(field not in values for field, _ in sort):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+    # (a, b) > (x, y) is a > x or (a == x and b > y)
+    clauses = []
+    for index, (field, direction) in enumerate(sort):
+        operator = "$gt" if direction == ASCENDING else "$lt"
+        clauses.append(
+            {
+                **{previous: values[previous] for previous, _ in sort[:index]},
+                field: {operator: values[field]},
+            }
+        )
+    # Redundant with the clauses, the bound on the first field is the range of
+    # the index scanned for the page
+    first, direction = sort[0]
+    bound = "$gte" if direction == ASCENDING else "$lte"
+    return {first: {bound: values[first]}, "$or": clauses}
@@ -1,4 +1,6 @@
+import asyncio
 from datetime import datetime, timedelta
+from functools import wraps
 from typing import Optional, Type
 
 import strawberry
@@ -6,12 +8,43 @@ from strawberry.types import Info
 
 from .. import utils
 from ..models import ProposalRawStatus, ProposalStatus
-from . import storage
+from . import pagination, storage
+from .cache import cache_hint
 from .common import FromMongoMixin, HexValue
 
 
+def request_time(info: Optional[Info]) -> datetime:
+    """Time of the request, the time dependent fields of a request are computed
+    at the same time"""
+    if info is None:
+        return utils.utcnow()
+    if "now" not in info.context:
+        info.context["now"] = utils.utcnow()
+    return info.context["now"]
+
+
+def memoized(method):
+    """Compute a field of a proposal once per request, the fields resolved
+    concurrently share the same computation. It's computed every time outside
+    of a request, without `info`."""
+
+    @wraps(method)
+    async def wrapper(self, info: Info):
+        if info is None:
+            return await method(self, info)
+
+        fields = info.context.setdefault("proposal_fields", {})
+        key = (self.daoAddress, self.id, method.__name__)
+        if key not in fields:
+            fields[key] = asyncio.ensure_future(method(self, info))
+        return await fields[key]
+
+    return wrapper
+
+
 @strawberry.interface
 class Proposal(FromMongoMixin):
+    daoAddress: Optional[HexValue] = None
     id: int
     title: str
     type: str
@@ -28,10 +61,11 @@ class Proposal(FromMongoMixin):
 
     yesVoters: list[HexValue] = strawberry.field(default_factory=list)
     noVoters: list[HexValue] = strawberry.field(default_factory=list)
+    # Shares of the voters when they voted
+    yesVotesTotal: int = 0
+    noVotesTotal: int = 0
 
     # private fields are not exposed to the GraphQL API
-    yesVotersMembers: strawberry.Private[list[dict]]
-    noVotersMembers: strawberry.Private[list[dict]]
     rawStatus: strawberry.Private[str]
     rawStatusHistory: strawberry.Private[list[tuple[str, datetime]]]
 
@@ -44,28 +78,28 @@ class Proposal(FromMongoMixin):
         return self.votingPeriodEndingAt() + timedelta(minutes=self.graceDuration)
 
     @strawberry.field
-    def approvedToProcessAt(self, info: Info) -> Optional[datetime]:
-        if self.status(info) is ProposalStatus.APPROVED_READY:
+    async def approvedToProcessAt(self, info: Info) -> Optional[datetime]:
+        if await self.status(info) is ProposalStatus.APPROVED_READY:
             return self.gracePeriodEndingAt()
 
     @strawberry.field
-    def rejectedToProcessAt(self, info: Info) -> Optional[datetime]:
-        if self.status(info) is ProposalStatus.REJECTED_READY:
+    async def rejectedToProcessAt(self, info: Info) -> Optional[datetime]:
+        if await self.status(info) is ProposalStatus.REJECTED_READY:
             return self.votingPeriodEndingAt()
 
     @strawberry.field
-    def approvedAt(self, info: Info) -> Optional[datetime]:
-        if self.status(info) is ProposalStatus.APPROVED:
+    async def approvedAt(self, info: Info) -> Optional[datetime]:
+        if await self.status(info) is ProposalStatus.APPROVED:
             return self.get_raw_status_time(ProposalRawStatus.APPROVED)
 
     @strawberry.field
-    def rejectedAt(self, info: Info) -> Optional[datetime]:
-        if self.status(info) is ProposalStatus.REJECTED:
+    async def rejectedAt(self, info: Info) -> Optional[datetime]:
+        if await self.status(info) is ProposalStatus.REJECTED:
             return self.get_raw_status_time(ProposalRawStatus.REJECTED)
 
     @strawberry.field
-    def processedAt(self, info: Info) -> Optional[datetime]:
-        return self.approvedAt(info) or self.rejectedAt(info) or None
+    async def processedAt(self, info: Info) -> Optional[datetime]:
+        return await self.approvedAt(info) or await self.rejectedAt(info) or None
 
     def get_raw_status_time(self, status: ProposalRawStatus) -> Optional[datetime]:
         for status_, time_ in self.rawStatusHistory:
@@ -73,71 +107,73 @@ class Proposal(FromMongoMixin):
                 return time_
 
     @strawberry.field
-    def active(self, info: Info) -> bool:
-        return self.status(info).is_active
+    async def active(self, info: Info) -> bool:
+        return (await self.status(info)).is_active
 
     @strawberry.field
-    def yesVotesTotal(self) -> int:
-        return sum(member["shares"] for member in self.yesVotersMembers)
-
-    @strawberry.field
-    def noVotesTotal(self) -> int:
-        return sum(member["shares"] for member in self.noVotersMembers)
-
-    @strawberry.field
-    def totalVotableShares(self, info: Info) -> int:
-        members = storage.list_votable_members(
+    @memoized
+    async def totalVotableShares(self, info: Info) -> int:
+        members = await storage.list_votable_members(
             info=info,
             voting_period_ending_at=self.votingPeriodEndingAt(),
             submitted_at=self.submittedAt,
+            dao_address=self.daoAddress,
         )
         return sum(member["shares"] for member in members)
 
     @strawberry.field
     def currentMajority(self) -> float:
-        total_votes = self.yesVotesTotal() + self.noVotesTotal()
+        total_votes = self.yesVotesTotal + self.noVotesTotal
 
         if total_votes == 0:
             return 0
 
-        majority_fraction = self.yesVotesTotal() / total_votes
+        majority_fraction = self.yesVotesTotal / total_votes
 
         return round(majority_fraction * 100, 2)
 
     @strawberry.field
-    def currentQuorum(self, info: Info) -> float:
-        total_votable_shares = self.totalVotableShares(info)
+    @memoized
+    async def currentQuorum(self, info: Info) -> float:
+        total_votable_shares = await self.totalVotableShares(info)
 
         if total_votable_shares == 0:
             return 0
 
         quroum_fraction = (
-            self.yesVotesTotal() + self.noVotesTotal()
+            self.yesVotesTotal + self.noVotesTotal
         ) / total_votable_shares
 
         return round(quroum_fraction * 100, 2)
 
     @strawberry.field
-    def timeRemaining(self, info: Info) -> Optional[int]:
-        now = utils.utcnow()
+    async def timeRemaining(self, info: Info) -> Optional[int]:
+        now = request_time(info)
+        status = await self.status(info)
 
-        if self.status(info) == ProposalStatus.VOTING_PERIOD:
+        if status in (ProposalStatus.VOTING_PERIOD, ProposalStatus.GRACE_PERIOD):
+            # Counted in seconds
+            cache_hint(info, now + timedelta(seconds=1))
+
+        if status == ProposalStatus.VOTING_PERIOD:
             return int((now - self.votingPeriodEndingAt()).total_seconds())
 
-        if self.status(info) == ProposalStatus.GRACE_PERIOD:
+        if status == ProposalStatus.GRACE_PERIOD:
             return int((now - self.gracePeriodEndingAt()).total_seconds())
 
-    def _handle_submitted_status(self, info: Info) -> ProposalStatus:
-        now = utils.utcnow()
+    async def _handle_submitted_status(self, info: Info) -> ProposalStatus:
+        now = request_time(info)
 
         if now < self.votingPeriodEndingAt():
+            cache_hint(info, self.votingPeriodEndingAt())
             return ProposalStatus.VOTING_PERIOD
 
         if (
             self.currentMajority() >= self.majority
-            and self.currentQuorum(info) >= self.quorum
+            and await self.currentQuorum(info) >= self.quorum
         ):
             if now < self.gracePeriodEndingAt():
+                cache_hint(info, self.gracePeriodEndingAt())
                 return ProposalStatus.GRACE_PERIOD
 
             return ProposalStatus.APPROVED_READY
@@ -145,7 +181,8 @@ class Proposal(FromMongoMixin):
         return ProposalStatus.REJECTED_READY
 
     @strawberry.field
-    def status(self, info: Info) -> ProposalStatus:
+    @memoized
+    async def status(self, info: Info) -> ProposalStatus:
         raw_status = ProposalRawStatus(self.rawStatus)
 
         if raw_status is ProposalRawStatus.APPROVED:
@@ -155,7 +192,7 @@ class Proposal(FromMongoMixin):
             return ProposalStatus.REJECTED
 
         if raw_status is ProposalRawStatus.SUBMITTED:
-            return self._handle_submitted_status(info)
+            return await self._handle_submitted_status(info)
 
         return ProposalStatus.UNKNOWN
 
@@ -163,6 +200,11 @@ class Proposal(FromMongoMixin):
     def memberDidVote(self, memberAddress: HexValue) -> bool:
         return memberAddress in self.yesVoters + self.noVoters
 
+    @strawberry.field
+    def cursor(self) -> str:
+        """Cursor of the page following the proposal"""
+        return pagination.encode_cursor(pagination.PROPOSALS_SORT, vars(self))
+
     # pylint: disable=unused-argument
     @strawberry.field
     def memberCanVote(self, memberAddress: HexValue) -> bool:
@@ -218,6 +260,14 @@ PROPOSAL_TYPE_TO_CLASS: dict[str, Type[Proposal]] = {
 }
 
 
-def get_proposals(info: Info, limit: int = 10, skip: int = 0) -> list[Proposal]:
-    proposals = storage.list_proposals(info=info, skip=skip, limit=limit)
+async def get_proposals(
+    info: Info,
+    limit: int = 10,
+    skip: int = 0,
+    after: Optional[str] = None,
+    daoAddress: Optional[HexValue] = None,
+) -> list[Proposal]:
+    proposals = await storage.list_proposals(
+        info=info, skip=skip, limit=limit, dao_address=daoAddress, after=after
+    )
     return [PROPOSAL_TYPE_TO_CLASS[doc["type"]].from_mongo(doc) for doc in proposals]
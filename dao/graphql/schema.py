@@ -1,8 +1,10 @@
 import strawberry
 
 from .bank import Bank, get_bank
+from .cost import QueryCost
 from .members import Member, get_members
 from .proposals import PROPOSAL_TYPE_TO_CLASS, Proposal, get_proposals
+from .subscriptions import Subscription
 
 
 @strawberry.type
@@ -12,4 +14,9 @@ class Query:
     bank: Bank = strawberry.field(resolver=get_bank)
 
 
-schema = strawberry.Schema(query=Query, types=list(PROPOSAL_TYPE_TO_CLASS.values()))
+schema = strawberry.Schema(
+    query=Query,
+    subscription=Subscription,
+    types=list(PROPOSAL_TYPE_TO_CLASS.values()),
+    extensions=[QueryCost],
+)
@@ -1,19 +1,35 @@
 # pylint: disable=redefined-builtin
+import asyncio
 import json
 import os
+from collections import defaultdict
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from typing import Any, Optional
 
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.database import Database
+from strawberry.dataloader import DataLoader
 from strawberry.types import Info
 
 from dao import config, utils
 
-from . import logger
+from . import logger, pagination
 
+VALIDATED_COLLECTIONS = (
+    "proposals",
+    "proposal_params",
+    "members",
+    "bank",
+    "transactions",
+    "votes",
+)
 
-def create_collection_with_validators(db: Database, collection: str):
+
+def create_collection_with_validators(
+    db: Database, collection: str, validation_level: str = "strict"
+):
     here = Path(__file__)
     validators_dir = here.parent.parent / "indexer" / "validators"
 
@@ -26,39 +42,227 @@ def create_collection_with_validators(db: Database, collection: str):
         collection_validator = json.load(f)
 
     if collection not in collections:
-        db.create_collection(collection, validator=collection_validator)
+        db.create_collection(
+            collection,
+            validator=collection_validator,
+            validationLevel=validation_level,
+        )
     else:
-        db.command("collMod", collection, validator=collection_validator)
+        db.command(
+            "collMod",
+            collection,
+            validator=collection_validator,
+            validationLevel=validation_level,
+        )
 
 
-def create_indexes(db: Database):
-    db["proposals"].create_index("id", unique=True)
-    db["proposal_params"].create_index("type", unique=True)
-    db["members"].create_index("memberAddress", unique=True)
-    db["bank"].create_index("bankAddress", unique=True)
+# Indexes replaced by partial indexes of the same name, as (collection, name).
+# The indexes on the keys alone, from before the documents were partitioned by
+# DAO, covered all the versions of the documents. The unique index of the
+# transactions covered the transactions moved from the members and the bank,
+# they don't have an event, see indexer.storage.init_transactions.
+LEGACY_INDEXES = [
+    ("proposals", "id_1"),
+    ("proposal_params", "type_1"),
+    ("members", "memberAddress_1"),
+    ("bank", "bankAddress_1"),
+    ("transactions", "ownerAddress_1_timestamp_1_blockNumber_1_eventIndex_1"),
+    ("transactions", "blockNumber_1_transactionHash_1_eventIndex_1"),
+]
+
+
+# Only the current version of the documents is read by the GraphQL server, the
+# indexes of the versioned collections skip the previous versions
+CURRENT_VERSION = {"partialFilterExpression": {"_chain.valid_to": None}}
+
+Index = tuple[str, list[tuple[str, int]], dict]
+
+# Lookups by key, as (collection, keys, options). Read by the event handlers,
+# see indexer.batch.BlockBatch and indexer.cache.StateCache, and by the GraphQL
+# server. Only the current version of a document is unique in a DAO.
+KEY_INDEXES: list[Index] = [
+    ("proposals", [("daoAddress", 1), ("id", 1)], {"unique": True, **CURRENT_VERSION}),
+    (
+        "proposal_params",
+        [("daoAddress", 1), ("type", 1)],
+        {"unique": True, **CURRENT_VERSION},
+    ),
+    (
+        "members",
+        [("daoAddress", 1), ("memberAddress", 1)],
+        {"unique": True, **CURRENT_VERSION},
+    ),
+    (
+        "bank",
+        [("daoAddress", 1), ("bankAddress", 1)],
+        {"unique": True, **CURRENT_VERSION},
+    ),
+]
+
+# Indexes of the other reads of the GraphQL server by access path, the indexer
+# doesn't use them, see explain.check_indexes
+SECONDARY_INDEXES: list[Index] = [
+    # Lookups without a DAO: the configured bank and the voters of the proposals
+    # indexed before the documents were partitioned by DAO
+    ("bank", [("bankAddress", 1)], CURRENT_VERSION),
+    ("members", [("memberAddress", 1)], CURRENT_VERSION),
+    # Pages of proposals by submittedAt and of members by onboardedAt, of a DAO
+    # and of all the DAOs, see pagination.sort_fields
+    ("proposals", [("daoAddress", 1), *pagination.PROPOSALS_SORT], CURRENT_VERSION),
+    (
+        "proposals",
+        pagination.sort_fields(pagination.PROPOSALS_SORT, None),
+        CURRENT_VERSION,
+    ),
+    ("members", [("daoAddress", 1), *pagination.MEMBERS_SORT], CURRENT_VERSION),
+    ("members", pagination.sort_fields(pagination.MEMBERS_SORT, None), CURRENT_VERSION),
+    # Members who can vote in a voting window, see get_votable_members_query
+    (
+        "members",
+        [("daoAddress", 1), ("onboardedAt", 1), ("jailedAt", 1), ("exitedAt", 1)],
+        CURRENT_VERSION,
+    ),
+    # Votes on a proposal, appended and never updated
+    ("votes", [("daoAddress", 1), ("proposalId", 1)], {}),
+    # Transactions of a member or of the bank in chronological order, appended
+    # and never updated
+    (
+        "transactions",
+        [
+            ("daoAddress", 1),
+            ("ownerAddress", 1),
+            ("timestamp", 1),
+            ("blockNumber", 1),
+            ("eventIndex", 1),
+        ],
+        {},
+    ),
+]
+
+
+def index_name(keys: list[tuple[str, int]]) -> str:
+    """Default name MongoDB gives to the index of `keys`"""
+    return "_".join(f"{key}_{direction}" for key, direction in keys)
+
+
+def create_indexes(db: Database, secondary: bool = True):
+    """Create the indexes of the collections, the `secondary` ones aren't needed
+    by the indexer and can be created once the data is written, they are
+    dropped when `secondary` is False"""
+    for collection, index in LEGACY_INDEXES:
+        information = db[collection].index_information().get(index)
+        if information and "partialFilterExpression" not in information:
+            db[collection].drop_index(index)
+
+    for collection, keys, options in KEY_INDEXES:
+        db[collection].create_index(keys, **options)
+
+    for collection, keys, options in SECONDARY_INDEXES:
+        if secondary:
+            db[collection].create_index(keys, **options)
+        elif index_name(keys) in db[collection].index_information():
+            # Dropped while backfilling, they would slow down the writes
+            db[collection].drop_index(keys)
+
+    # Events are identified by their block, transaction and index in the block
+    db["events"].create_index(
+        [("blockNumber", 1), ("transactionHash", 1), ("eventIndex", 1)],
+        unique=True,
+        partialFilterExpression={"blockNumber": {"$exists": True}},
+    )
+    db["block_timestamps"].create_index("number", unique=True)
+    db["_undo"].create_index("block")
+    # The appended documents are rolled back by block, see undo.rollback
+    for collection in ("block_timestamps", "transactions", "votes", "events"):
+        db[collection].create_index("_chain.valid_from")
+    # Like events, transactions are identified by their event
+    db["transactions"].create_index(
+        [("blockNumber", 1), ("transactionHash", 1), ("eventIndex", 1)],
+        unique=True,
+        partialFilterExpression={"transactionHash": {"$exists": True}},
+    )
+    db["votes"].create_index(
+        [("blockNumber", 1), ("transactionHash", 1), ("eventIndex", 1)], unique=True
+    )
 
 
-def init_db(db: Database):
-    logger.info("Init db=%s, collections=%s", db.name, db.list_collection_names())
+def init_db(db: Database, backfill: bool = False):
+    """Install the validators and the indexes, in backfill mode the validators
+    are disabled and the secondary indexes are dropped, calling `init_db`
+    again without `backfill` restores them"""
+    logger.info(
+        "Init db=%s, collections=%s, backfill=%s",
+        db.name,
+        db.list_collection_names(),
+        backfill,
+    )
 
     # mongomock doesn't support validators
     if os.getenv("USING_MONGOMOCK", "").lower() != "true":
-        create_collection_with_validators(db, "proposals")
-        create_collection_with_validators(db, "proposal_params")
-        create_collection_with_validators(db, "members")
-        create_collection_with_validators(db, "bank")
+        for collection in VALIDATED_COLLECTIONS:
+            create_collection_with_validators(
+                db, collection, validation_level="off" if backfill else "strict"
+            )
 
-    create_indexes(db)
+    create_indexes(db, secondary=not backfill)
 
 
-def list_members(info: Info, filter=None):
+def dao_filter(dao_address: Optional[bytes]) -> dict:
+    """Filter on the documents of a DAO, all the DAOs when `dao_address` is
+    None"""
+    if dao_address is None:
+        return {}
+    return {"daoAddress": dao_address}
+
+
+async def list_members(
+    info: Info,
+    filter=None,
+    dao_address: Optional[bytes] = None,
+    after: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+) -> list[dict]:
+    """Members of the DAO by onboarding time, the page starts after the
+    member of the `after` cursor"""
     if filter is None:
         filter = {}
 
-    db: Database = info.context["db"]
-    # TODO: Use dataloaders or any other mechanism for caching
-    members = db["members"].find({"_chain.valid_to": None, **filter})
-    return members
+    db: AsyncIOMotorDatabase = info.context["db"]
+    sort = pagination.sort_fields(pagination.MEMBERS_SORT, dao_address)
+    members = (
+        db["members"]
+        .find(
+            {
+                "_chain.valid_to": None,
+                **dao_filter(dao_address),
+                **filter,
+                **pagination.after_filter(sort, after),
+            }
+        )
+        .sort(sort)
+        .skip(skip)
+        .limit(limit or 0)
+    )
+    return await members.to_list(length=None)
+
+
+async def list_transactions(
+    info: Info,
+    owner_address: bytes,
+    skip: int = 0,
+    limit: int = 10,
+    dao_address: Optional[bytes] = None,
+) -> list[dict]:
+    db: AsyncIOMotorDatabase = info.context["db"]
+    transactions = (
+        db["transactions"]
+        .find({**dao_filter(dao_address), "ownerAddress": owner_address})
+        .sort([("timestamp", 1), ("blockNumber", 1), ("eventIndex", 1)])
+        .skip(skip)
+        .limit(limit)
+    )
+    return await transactions.to_list(length=None)
 
 
 def get_votable_members_query(
@@ -90,113 +294,232 @@ def get_votable_members_query(
     }
 
 
-def list_votable_members(
-    info: Info, voting_period_ending_at: datetime, submitted_at: datetime
-):
-    db: Database = info.context["db"]
-
-    query = get_votable_members_query(
-        voting_period_ending_at=voting_period_ending_at, submitted_at=submitted_at
+async def list_votable_members(
+    info: Info,
+    voting_period_ending_at: datetime,
+    submitted_at: datetime,
+    dao_address: Optional[bytes] = None,
+) -> list[dict]:
+    return await get_loaders(info).votable_members.load(
+        (dao_address, voting_period_ending_at, submitted_at)
     )
 
-    # TODO: Use dataloaders or any other mechanism for caching
-    members = db["members"].find({"_chain.valid_to": None, **query})
-    return members
-
 
 def get_list_proposals_query(
     skip: Optional[int] = None,
     limit: Optional[int] = None,
+    dao_address: Optional[bytes] = None,
+    after: Optional[str] = None,
 ):
     current_block_filter = {"_chain.valid_to": None}
+    sort = pagination.sort_fields(pagination.PROPOSALS_SORT, dao_address)
 
     # TODO: use $set with MongoDB Expressions[1] to add fields we need for sorting
     # like timeRemaining and processedAt
     # [1]: https://www.mongodb.com/docs/manual/meta/aggregation-quick-reference
     # /#std-label-aggregation-expressions
     pipeline: list[dict[str, Any]] = [
-        {"$match": current_block_filter},
-        {"$skip": skip},
-        {"$limit": limit},
-        {
-            "$lookup": {
-                "from": "members",
-                "pipeline": [{"$match": current_block_filter}],
-                "localField": "yesVoters",
-                "foreignField": "memberAddress",
-                "as": "yesVotersMembers",
-            }
-        },
         {
-            "$lookup": {
-                "from": "members",
-                "pipeline": [{"$match": current_block_filter}],
-                "localField": "noVoters",
-                "foreignField": "memberAddress",
-                "as": "noVotersMembers",
+            "$match": {
+                **current_block_filter,
+                **dao_filter(dao_address),
+                **pagination.after_filter(sort, after),
             }
         },
-        {"$sort": {"submittedAt": -1}},
+        # Sorted first, the page is read from the index of the sort
+        {"$sort": dict(sort)},
     ]
-
-    # Disable pipeline operator when using mongomock
-    # because it doesn't support it
-    if os.getenv("USING_MONGOMOCK", "").lower() == "true":
-        for step in pipeline:
-            if lookup := step.get("$lookup"):
-                if "pipeline" in lookup:
-                    del lookup["pipeline"]
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit:
+        pipeline.append({"$limit": limit})
 
     return pipeline
 
 
-def list_proposals(
+async def load_vote_totals(info: Info, proposals: list[dict]):
+    """Add the vote totals to the proposals indexed before VoteSubmitted kept
+    them, from the current shares of the voters. The voters of all the
+    proposals are loaded at once."""
+    proposals = [proposal for proposal in proposals if "yesVotesTotal" not in proposal]
+    members = get_loaders(info).members
+
+    def load(proposal: dict, field: str):
+        return members.load_many(
+            [
+                (proposal.get("daoAddress"), address)
+                for address in proposal.get(field, [])
+            ]
+        )
+
+    voters = await asyncio.gather(
+        *(
+            asyncio.gather(load(proposal, "yesVoters"), load(proposal, "noVoters"))
+            for proposal in proposals
+        )
+    )
+    for proposal, (yes_voters, no_voters) in zip(proposals, voters):
+        proposal["yesVotesTotal"] = sum(m["shares"] for m in yes_voters if m)
+        proposal["noVotesTotal"] = sum(m["shares"] for m in no_voters if m)
+
+
+async def list_proposals(
     info: Info,
     skip: Optional[int] = None,
     limit: Optional[int] = None,
-):
-    db: Database = info.context["db"]
-
-    pipeline = get_list_proposals_query(skip=skip, limit=limit)
+    dao_address: Optional[bytes] = None,
+    after: Optional[str] = None,
+) -> list[dict]:
+    """Proposals of the DAO from the newest, the page starts after the proposal
+    of the `after` cursor"""
+    db: AsyncIOMotorDatabase = info.context["db"]
+
+    pipeline = get_list_proposals_query(
+        skip=skip, limit=limit, dao_address=dao_address, after=after
+    )
 
-    proposals = db["proposals"].aggregate(pipeline)
+    proposals = await db["proposals"].aggregate(pipeline).to_list(length=None)
+    await load_vote_totals(info, proposals)
 
     return proposals
 
 
-def get_bank(info: Info):
-    current_block_filter = {"_chain.valid_to": None}
-
-    db: Database = info.context["db"]
+async def get_bank(info: Info, dao_address: Optional[bytes] = None):
+    """Returns the bank of the DAO, the configured bank without `dao_address`"""
+    loaders = get_loaders(info)
 
-    bank = db["bank"].find_one(
-        {
-            **current_block_filter,
-            "bankAddress": utils.int_to_bytes(config.bank_address),
-        }
-    )
-
-    total = db["members"].aggregate(
-        [
-            {"$match": current_block_filter},
-            {
-                "$group": {
-                    "_id": None,
-                    "totalShares": {"$sum": "$shares"},
-                    "totalLoot": {"$sum": "$loot"},
-                }
-            },
-        ]
-    )
+    # Copied, the loaded documents are shared by the resolvers of the request
+    bank = dict(await loaders.bank.load(dao_address))
+    if "totalShares" in bank:
+        # Maintained by the indexer
+        return bank
 
-    total = list(total)
+    total = await loaders.totals.load(bank.get("daoAddress"))
 
     if total:
-        bank["totalShares"] = total[0]["totalShares"]
-        bank["totalLoot"] = total[0]["totalLoot"]
+        bank["totalShares"] = total["totalShares"]
+        bank["totalLoot"] = total["totalLoot"]
     else:
         logger.warning(
             "Cannot compute totalShares and totalLoot, there is probably no members yet"
         )
 
     return bank
+
+
+async def load_banks(
+    db: AsyncIOMotorDatabase, dao_addresses: list[Optional[bytes]]
+) -> list[Optional[dict]]:
+    """Banks of the DAOs, the configured bank for None"""
+    configured_address = utils.int_to_bytes(config.bank_address)
+    filters = [
+        {"bankAddress": configured_address}
+        if dao_address is None
+        else {"daoAddress": dao_address}
+        for dao_address in dao_addresses
+    ]
+    banks = await (
+        db["bank"].find({"_chain.valid_to": None, "$or": filters}).to_list(length=None)
+    )
+
+    by_dao = {bank.get("daoAddress"): bank for bank in banks}
+    by_address = {bank["bankAddress"]: bank for bank in banks}
+    return [
+        by_address.get(configured_address)
+        if dao_address is None
+        else by_dao.get(dao_address)
+        for dao_address in dao_addresses
+    ]
+
+
+async def load_totals(
+    db: AsyncIOMotorDatabase, dao_addresses: list[Optional[bytes]]
+) -> list[Optional[dict]]:
+    """totalShares and totalLoot of the current members of the DAOs, of all the
+    members for None"""
+
+    async def group(match: dict, by: Optional[str]) -> list[dict]:
+        totals = db["members"].aggregate(
+            [
+                {"$match": {"_chain.valid_to": None, **match}},
+                {
+                    "$group": {
+                        "_id": by,
+                        "totalShares": {"$sum": "$shares"},
+                        "totalLoot": {"$sum": "$loot"},
+                    }
+                },
+            ]
+        )
+        return await totals.to_list(length=None)
+
+    totals: dict[Optional[bytes], dict] = {}
+    if daos := [dao_address for dao_address in dao_addresses if dao_address]:
+        for total in await group({"daoAddress": {"$in": daos}}, "$daoAddress"):
+            totals[total["_id"]] = total
+    if None in dao_addresses:
+        for total in await group({}, None):
+            totals[None] = total
+
+    return [totals.get(dao_address) for dao_address in dao_addresses]
+
+
+async def load_members(
+    db: AsyncIOMotorDatabase, keys: list[tuple[Optional[bytes], bytes]]
+) -> list[Optional[dict]]:
+    """Current members by (DAO, member address), of any DAO for a None DAO"""
+    addresses = defaultdict(list)
+    for dao_address, member_address in keys:
+        addresses[dao_address].append(member_address)
+    filters = [
+        {**dao_filter(dao_address), "memberAddress": {"$in": member_addresses}}
+        for dao_address, member_addresses in addresses.items()
+    ]
+    members = await (
+        db["members"]
+        .find({"_chain.valid_to": None, "$or": filters})
+        .to_list(length=None)
+    )
+
+    by_key = {}
+    for member in members:
+        by_key[(member.get("daoAddress"), member["memberAddress"])] = member
+        by_key.setdefault((None, member["memberAddress"]), member)
+    return [by_key.get(key) for key in keys]
+
+
+async def load_votable_members(
+    db: AsyncIOMotorDatabase, keys: list[tuple[Optional[bytes], datetime, datetime]]
+) -> list[list[dict]]:
+    """Members who can vote on proposals, by (DAO, voting period end, submission
+    time), the windows are queried concurrently"""
+
+    async def find(dao_address, voting_period_ending_at, submitted_at) -> list[dict]:
+        query = get_votable_members_query(
+            voting_period_ending_at=voting_period_ending_at, submitted_at=submitted_at
+        )
+        members = db["members"].find(
+            {"_chain.valid_to": None, **dao_filter(dao_address), **query}
+        )
+        return await members.to_list(length=None)
+
+    return await asyncio.gather(*(find(*key) for key in keys))
+
+
+class Loaders:
+    """Batch and cache the lookups of the resolvers of a request, the fields of
+    a list of objects share one query per lookup and each distinct lookup is
+    sent to MongoDB once per request"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.bank = DataLoader(load_fn=partial(load_banks, db))
+        self.totals = DataLoader(load_fn=partial(load_totals, db))
+        self.members = DataLoader(load_fn=partial(load_members, db))
+        self.votable_members = DataLoader(load_fn=partial(load_votable_members, db))
+
+
+def get_loaders(info: Info) -> Loaders:
+    """Loaders of the request, created with its context"""
+    if "loaders" not in info.context:
+        info.context["loaders"] = Loaders(info.context["db"])
+    return info.context["loaders"]
@@ -0,0 +1,202 @@
+"""Live updates of the GraphQL API, over websockets
+
+The server follows the writes of the indexer with a single tail: when the
+last flushed block moves, the documents changed by the new blocks are read
+once, from the undo log of the indexer, and published to the queue of every
+subscriber. The cost in MongoDB doesn't depend on the number of subscribers.
+The undo entries of a block are written before it's marked as flushed, so they
+are all read.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncGenerator, Optional
+
+import strawberry
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from strawberry.types import Info
+
+from dao.indexer.undo import UNDO_COLLECTION
+
+from . import logger
+from .common import FromMongoMixin, HexValue, Transaction
+from .proposals import PROPOSAL_TYPE_TO_CLASS, Proposal
+from .storage import Loaders
+
+# Published to a subscriber whose queue is full, it ends its subscription
+OVERFLOW = None
+
+
+class SubscriptionOverflowError(Exception):
+    pass
+
+
+class IndexerTail:
+    """Documents changed by the indexer, published by collection
+
+    Only the `proposals` changed by a block and the `votes` and `transactions`
+    appended are published. The blocks are read from the head block seen first,
+    a rewind of the indexer moves the tail back without publishing anything.
+    A subscriber more than `queue_size` documents behind is dropped.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, queue_size: int, max_blocks: int):
+        self.db = db
+        self.queue_size = queue_size
+        self.max_blocks = max_blocks
+        self.block_number: Optional[int] = None
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    async def follow(self, head: Optional[int]):
+        """Publish the documents changed up to the flushed `head` block, see
+        cache.IndexedHead.listeners"""
+        after = self.block_number
+        if head is None or after is None or head <= after:
+            self.block_number = head
+            return
+
+        if head - after > self.max_blocks:
+            logger.warning(
+                "Skipping blocks %s to %s, too many blocks to publish", after, head
+            )
+        else:
+            for collection, documents in (await self.read(after, head)).items():
+                self.publish(collection, documents)
+        self.block_number = head
+
+    async def read(self, after: int, to: int) -> dict[str, list[dict]]:
+        """Documents changed by the blocks after `after` up to `to`"""
+        entries = await (
+            self.db[UNDO_COLLECTION]
+            .find(
+                {"block": {"$gt": after, "$lte": to}},
+                projection={"collection": 1, "op": 1, "documentId": 1},
+            )
+            .to_list(length=None)
+        )
+
+        changed = {}
+        proposal_ids = [
+            entry["documentId"]
+            for entry in entries
+            if entry["collection"] == "proposals" and entry["op"] != "append"
+        ]
+        if proposal_ids:
+            # The versions replaced by a later block aren't published
+            changed["proposals"] = await (
+                self.db["proposals"]
+                .find({"_id": {"$in": proposal_ids}, "_chain.valid_to": None})
+                .to_list(length=None)
+            )
+
+        appended = {entry["collection"] for entry in entries if entry["op"] == "append"}
+        for collection in ("votes", "transactions"):
+            if collection in appended:
+                changed[collection] = await (
+                    self.db[collection]
+                    .find({"_chain.valid_from": {"$gt": after, "$lte": to}})
+                    .sort("_chain.valid_from", 1)
+                    .to_list(length=None)
+                )
+        return changed
+
+    def publish(self, collection: str, documents: list[dict]):
+        for queue in list(self._subscribers[collection]):
+            try:
+                for document in documents:
+                    queue.put_nowait(document)
+            except asyncio.QueueFull:
+                self._subscribers[collection].discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(OVERFLOW)
+
+    async def subscribe(self, collection: str) -> AsyncGenerator[dict, None]:
+        """Documents of `collection` published from now on"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[collection].add(queue)
+        try:
+            while True:
+                document = await queue.get()
+                if document is OVERFLOW:
+                    raise SubscriptionOverflowError(
+                        "The subscription fell too far behind the indexer"
+                    )
+                yield document
+        finally:
+            self._subscribers[collection].discard(queue)
+
+
+def start_event(info: Info):
+    """The fields of each event of a subscription are resolved as a new request,
+    with their own time and loaders"""
+    for key in ("now", "proposal_fields", "cache_expires_at"):
+        info.context.pop(key, None)
+    info.context["loaders"] = Loaders(info.context["db"])
+
+
+def matches(document: dict, **filter) -> bool:
+    """Whether the document has the values of the filter, the None values
+    match any value"""
+    return all(
+        value is None or document.get(field) == value for field, value in filter.items()
+    )
+
+
+@strawberry.type
+class Vote(FromMongoMixin):
+    daoAddress: Optional[HexValue] = None
+    proposalId: int
+    voterAddress: HexValue
+    callerAddress: HexValue
+    vote: bool
+    # Shares of the voter when voting
+    shares: int
+    votedAt: datetime
+
+
+@strawberry.type
+class BalanceChange(Transaction):
+    daoAddress: Optional[HexValue] = None
+    ownerAddress: HexValue
+
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def proposalUpdated(
+        self,
+        info: Info,
+        daoAddress: Optional[HexValue] = None,
+        id: Optional[int] = None,  # pylint: disable=redefined-builtin
+    ) -> AsyncGenerator[Proposal, None]:
+        """Proposals submitted, voted on or processed"""
+        async for doc in info.context["tail"].subscribe("proposals"):
+            if matches(doc, daoAddress=daoAddress, id=id):
+                start_event(info)
+                yield PROPOSAL_TYPE_TO_CLASS[doc["type"]].from_mongo(doc)
+
+    @strawberry.subscription
+    async def voteSubmitted(
+        self,
+        info: Info,
+        daoAddress: Optional[HexValue] = None,
+        proposalId: Optional[int] = None,
+    ) -> AsyncGenerator[Vote, None]:
+        async for doc in info.context["tail"].subscribe("votes"):
+            if matches(doc, daoAddress=daoAddress, proposalId=proposalId):
+                start_event(info)
+                yield Vote.from_mongo(doc)
+
+    @strawberry.subscription
+    async def balanceChanged(
+        self,
+        info: Info,
+        daoAddress: Optional[HexValue] = None,
+        ownerAddress: Optional[HexValue] = None,
+    ) -> AsyncGenerator[BalanceChange, None]:
+        """Token transfers of the members and of the bank"""
+        async for doc in info.context["tail"].subscribe("transactions"):
+            if matches(doc, daoAddress=daoAddress, ownerAddress=ownerAddress):
+                start_event(info)
+                yield BalanceChange.from_mongo(doc)
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from apibara.model import BlockHeader
+from pymongo.database import Database
+from pymongo.write_concern import WriteConcern
+
+from dao import config, utils
+from dao.graphql import storage as graphql_storage
+from dao.indexer import logger, storage
+from dao.indexer.batch import BlockBatch
+from dao.indexer.cache import StateCache
+
+# Acknowledged by the primary, without waiting for the journal
+BACKFILL_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+
+def recover(db: Database, indexer_id: str):
+    """Rewind the indexer to the last flushed block when a backfill stopped
+    before flushing all the blocks apibara considers indexed"""
+    state = db["_backfill"].find_one({"indexer_id": indexer_id})
+    if state is None:
+        return
+
+    indexer = db["_apibara"].find_one({"indexer_id": indexer_id}) or {}
+    indexed_to = indexer.get("indexed_to")
+    if indexed_to is not None and indexed_to > state["flushed_to"]:
+        logger.warning(
+            "The backfill stopped at block=%s before flushing block=%s",
+            state["flushed_to"],
+            indexed_to,
+        )
+        storage.rewind(db, indexer_id, state["flushed_to"])
+
+
+class Backfill:
+    """Historical indexing mode
+
+    The blocks are written by batches of `blocks_per_flush` blocks with a
+    relaxed write concern, while the validators and the secondary indexes are
+    disabled. The last flushed block is saved in the `_backfill` collection so
+    `recover` can resume from it.
+
+    The backfill ends when a block less than `head_distance` seconds old is
+    indexed, or when no block was received during `idle_timeout` seconds, the
+    indexes and validators are then restored and the following blocks are
+    indexed one by one.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        indexer_id: str,
+        blocks_per_flush: int,
+        head_distance: float,
+        idle_timeout: float,
+    ):
+        self.db = db
+        self.indexer_id = indexer_id
+        self.blocks_per_flush = blocks_per_flush
+        self.head_distance = head_distance
+        self.idle_timeout = idle_timeout
+        self.active = False
+        # Last block written to MongoDB
+        self.flushed_to: Optional[int] = None
+        # Held while a block is handled or flushed
+        self.lock = asyncio.Lock()
+        self._batch: Optional[BlockBatch] = None
+        self._blocks = 0
+        self._last_block_at = time.monotonic()
+
+    def start(self):
+        graphql_storage.init_db(self.db, backfill=True)
+        self.active = True
+        self._last_block_at = time.monotonic()
+        logger.info("Backfill started for indexer=%s", self.indexer_id)
+
+    def get_batch(
+        self, block_number: int, cache: Optional[StateCache] = None
+    ) -> BlockBatch:
+        if self._batch is None:
+            self._batch = BlockBatch(
+                db=self.db,
+                block_number=block_number,
+                cache=cache,
+                write_concern=BACKFILL_WRITE_CONCERN,
+                versioning=config.versioning,
+            )
+        else:
+            self._batch.start_block(block_number)
+        return self._batch
+
+    def _is_at_head(self, block: BlockHeader) -> bool:
+        age = datetime.now(timezone.utc) - utils.get_block_datetime_utc(block)
+        return age.total_seconds() <= self.head_distance
+
+    async def end_block(self, block: BlockHeader):
+        self._blocks += 1
+        self._last_block_at = time.monotonic()
+
+        if self._is_at_head(block):
+            await self.finish()
+        elif self._blocks >= self.blocks_per_flush:
+            await self.flush()
+
+    async def flush(self):
+        if self._batch is None:
+            return
+
+        await self._batch.flush()
+        self.flushed_to = self._batch.block_number
+        self.db["_backfill"].update_one(
+            {"indexer_id": self.indexer_id},
+            {"$set": {"flushed_to": self._batch.block_number}},
+            upsert=True,
+        )
+        logger.info(
+            "Backfill flushed %s blocks up to block=%s",
+            self._blocks,
+            self._batch.block_number,
+        )
+        self._batch = None
+        self._blocks = 0
+
+    async def finish(self):
+        """Flush the pending blocks and switch to live indexing"""
+        await self.flush()
+        graphql_storage.init_db(self.db)
+        self.db["_backfill"].delete_one({"indexer_id": self.indexer_id})
+        self.active = False
+        logger.info("Backfill completed, switching to live indexing")
+
+    async def watch(self):
+        """Finish the backfill when the stream goes idle, apibara only sends
+        the blocks with events so the head could be reached without seeing a
+        recent block"""
+        while self.active:
+            await asyncio.sleep(self.idle_timeout)
+            idle = time.monotonic() - self._last_block_at
+            if idle < self.idle_timeout:
+                continue
+            async with self.lock:
+                if self.active:
+                    await self.finish()
@@ -55,6 +55,7 @@ class UserTokenBalanceIncreased(BaseEvent):
         return await storage.update_balance(
             info=info,
             block=block,
+            starknet_event=starknet_event,
             member_address=self.memberAddress,
             token_address=self.tokenAddress,
             amount=self.amount,
@@ -73,6 +74,7 @@ class UserTokenBalanceDecreased(BaseEvent):
         return await storage.update_balance(
             info=info,
             block=block,
+            starknet_event=starknet_event,
             member_address=self.memberAddress,
             token_address=self.tokenAddress,
             amount=-self.amount,
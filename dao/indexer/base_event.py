@@ -14,9 +14,14 @@ class BaseEvent:
     ):
         logger.debug("Inserting to 'events': %s", self)
 
+        # blockNumber, transactionHash and eventIndex are the natural key of
+        # an event, they are backed by a unique index
         event_dict = {
             "name": starknet_event.name,
             "emittedAt": utils.get_block_datetime_utc(block),
+            "blockNumber": block.number,
+            "transactionHash": starknet_event.transaction_hash,
+            "eventIndex": starknet_event.log_index,
             **asdict(self),
         }
         await info.storage.insert_one("events", event_dict)
@@ -0,0 +1,444 @@
+# pylint: disable=redefined-builtin
+from collections import defaultdict
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+from dao import config
+from dao.indexer import logger, undo
+from dao.indexer.cache import KEY_FIELDS, StateCache
+from dao.indexer.daos import DAO_FIELD
+
+Document = dict[str, Any]
+
+# Collections only receiving new documents, they are never read by the handlers
+# and their documents are written after the other collections, in this order
+APPEND_ONLY_COLLECTIONS = ("block_timestamps", "transactions", "votes", "events")
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Every update inserts a new version of the document, like apibara's storage
+COPY_VERSIONING = "copy"
+# Documents are updated in place, the previous values go to the undo log
+DELTA_VERSIONING = "delta"
+
+
+def get_path_values(doc: Any, path: str) -> list:
+    """Returns the values found at the dotted `path` of `doc`, traversing arrays
+    the same way MongoDB does when matching embedded documents"""
+    values = [doc]
+    for key in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, (list, tuple)):
+                if key.isdigit():
+                    if int(key) < len(value):
+                        next_values.append(value[int(key)])
+                    continue
+                next_values.extend(
+                    item[key]
+                    for item in value
+                    if isinstance(item, dict) and key in item
+                )
+            elif isinstance(value, dict) and key in value:
+                next_values.append(value[key])
+        values = next_values
+    return values
+
+
+def match(doc: Document, filter: dict) -> bool:
+    """Check if `doc` matches `filter`, only equality conditions are supported"""
+    for path, expected in filter.items():
+        if isinstance(expected, dict) and any(key.startswith("$") for key in expected):
+            raise NotImplementedError(f"Unsupported filter operator in {filter}")
+
+        values = get_path_values(doc, path)
+
+        # A missing field matches a None condition, like in MongoDB
+        if not values and expected is None:
+            continue
+
+        if not any(
+            value == expected
+            or (isinstance(value, (list, tuple)) and expected in value)
+            for value in values
+        ):
+            return False
+
+    return True
+
+
+def _positional_index(doc: Document, array_path: str, filter: dict) -> int:
+    prefix = array_path + "."
+    conditions = {
+        path[len(prefix) :]: value
+        for path, value in filter.items()
+        if path.startswith(prefix)
+    }
+    for index, item in enumerate(get_path_values(doc, array_path)[0]):
+        if match(item, conditions):
+            return index
+
+    raise ValueError(
+        f"The positional operator did not find the match needed from {filter}"
+    )
+
+
+def _resolve_path(doc: Document, path: str, filter: dict) -> tuple[Any, str]:
+    """Returns the parent container of `path` and the last key, the positional
+    operator `$` is resolved using the array conditions of `filter`"""
+    keys = path.split(".")
+    parent = doc
+    for position, key in enumerate(keys[:-1]):
+        if key == "$":
+            key = str(_positional_index(doc, ".".join(keys[:position]), filter))
+        parent = (
+            parent[int(key)] if isinstance(parent, list) else parent.setdefault(key, {})
+        )
+
+    last_key = keys[-1]
+    if last_key == "$":
+        last_key = str(_positional_index(doc, ".".join(keys[:-1]), filter))
+
+    return parent, last_key
+
+
+def apply_update(doc: Document, update: dict, filter: Optional[dict] = None):
+    """Apply in place the update operators used by the event handlers to `doc`"""
+    filter = filter or {}
+
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            parent, key = _resolve_path(doc, path, filter)
+            if isinstance(parent, list):
+                key = int(key)
+
+            if operator == "$set":
+                parent[key] = deepcopy(value)
+            elif operator == "$inc":
+                current = parent[key] if isinstance(parent, list) else parent.get(key)
+                parent[key] = (current or 0) + value
+            elif operator == "$push":
+                parent.setdefault(key, []).append(deepcopy(value))
+            elif operator == "$pull":
+                parent[key] = [item for item in parent.get(key, []) if item != value]
+            else:
+                raise NotImplementedError(f"Unsupported update operator {operator}")
+
+
+@dataclass
+class TrackedDocument:
+    document: Document
+    # _id of the version stored in MongoDB, None if the document was created
+    # during the batch
+    previous_id: Optional[ObjectId] = None
+    dirty: bool = False
+    # Block of the first update, the end of validity of the previous version
+    invalidated_at: Optional[int] = None
+    # Copy of the stored version, used to compute the delta of the updates
+    original: Optional[Document] = None
+
+
+class BlockBatch:
+    """Chain-aware storage recording the writes of a block
+
+    It implements the part of apibara's `Storage` used by the event handlers.
+    The documents read or written during the block are kept in memory, so the
+    handlers see their own writes, and `flush` sends all the mutations to MongoDB
+    with one ordered bulk write per collection. Append-only collections are
+    written last with one unordered `insert_many` each, documents already stored
+    are skipped thanks to their unique index.
+
+    When a `StateCache` is given, documents are read from it and the flushed
+    documents are written back to it.
+
+    In backfill mode a batch spans consecutive blocks, see `start_block`.
+
+    Every change is journaled in the undo log before being written, so the
+    blocks can be rolled back without scanning the collections, see
+    `undo.rollback`. With `DELTA_VERSIONING`, only the current version of the
+    documents is stored: updates `$set` the changed fields in place and the
+    undo log keeps the previous values.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        db: Database,
+        block_number: int,
+        cache: Optional[StateCache] = None,
+        write_concern: Optional[WriteConcern] = None,
+        versioning: str = COPY_VERSIONING,
+    ):
+        if versioning not in (COPY_VERSIONING, DELTA_VERSIONING):
+            raise ValueError(f"Unknown versioning {versioning}")
+
+        self.db = db
+        self.cache = cache
+        self.write_concern = write_concern
+        self.versioning = versioning
+        self._documents: dict[str, list[TrackedDocument]] = defaultdict(list)
+        self._appended: dict[str, list[Document]] = defaultdict(list)
+
+        self.start_block(block_number)
+
+    def start_block(self, block_number: int):
+        """Record the next writes for `block_number`
+
+        A document updated during several blocks of the batch is written as a
+        single version valid from its first update, the intermediate versions
+        are lost. This is only fine for blocks that can't be reorganized.
+        """
+        self.block_number = block_number
+        if self.cache is not None:
+            self.cache.start_block(block_number)
+
+    def _collection(self, collection: str) -> Collection:
+        return self.db.get_collection(collection, write_concern=self.write_concern)
+
+    def _chain(self) -> dict:
+        return {"valid_from": self.block_number, "valid_to": None}
+
+    def _find_tracked(self, collection: str, filter: dict) -> Optional[TrackedDocument]:
+        for tracked in self._documents[collection]:
+            if match(tracked.document, filter):
+                return tracked
+        return None
+
+    def _track(self, collection: str, doc: Document) -> TrackedDocument:
+        tracked = TrackedDocument(document=doc, previous_id=doc["_id"])
+        if self.versioning == DELTA_VERSIONING:
+            tracked.original = deepcopy(doc)
+        self._documents[collection].append(tracked)
+        return tracked
+
+    def _load_cached(self, collection: str, filter: dict) -> Optional[TrackedDocument]:
+        key_field = KEY_FIELDS[collection]
+        key = filter[key_field]
+        dao_address = filter.get(DAO_FIELD)
+
+        # The tracked version didn't match the filter in _find_tracked
+        if any(
+            tracked.document.get(key_field) == key
+            and tracked.document.get(DAO_FIELD) == dao_address
+            for tracked in self._documents[collection]
+        ):
+            return None
+
+        doc = self.cache.find_one(self.db, collection, key, dao_address=dao_address)
+        if doc is None:
+            return None
+
+        tracked = self._track(collection, doc)
+        return tracked if match(doc, filter) else None
+
+    def _load(self, collection: str, filter: dict) -> Optional[TrackedDocument]:
+        if self.cache is not None and KEY_FIELDS.get(collection) in filter:
+            return self._load_cached(collection, filter)
+
+        # Versions already tracked supersede the ones stored in MongoDB
+        tracked_ids = [
+            id_
+            for tracked in self._documents[collection]
+            for id_ in (tracked.previous_id, tracked.document["_id"])
+            if id_ is not None
+        ]
+        doc = self.db[collection].find_one(
+            {**filter, "_chain.valid_to": None, "_id": {"$nin": tracked_ids}}
+        )
+        if doc is None:
+            return None
+
+        return self._track(collection, doc)
+
+    def _get(self, collection: str, filter: dict) -> Optional[TrackedDocument]:
+        return self._find_tracked(collection, filter) or self._load(collection, filter)
+
+    def _mark_dirty(self, tracked: TrackedDocument):
+        if tracked.dirty:
+            return
+
+        if self.versioning == COPY_VERSIONING:
+            # The updated document is inserted as a new version
+            tracked.document["_id"] = ObjectId()
+            tracked.document["_chain"] = self._chain()
+        tracked.dirty = True
+        tracked.invalidated_at = self.block_number
+
+    async def insert_one(self, collection: str, doc: Document):
+        doc["_id"] = doc.get("_id") or ObjectId()
+        doc["_chain"] = self._chain()
+
+        if collection in APPEND_ONLY_COLLECTIONS:
+            self._appended[collection].append(doc)
+            return
+
+        self._documents[collection].append(
+            TrackedDocument(document=deepcopy(doc), dirty=True)
+        )
+
+    async def insert_many(self, collection: str, docs: Iterable[Document]):
+        for doc in docs:
+            await self.insert_one(collection, doc)
+
+    async def find_one(self, collection: str, filter: dict) -> Optional[Document]:
+        if tracked := self._get(collection, filter):
+            return deepcopy(tracked.document)
+        return None
+
+    async def find_one_and_update(
+        self, collection: str, filter: dict, update: dict
+    ) -> Optional[Document]:
+        tracked = self._get(collection, filter)
+        if tracked is None:
+            return None
+
+        existing = deepcopy(tracked.document)
+        self._mark_dirty(tracked)
+        apply_update(tracked.document, update, filter)
+        return existing
+
+    def _delta_operations(
+        self, collection: str, tracked_documents: list[TrackedDocument]
+    ) -> tuple[list, list[Document]]:
+        operations = []
+        undo_entries = []
+        for tracked in tracked_documents:
+            if not tracked.dirty:
+                continue
+
+            document_id = tracked.document["_id"]
+            if tracked.previous_id is None:
+                operations.append(InsertOne(tracked.document))
+                undo_entry = {
+                    "op": "insert",
+                    "block": tracked.document["_chain"]["valid_from"],
+                }
+            else:
+                update, undo_entry = undo.delta_update(
+                    tracked.original, tracked.document
+                )
+                if not update:
+                    continue
+                operations.append(UpdateOne({"_id": document_id}, update))
+                undo_entry.update({"op": "update", "block": tracked.invalidated_at})
+
+            undo_entries.append(
+                {**undo_entry, "collection": collection, "documentId": document_id}
+            )
+        return operations, undo_entries
+
+    def _copy_operations(
+        self, collection: str, tracked_documents: list[TrackedDocument]
+    ) -> tuple[list, list[Document]]:
+        operations = []
+        undo_entries = []
+        for tracked in tracked_documents:
+            if not tracked.dirty:
+                continue
+
+            undo_entry = {
+                "op": "insert",
+                "block": tracked.document["_chain"]["valid_from"],
+                "collection": collection,
+                "documentId": tracked.document["_id"],
+            }
+            if tracked.previous_id is not None:
+                operations.append(
+                    UpdateOne(
+                        {"_id": tracked.previous_id},
+                        {"$set": {"_chain.valid_to": tracked.invalidated_at}},
+                    )
+                )
+                undo_entry["previousId"] = tracked.previous_id
+            operations.append(InsertOne(tracked.document))
+            undo_entries.append(undo_entry)
+        return operations, undo_entries
+
+    def _insert_appended(self, collection: str, docs: list[Document]):
+        logger.debug(
+            "Inserting %s documents to '%s' for block=%s",
+            len(docs),
+            collection,
+            self.block_number,
+        )
+        try:
+            self._collection(collection).insert_many(docs, ordered=False)
+        except BulkWriteError as error:
+            write_errors = error.details["writeErrors"]
+            if any(err["code"] != DUPLICATE_KEY_ERROR for err in write_errors):
+                raise
+            logger.info(
+                "Skipped %s documents already in '%s' for block=%s",
+                len(write_errors),
+                collection,
+                self.block_number,
+            )
+
+    def _collection_operations(self) -> tuple[dict[str, list], list[Document]]:
+        operations = {}
+        undo_entries: list[Document] = []
+        for collection, tracked_documents in self._documents.items():
+            if self.versioning == DELTA_VERSIONING:
+                operations[collection], entries = self._delta_operations(
+                    collection, tracked_documents
+                )
+            else:
+                operations[collection], entries = self._copy_operations(
+                    collection, tracked_documents
+                )
+            undo_entries.extend(entries)
+
+        # Appended documents are removed by block, one entry per collection
+        undo_entries.extend(
+            {"op": "append", "block": self.block_number, "collection": collection}
+            for collection, docs in self._appended.items()
+            if docs
+        )
+        return operations, undo_entries
+
+    async def flush(self):
+        """Write the mutations recorded during the batch to MongoDB"""
+        operations_by_collection, undo_entries = self._collection_operations()
+
+        # The undo log is written ahead of the changes it reverts
+        if undo_entries:
+            self._collection(undo.UNDO_COLLECTION).insert_many(undo_entries)
+
+        for collection, tracked_documents in self._documents.items():
+            if operations := operations_by_collection[collection]:
+                logger.debug(
+                    "Flushing %s operations to '%s' for block=%s",
+                    len(operations),
+                    collection,
+                    self.block_number,
+                )
+                self._collection(collection).bulk_write(operations, ordered=True)
+
+            if self.cache is not None and collection in KEY_FIELDS:
+                for tracked in tracked_documents:
+                    if tracked.dirty:
+                        self.cache.put(collection, tracked.document)
+
+        if self.cache is not None:
+            logger.debug("State cache stats: %s", self.cache.stats)
+
+        for collection in APPEND_ONLY_COLLECTIONS:
+            if docs := self._appended.get(collection):
+                self._insert_appended(collection, docs)
+
+        if undo_entries:
+            undo.prune(self.db, self.block_number - config.undo_log_depth)
+        # Written last, the block is only seen as indexed once all its writes
+        # are done
+        undo.set_flushed(self.db, self.block_number)
+
+        self._documents.clear()
+        self._appended.clear()
@@ -0,0 +1,137 @@
+from copy import deepcopy
+from typing import Any, Callable, Optional
+
+import bson
+from cachetools import LRUCache
+from pymongo.database import Database
+
+from dao.indexer import logger
+from dao.indexer.daos import DAO_FIELD
+
+Document = dict[str, Any]
+
+# Field identifying the current version of a document of a DAO in each cached
+# collection
+KEY_FIELDS = {
+    "members": "memberAddress",
+    "proposals": "id",
+    "bank": "bankAddress",
+}
+
+
+def document_size(doc: Document) -> int:
+    """Approximate the memory used by a cached document with its BSON size"""
+    return len(bson.encode(doc))
+
+
+class DocumentsLRU(LRUCache):
+    def __init__(self, maxsize: int, on_evict: Callable[[tuple], None]):
+        super().__init__(maxsize=maxsize, getsizeof=document_size)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key)
+        return key, value
+
+
+class StateCache:
+    """Write-through cache of the current version of the members, proposals
+    and bank documents
+
+    The cache is bounded by `max_bytes`, the least recently used documents are
+    evicted first. A collection is complete when all its current documents are
+    cached, in that case a cache miss means the document doesn't exist and
+    MongoDB isn't queried.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._documents = DocumentsLRU(maxsize=max_bytes, on_evict=self._on_evict)
+        self._complete: set[str] = set()
+        self.block_number: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _on_evict(self, key: tuple):
+        collection = key[0]
+        self._complete.discard(collection)
+        self.evictions += 1
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "documents": len(self._documents),
+            "bytes": self._documents.currsize,
+            "max_bytes": self._documents.maxsize,
+        }
+
+    def clear(self):
+        self._documents.clear()
+        self._complete.clear()
+        self.block_number = None
+
+    def put(self, collection: str, doc: Document):
+        key = (collection, doc.get(DAO_FIELD), doc[KEY_FIELDS[collection]])
+        try:
+            self._documents[key] = doc
+        except ValueError:
+            # The document alone is bigger than the cache
+            self._documents.pop(key, None)
+            self._on_evict(key)
+
+    def find_one(
+        self,
+        db: Database,
+        collection: str,
+        key: Any,
+        dao_address: Optional[bytes] = None,
+    ) -> Optional[Document]:
+        """Returns a copy of the current document of `collection` identified by
+        `key` in the DAO, MongoDB is only queried when the document isn't
+        cached"""
+        if (collection, dao_address, key) in self._documents:
+            self.hits += 1
+            return deepcopy(self._documents[(collection, dao_address, key)])
+
+        if collection in self._complete:
+            self.hits += 1
+            return None
+
+        self.misses += 1
+        doc = db[collection].find_one(
+            {
+                DAO_FIELD: dao_address,
+                KEY_FIELDS[collection]: key,
+                "_chain.valid_to": None,
+            }
+        )
+        if doc is not None:
+            self.put(collection, doc)
+
+        return deepcopy(doc)
+
+    def start_block(self, block_number: int):
+        """Drop the cache if the indexer goes back to an already indexed block,
+        after a chain reorganization for example"""
+        if self.block_number is not None and block_number <= self.block_number:
+            logger.info(
+                "Clearing the state cache, block=%s is before the last cached block=%s",
+                block_number,
+                self.block_number,
+            )
+            self.clear()
+
+        self.block_number = block_number
+
+    def warm(self, db: Database):
+        """Load the current documents of the cached collections"""
+        for collection in KEY_FIELDS:
+            self._complete.add(collection)
+            for doc in db[collection].find({"_chain.valid_to": None}):
+                self.put(collection, doc)
+
+        logger.info("State cache warmed: %s", self.stats)
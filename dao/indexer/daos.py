@@ -0,0 +1,98 @@
+# pylint: disable=redefined-builtin
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from apibara import Info
+from apibara.model import StarkNetEvent
+from pymongo.database import Database
+
+from dao import config, utils
+from dao.indexer import logger
+
+# Field of the documents identifying the DAO they belong to, the address of its
+# contract
+DAO_FIELD = "daoAddress"
+
+# Collections written by the event handlers, all partitioned by DAO
+PARTITIONED_COLLECTIONS = (
+    "members",
+    "proposals",
+    "bank",
+    "proposal_params",
+    "events",
+    "transactions",
+    "votes",
+)
+
+
+@dataclass(frozen=True)
+class Dao:
+    address: bytes
+    bank_address: bytes
+
+    @classmethod
+    def from_hex(cls, address: str, bank_address: Optional[str] = None) -> "Dao":
+        return cls(
+            address=utils.int_to_bytes(int(address, 16)),
+            bank_address=utils.int_to_bytes(
+                config.bank_address if bank_address is None else int(bank_address, 16)
+            ),
+        )
+
+
+def get_dao(info: Info, starknet_event: StarkNetEvent) -> Dao:
+    """Returns the DAO emitting the event, the DAOs indexed are in the `daos`
+    context, indexed by address. Without it, the event's contract is the DAO
+    and its bank is the configured one."""
+    address = utils.int_to_bytes(int.from_bytes(starknet_event.address, "big"))
+    daos = info.context.get("daos")
+    if daos is None:
+        return Dao(
+            address=address, bank_address=utils.int_to_bytes(config.bank_address)
+        )
+    return daos[address]
+
+
+def assign_dao(db: Database, dao: Dao):
+    """Assign to `dao` the documents indexed before the documents were
+    partitioned by DAO"""
+    for collection in PARTITIONED_COLLECTIONS:
+        result = db[collection].update_many(
+            {DAO_FIELD: {"$exists": False}}, {"$set": {DAO_FIELD: dao.address}}
+        )
+        if result.modified_count:
+            logger.info(
+                "Assigned %s documents of '%s' to dao=%s",
+                result.modified_count,
+                collection,
+                dao.address.hex(),
+            )
+
+
+class DaoStorage:
+    """View of the storage restricted to the documents of a DAO, the DAO is
+    added to the filters and to the inserted documents"""
+
+    def __init__(self, storage, dao: Dao):
+        self.storage = storage
+        self.dao = dao
+
+    async def insert_one(self, collection: str, doc: dict):
+        await self.storage.insert_one(collection, {**doc, DAO_FIELD: self.dao.address})
+
+    async def insert_many(self, collection: str, docs: Iterable[dict]):
+        await self.storage.insert_many(
+            collection, [{**doc, DAO_FIELD: self.dao.address} for doc in docs]
+        )
+
+    async def find_one(self, collection: str, filter: dict) -> Optional[dict]:
+        return await self.storage.find_one(
+            collection, {DAO_FIELD: self.dao.address, **filter}
+        )
+
+    async def find_one_and_update(
+        self, collection: str, filter: dict, update: dict
+    ) -> Optional[dict]:
+        return await self.storage.find_one_and_update(
+            collection, {DAO_FIELD: self.dao.address, **filter}, update
+        )
@@ -1,9 +1,11 @@
 import asyncio
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Callable, Type, Union
+from typing import Any, Callable, Optional, Type, Union
 
 from apibara import Info
 from apibara.model import BlockHeader, StarkNetEvent
+from starknet_py.contract import Contract
 from starknet_py.utils.data_transformer.data_transformer import CairoSerializer
 
 from ..utils import (
@@ -32,11 +34,15 @@ async def deserialize_block_number(
     block: BlockHeader,
     starknet_event: StarkNetEvent,
 ) -> datetime:
-    if block.number != block_number:
-        block = await get_block(
-            block_number=block_number, client=info.context["starknet_client"]
-        )
+    if block.number == block_number:
+        return get_block_datetime_utc(block)
+
+    if block_timestamps := info.context.get("block_timestamps"):
+        return await block_timestamps.get(block_number)
 
+    block = await get_block(
+        block_number=block_number, client=info.context["starknet_client"]
+    )
     return get_block_datetime_utc(block)
 
 
@@ -56,58 +62,151 @@ deserializers: dict[Type, Serializer] = {
 }
 
 
-# pylint: disable=too-many-locals
-async def deserialize_starknet_event(
-    fields: dict[str, Type],
-    info: Info,
-    block: BlockHeader,
-    starknet_event: StarkNetEvent,
-) -> dict:
-    contract = await get_contract(
-        starknet_event.address.hex(), info.context["starknet_client"]
-    )
+@dataclass
+class FieldDecoder:
+    name: str
+    field_type: Type
+    deserializer: Serializer
+    # Whether the deserializer takes info, block and starknet_event arguments
+    needs_context: bool
+
+
+@dataclass
+class DecodingPlan:
+    """Everything needed to decode an event, computed once per contract address,
+    event name and event class"""
+
+    event_name: str
+    value_types: list[dict]
+    cairo_serializer: CairoSerializer
+    fields: list[FieldDecoder]
+
+    def parse(self, starknet_event: StarkNetEvent) -> Any:
+        # Transforms cairo data to python (needs types of the values and values)
+        event_data = [int.from_bytes(b, "big") for b in starknet_event.data]
+        return self.cairo_serializer.to_python(
+            value_types=self.value_types,
+            values=event_data,
+        )
+
+    def block_numbers(self, python_data: Any) -> list[int]:
+        """Returns the values of the BlockNumber fields of a parsed event"""
+        return [
+            getattr(python_data, field.name)
+            for field in self.fields
+            if field.field_type is BlockNumber
+        ]
+
+    async def decode(
+        self,
+        info: Info,
+        block: BlockHeader,
+        starknet_event: StarkNetEvent,
+        python_data: Optional[Any] = None,
+    ) -> dict:
+        if python_data is None:
+            python_data = self.parse(starknet_event)
+
+        kwargs = {}
+        for field in self.fields:
+            value = getattr(python_data, field.name)
+
+            if field.needs_context:
+                value = field.deserializer(
+                    value, info=info, block=block, starknet_event=starknet_event
+                )
+            else:
+                value = field.deserializer(value)
+
+            if asyncio.iscoroutine(value):
+                value = await value
 
-    contract_events = get_contract_events(contract)
+            kwargs[field.name] = value
 
+        return kwargs
+
+
+def compile_decoding_plan(
+    contract: Contract, event_name: str, event_class: Type
+) -> DecodingPlan:
     # Takes an abi of the event which data we want to serialize
-    emitted_event_abi = contract_events[starknet_event.name]
+    emitted_event_abi = get_contract_events(contract)[event_name]
+    abi_names = {member["name"] for member in emitted_event_abi["data"]}
 
-    # Creates CairoSerializer with contract's identifier manager
-    cairo_serializer = CairoSerializer(contract.data.identifier_manager)
+    # TODO: validate the matching between the fields and their types
+    # in the abi and __annotations__
+    fields = []
+    for name, field_type in event_class.__annotations__.items():
+        deserializer = deserializers.get(field_type)
+        if deserializer is None:
+            raise ValueError(f"No deserializer found for type {field_type}")
 
-    # Transforms cairo data to python (needs types of the values and values)
-    event_data = [int.from_bytes(b, "big") for b in starknet_event.data]
-    python_data = cairo_serializer.to_python(
+        if name not in abi_names:
+            raise AttributeError(
+                f"Event {event_name}({', '.join(abi_names)}) doesn't have"
+                f" attribute named {name}",
+            )
+
+        fields.append(
+            FieldDecoder(
+                name=name,
+                field_type=field_type,
+                deserializer=deserializer,
+                needs_context=function_accepts(
+                    deserializer, ("info", "block", "starknet_event")
+                ),
+            )
+        )
+
+    return DecodingPlan(
+        event_name=event_name,
         value_types=emitted_event_abi["data"],
-        values=event_data,
+        # Creates CairoSerializer with contract's identifier manager
+        cairo_serializer=CairoSerializer(contract.data.identifier_manager),
+        fields=fields,
     )
 
-    # TODO: validate the matching between the fields and their types
-    # in python_data and __annotations__
-    kwargs = {}
-    for name, field_type in fields.items():
-        if deserializer := deserializers.get(field_type):
-            if not hasattr(python_data.tuple_value, name):
-                raise AttributeError(
-                    f"Received event {starknet_event.name}({python_data}) doesn't have"
-                    f" attribute named {name}",
-                )
 
-            value = getattr(python_data, name)
+class DecoderRegistry:
+    """Cache of the decoding plans of the indexed events"""
 
-            # Pass info, block and event arguments if the serializer accepts them
-            if function_accepts(deserializer, ("info", "block", "starknet_event")):
-                deserialized_value = deserializer(
-                    value, info=info, block=block, starknet_event=starknet_event
-                )
-            else:
-                deserialized_value = deserializer(value)
+    def __init__(self):
+        self._contracts: dict[bytes, Contract] = {}
+        self._plans: dict[tuple[bytes, str, Type], DecodingPlan] = {}
 
-            if asyncio.iscoroutine(deserialized_value):
-                deserialized_value = await deserialized_value
+    def add_contract(self, address: bytes, contract: Contract):
+        """Register a contract to avoid fetching it from the Starknet network"""
+        self._contracts[address] = contract
+
+    async def get_contract(self, info: Info, address: bytes) -> Contract:
+        if (contract := self._contracts.get(address)) is None:
+            contract = await get_contract(
+                address.hex(), info.context["starknet_client"]
+            )
+            self._contracts[address] = contract
+        return contract
+
+    async def get_plan(
+        self, event_class: Type, info: Info, starknet_event: StarkNetEvent
+    ) -> DecodingPlan:
+        key = (starknet_event.address, starknet_event.name, event_class)
+
+        if (plan := self._plans.get(key)) is None:
+            contract = await self.get_contract(info, starknet_event.address)
+            plan = compile_decoding_plan(contract, starknet_event.name, event_class)
+            self._plans[key] = plan
+
+        return plan
+
+    async def decode(
+        self,
+        event_class: Type,
+        info: Info,
+        block: BlockHeader,
+        starknet_event: StarkNetEvent,
+    ) -> dict:
+        plan = await self.get_plan(event_class, info, starknet_event)
+        return await plan.decode(info=info, block=block, starknet_event=starknet_event)
 
-            kwargs[name] = deserialized_value
-        else:
-            raise ValueError(f"No deserializer found for type {field_type}")
 
-    return kwargs
+decoder_registry = DecoderRegistry()
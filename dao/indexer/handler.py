@@ -1,11 +1,16 @@
-from typing import Any, Callable, Coroutine, Type
+import asyncio
+import copy
+from typing import Any, Callable, Coroutine, Optional, Type
 
 from apibara import Info
 from apibara.model import BlockHeader, NewEvents, StarkNetEvent
 
-from dao.indexer import bank, logger, members, proposals
+from dao import config, utils
+from dao.indexer import bank, logger, members, proposals, storage
 from dao.indexer.base_event import BaseEvent
-from dao.indexer.deserializer import deserialize_starknet_event
+from dao.indexer.batch import BlockBatch
+from dao.indexer.daos import DaoStorage, get_dao
+from dao.indexer.deserializer import decoder_registry
 
 EventHandler = Callable[[Info, BlockHeader, StarkNetEvent], Coroutine[Any, Any, None]]
 
@@ -30,32 +35,140 @@ ALL_EVENTS: dict[str, Type[BaseEvent]] = {
 }
 
 
-async def default_new_events_handler(
+async def decode_block_events(
     info: Info,
     block_events: NewEvents,
-    event_classes: dict[str, Type[BaseEvent]] = None,
-):
-    if event_classes is None:
-        event_classes = ALL_EVENTS
+    event_classes: dict[str, Type[BaseEvent]],
+) -> list[tuple[StarkNetEvent, BaseEvent]]:
+    """Decode concurrently the events of a block, the decoded events are returned
+    in the order they were emitted"""
+    semaphore = asyncio.Semaphore(config.decode_concurrency)
 
-    for starknet_event in block_events.events:
-        if event_class := event_classes.get(starknet_event.name):
-            logger.debug(
-                "Handling event=%s emitted during block=%s with event_class=%s",
-                block_events.block,
-                starknet_event.name,
-                event_class,
+    async def parse(starknet_event: StarkNetEvent, event_class: Type[BaseEvent]):
+        async with semaphore:
+            plan = await decoder_registry.get_plan(
+                event_class=event_class, info=info, starknet_event=starknet_event
             )
-            kwargs = await deserialize_starknet_event(
-                fields=event_class.__annotations__,
+        return starknet_event, event_class, plan, plan.parse(starknet_event)
+
+    async def decode(starknet_event, event_class, plan, python_data):
+        async with semaphore:
+            kwargs = await plan.decode(
                 info=info,
                 block=block_events.block,
                 starknet_event=starknet_event,
+                python_data=python_data,
             )
-            event = event_class(**kwargs)
+        return starknet_event, event_class(**kwargs)
 
-            await event.handle(
-                info=info, block=block_events.block, starknet_event=starknet_event
-            )
+    parse_tasks = []
+    for starknet_event in block_events.events:
+        if event_class := event_classes.get(starknet_event.name):
+            parse_tasks.append(parse(starknet_event, event_class))
         else:
             logger.error("Cannot find event class for %s", starknet_event)
+
+    parsed_events = await asyncio.gather(*parse_tasks)
+
+    # Fetch concurrently the timestamps of the blocks referenced by the events
+    if (block_timestamps := info.context.get("block_timestamps")) is not None:
+        await block_timestamps.prefetch(
+            (
+                block_number
+                for _, _, plan, python_data in parsed_events
+                for block_number in plan.block_numbers(python_data)
+            ),
+            semaphore=semaphore,
+        )
+
+    return await asyncio.gather(
+        *(decode(*parsed_event) for parsed_event in parsed_events)
+    )
+
+
+async def handle_block(
+    info: Info,
+    block_events: NewEvents,
+    event_classes: dict[str, Type[BaseEvent]],
+    batch: BlockBatch,
+):
+    """Handle the events of a block, the writes are recorded in `batch`"""
+    block_info = copy.copy(info)
+    block_info.storage = batch
+
+    block_timestamps = info.context.get("block_timestamps")
+    if block_timestamps is not None:
+        block_timestamps.record(block_events.block)
+
+    # Events are decoded concurrently but handled one by one in the order they
+    # were emitted, each handler sees the state left by the previous one
+    events = await decode_block_events(block_info, block_events, event_classes)
+
+    for starknet_event, event in events:
+        logger.debug(
+            "Handling event=%s emitted during block=%s with event_class=%s",
+            starknet_event.name,
+            block_events.block.number,
+            event.__class__,
+        )
+        # The handlers only see the documents of the DAO emitting the event
+        event_info = copy.copy(block_info)
+        event_info.storage = DaoStorage(batch, get_dao(info, starknet_event))
+        await event.handle(
+            info=event_info,
+            block=block_events.block,
+            starknet_event=starknet_event,
+        )
+
+    if block_timestamps is not None:
+        await batch.insert_many("block_timestamps", block_timestamps.take_new())
+
+
+def end_block(info: Info, flushed_to: Optional[int]):
+    """Called after each block, `flushed_to` is the last block written to
+    MongoDB"""
+    snapshots = info.context.get("snapshots")
+    if snapshots is not None and flushed_to is not None:
+        snapshots.end_block(info.context["db"], flushed_to)
+
+
+async def default_new_events_handler(
+    info: Info,
+    block_events: NewEvents,
+    event_classes: dict[str, Type[BaseEvent]] = None,
+):
+    if event_classes is None:
+        event_classes = ALL_EVENTS
+
+    # The block could be received again if the indexer stopped before apibara
+    # saved its progress
+    if await storage.is_block_indexed(info, block_events.block.number):
+        logger.info("Skipping already indexed block=%s", block_events.block.number)
+        return
+
+    backfill = info.context.get("backfill")
+    if backfill is not None and backfill.active:
+        async with backfill.lock:
+            # The backfill could have finished while waiting for the lock
+            if backfill.active:
+                batch = backfill.get_batch(
+                    block_number=block_events.block.number,
+                    cache=info.context.get("state_cache"),
+                )
+                await handle_block(info, block_events, event_classes, batch)
+                await backfill.end_block(block_events.block)
+                end_block(info, flushed_to=backfill.flushed_to)
+                return
+
+    # Handlers write to a block-scoped batch instead of apibara's storage, the
+    # batch is flushed once all the events of the block are handled
+    batch = BlockBatch(
+        db=info.context["db"],
+        block_number=block_events.block.number,
+        cache=info.context.get("state_cache"),
+        versioning=config.versioning,
+    )
+    await handle_block(info, block_events, event_classes, batch)
+    await batch.flush()
+    end_block(info, flushed_to=block_events.block.number)
+    logger.debug("Gateway cache stats: %s", utils.gateway_cache_stats())
@@ -1,18 +1,54 @@
-from typing import Any, Callable, Coroutine
+import asyncio
+from functools import wraps
+from typing import Any, Callable, Coroutine, Optional
 
 from apibara import IndexerRunner, Info
 from apibara.indexer import IndexerRunnerConfiguration
 from apibara.model import BlockHeader, EventFilter, StarkNetEvent
+from pymongo.database import Database
 from starknet_py.net.gateway_client import GatewayClient
 
 from dao import config
 from dao.graphql import storage
-from dao.indexer import logger
+from dao.indexer import backfill as backfill_mode
+from dao.indexer import logger, snapshots
+from dao.indexer import storage as indexer_storage
+from dao.indexer import undo
+from dao.indexer.cache import StateCache
+from dao.indexer.daos import Dao, assign_dao
 from dao.indexer.handler import default_new_events_handler
+from dao.indexer.recording import EventsRecorder, recording_handler
+from dao.indexer.timestamps import BlockTimestamps
 
 EventHandler = Callable[[Info, BlockHeader, StarkNetEvent], Coroutine[Any, Any, None]]
 
 
+def replace_invalidate(apibara_storage, db: Database, indexer_id: str):
+    """Invalidate the reorganized blocks with the undo log, apibara's storage
+    scans every collection"""
+
+    def invalidate(block_number: int, *_args, **_kwargs):
+        # Apibara invalidates `block_number` included and resumes from it, the
+        # data is kept up to the block before
+        indexer_storage.rewind(db, indexer_id, block_number - 1)
+
+    apibara_storage.invalidate = invalidate
+
+
+def on_invalidate(apibara_storage, callback: Callable[[int], None]):
+    """Call `callback` with the first invalidated block number every time
+    apibara invalidates the indexed data after a chain reorganization"""
+    invalidate = apibara_storage.invalidate
+
+    @wraps(invalidate)
+    def wrapper(block_number: int, *args, **kwargs):
+        result = invalidate(block_number, *args, **kwargs)
+        callback(block_number)
+        return result
+
+    apibara_storage.invalidate = wrapper
+
+
 # pylint: disable=too-many-arguments
 async def run_indexer(
     server_url,
@@ -23,10 +59,16 @@ async def run_indexer(
     restart: bool = False,
     indexer_id: str = config.indexer_id,
     new_events_handler=default_new_events_handler,
+    daos: Optional[list[Dao]] = None,
+    backfill: bool = False,
+    record: Optional[str] = None,
+    snapshot_dir: Optional[str] = None,
+    from_snapshot: Optional[str] = None,
 ):
     logger.info(
         "Starting the indexer with server_url=%s, mongo_url=%s,"
-        " starknet_network_url=%s, indexer_id=%s, restart=%s, ssl=%s, filters=%s",
+        " starknet_network_url=%s, indexer_id=%s, restart=%s, ssl=%s, filters=%s,"
+        " daos=%s, backfill=%s, record=%s, snapshot_dir=%s, from_snapshot=%s",
         server_url,
         mongo_url,
         starknet_network_url,
@@ -34,8 +76,18 @@ async def run_indexer(
         restart,
         ssl,
         filters,
+        daos,
+        backfill,
+        record,
+        snapshot_dir,
+        from_snapshot,
     )
 
+    recorder = None
+    if record is not None:
+        recorder = EventsRecorder(record)
+        new_events_handler = recording_handler(recorder, new_events_handler)
+
     runner = IndexerRunner(
         config=IndexerRunnerConfiguration(
             apibara_url=server_url,
@@ -48,14 +100,69 @@ async def run_indexer(
     )
 
     # pylint: disable=protected-access
-    storage.init_db(runner._indexer_storage.db)
+    db = runner._indexer_storage.db
+    if from_snapshot is not None:
+        # Restored before the indexes are created, the inserts are faster
+        snapshots.restore_snapshot(
+            db, snapshots.find_snapshot(from_snapshot), indexer_id
+        )
+    # The indexer could have stopped in the middle of a flush
+    undo.recover(db)
+    if daos is not None and len(daos) == 1:
+        # The database was indexed for this DAO alone
+        assign_dao(db, daos[0])
+    indexer_storage.init_bank_totals(db)
+    indexer_storage.init_proposal_vote_totals(db)
+    # The validators and the secondary indexes are installed once the backfill
+    # is done, see Backfill
+    storage.init_db(db, backfill=backfill)
+    # After the unique index of the transactions is made partial
+    indexer_storage.init_transactions(db)
+    # A previous backfill could have stopped with blocks that weren't flushed
+    backfill_mode.recover(db, indexer_id)
 
-    runner.set_context(
-        {
-            "starknet_network_url": starknet_network_url,
-            "starknet_client": GatewayClient(starknet_network_url),
-        }
-    )
+    starknet_client = GatewayClient(starknet_network_url)
+    state_cache = StateCache(max_bytes=config.state_cache_max_bytes)
+    block_timestamps = BlockTimestamps(db=db, client=starknet_client)
+
+    # The database is dropped when restarting, there is nothing to load
+    if not restart:
+        state_cache.warm(db)
+        block_timestamps.load()
+
+    # The state is reloaded once the documents are restored
+    replace_invalidate(runner._indexer_storage, db, indexer_id)
+    on_invalidate(runner._indexer_storage, lambda _: state_cache.clear())
+    on_invalidate(runner._indexer_storage, lambda _: block_timestamps.load())
+
+    context = {
+        "db": db,
+        "state_cache": state_cache,
+        "block_timestamps": block_timestamps,
+        "starknet_network_url": starknet_network_url,
+        "starknet_client": starknet_client,
+    }
+    if daos is not None:
+        context["daos"] = {dao.address: dao for dao in daos}
+
+    if snapshot_dir is not None:
+        context["snapshots"] = snapshots.Snapshots(
+            directory=snapshot_dir,
+            interval=config.snapshot_interval,
+            keep=config.snapshot_keep,
+        )
+
+    if backfill:
+        context["backfill"] = backfill_mode.Backfill(
+            db=db,
+            indexer_id=indexer_id,
+            blocks_per_flush=config.backfill_blocks_per_flush,
+            head_distance=config.backfill_head_distance,
+            idle_timeout=config.backfill_idle_timeout,
+        )
+        context["backfill"].start()
+
+    runner.set_context(context)
 
     # Create the indexer if it doesn't exist on the server,
     # otherwise it will resume indexing from where it left off.
@@ -66,4 +173,14 @@ async def run_indexer(
 
     logger.info("Initialization completed. Entering main loop.")
 
-    await runner.run()
+    if backfill:
+        # Keep a reference to the task so it isn't garbage collected
+        watch_task = asyncio.create_task(context["backfill"].watch())
+
+    try:
+        await runner.run()
+    finally:
+        if backfill:
+            watch_task.cancel()
+        if recorder is not None:
+            recorder.close()
@@ -19,12 +19,37 @@ class VoteSubmitted(BaseEvent):
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
-        # TODO: store both callerAddress and onBehalfAddress, we'll need to know
-        # who voted at some point
+        # The vote weighs the shares of the member when voting, like on-chain
+        member = await storage.get_member(
+            member_address=self.onBehalfAddress, info=info
+        )
+        shares = member["shares"] if member else 0
+
+        await info.storage.insert_one(
+            "votes",
+            {
+                "proposalId": self.proposalId,
+                "voterAddress": self.onBehalfAddress,
+                "callerAddress": self.callerAddress,
+                "vote": self.vote,
+                "shares": shares,
+                "votedAt": utils.get_block_datetime_utc(block),
+                "blockNumber": block.number,
+                "transactionHash": starknet_event.transaction_hash,
+                "eventIndex": starknet_event.log_index,
+            },
+        )
+
         if self.vote:
-            update_proposal_vote = {"$push": {"yesVoters": self.onBehalfAddress}}
+            update_proposal_vote = {
+                "$push": {"yesVoters": self.onBehalfAddress},
+                "$inc": {"yesVotesTotal": shares},
+            }
         else:
-            update_proposal_vote = {"$push": {"noVoters": self.onBehalfAddress}}
+            update_proposal_vote = {
+                "$push": {"noVoters": self.onBehalfAddress},
+                "$inc": {"noVotesTotal": shares},
+            }
 
         await storage.update_proposal(
             proposal_id=self.proposalId,
@@ -60,6 +85,7 @@ class MemberAdded(BaseEvent):
             "exitedAt": None,
         }
         await info.storage.insert_one("members", member_dict)
+        await storage.update_bank_totals(info, shares=self.shares, loot=self.loot)
 
 
 @dataclass
@@ -83,11 +109,17 @@ class MemberUpdated(BaseEvent):
         update_member_dict["jailedAt"] = block_datetime if self.jailed else None
         update_member_dict["exitedAt"] = block_datetime if not self.shares else None
 
-        return await storage.update_member(
+        existing = await storage.update_member(
             member_address=self.memberAddress,
             update={"$set": update_member_dict},
             info=info,
         )
+        if existing is not None:
+            await storage.update_bank_totals(
+                info,
+                shares=self.shares - existing["shares"],
+                loot=self.loot - existing["loot"],
+            )
 
 
 @dataclass
@@ -39,6 +39,8 @@ class ProposalAdded(BaseEvent):
         proposal_dict = {
             **asdict(self),
             **proposal_params,
+            "yesVotesTotal": 0,
+            "noVotesTotal": 0,
             "rawStatus": ProposalRawStatus.SUBMITTED.value,
             "rawStatusHistory": [
                 (
@@ -0,0 +1,238 @@
+import gzip
+import json
+import zlib
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Iterator, Optional, Type, Union
+
+from apibara import Info
+from apibara.model import BlockHeader, NewEvents, StarkNetEvent
+from pymongo.database import Database
+from starknet_py.contract import Contract
+from starknet_py.net.gateway_client import GatewayClient
+
+from dao import config
+from dao.graphql import storage
+from dao.indexer import logger
+from dao.indexer.base_event import BaseEvent
+from dao.indexer.cache import StateCache
+from dao.indexer.daos import Dao, get_dao
+from dao.indexer.deserializer import decoder_registry
+from dao.indexer.handler import ALL_EVENTS, default_new_events_handler
+from dao.indexer.timestamps import BlockTimestamps
+
+# A recording is a gzipped JSON lines file, each line is either:
+# - {"type": "contract", "address": ..., "abi": [...]}, written before the first
+#   block with events of the contract
+# - {"type": "dao", "address": ..., "bankAddress": ...}, the DAO of the contract,
+#   written after it
+# - {"type": "block", "block": {...}, "events": [...], "timestamps": {...}}, the
+#   timestamps are the ones of the other blocks referenced by the events
+# Bytes are hex encoded and datetimes are in ISO 8601 format.
+
+
+def encode_block(block: BlockHeader) -> dict:
+    return {
+        "hash": block.hash.hex(),
+        "parent_hash": block.parent_hash.hex() if block.parent_hash else None,
+        "number": block.number,
+        "timestamp": block.timestamp.isoformat(),
+    }
+
+
+def decode_block(data: dict) -> BlockHeader:
+    return BlockHeader(
+        hash=bytes.fromhex(data["hash"]),
+        parent_hash=(
+            bytes.fromhex(data["parent_hash"]) if data["parent_hash"] else None
+        ),
+        number=data["number"],
+        timestamp=datetime.fromisoformat(data["timestamp"]),
+    )
+
+
+def encode_event(event: StarkNetEvent) -> dict:
+    return {
+        "address": event.address.hex(),
+        "log_index": event.log_index,
+        "topics": [topic.hex() for topic in event.topics],
+        "data": [value.hex() for value in event.data],
+        "transaction_hash": event.transaction_hash.hex(),
+        "name": event.name,
+    }
+
+
+def decode_event(data: dict) -> StarkNetEvent:
+    return StarkNetEvent(
+        address=bytes.fromhex(data["address"]),
+        log_index=data["log_index"],
+        topics=[bytes.fromhex(topic) for topic in data["topics"]],
+        data=[bytes.fromhex(value) for value in data["data"]],
+        transaction_hash=bytes.fromhex(data["transaction_hash"]),
+        name=data["name"],
+    )
+
+
+class EventsRecorder:
+    """Append the blocks received by the indexer to a recording"""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        event_classes: Optional[dict[str, Type[BaseEvent]]] = None,
+    ):
+        self.path = Path(path)
+        self.event_classes = ALL_EVENTS if event_classes is None else event_classes
+        self._file = None
+        self._addresses: set[bytes] = set()
+
+    def _write(self, entry: dict):
+        if self._file is None:
+            self._file = gzip.open(self.path, "ab")
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        self._file.write(line.encode("utf-8"))
+
+    async def _referenced_timestamps(
+        self, info: Info, block_events: NewEvents
+    ) -> dict[str, str]:
+        block_timestamps = info.context.get("block_timestamps")
+        if block_timestamps is None:
+            return {}
+
+        timestamps = {}
+        for starknet_event in block_events.events:
+            if (event_class := self.event_classes.get(starknet_event.name)) is None:
+                continue
+            plan = await decoder_registry.get_plan(event_class, info, starknet_event)
+            for number in plan.block_numbers(plan.parse(starknet_event)):
+                if number != block_events.block.number:
+                    timestamp = await block_timestamps.get(number)
+                    timestamps[str(number)] = timestamp.isoformat()
+
+        return timestamps
+
+    async def record(self, info: Info, block_events: NewEvents):
+        for starknet_event in block_events.events:
+            if starknet_event.address in self._addresses:
+                continue
+            contract = await decoder_registry.get_contract(info, starknet_event.address)
+            self._write(
+                {
+                    "type": "contract",
+                    "address": starknet_event.address.hex(),
+                    "abi": contract.data.abi,
+                }
+            )
+            # The bank of the DAO could be another than the configured one
+            dao = get_dao(info, starknet_event)
+            self._write(
+                {
+                    "type": "dao",
+                    "address": dao.address.hex(),
+                    "bankAddress": dao.bank_address.hex(),
+                }
+            )
+            self._addresses.add(starknet_event.address)
+
+        self._write(
+            {
+                "type": "block",
+                "block": encode_block(block_events.block),
+                "events": [encode_event(event) for event in block_events.events],
+                "timestamps": await self._referenced_timestamps(info, block_events),
+            }
+        )
+        # Complete the compressed block so a recording interrupted by a crash can
+        # be read up to its last block
+        self._file.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def recording_handler(recorder: EventsRecorder, new_events_handler):
+    """Wrap `new_events_handler` to record the blocks it handled"""
+
+    @wraps(new_events_handler)
+    async def handler(info: Info, block_events: NewEvents):
+        await new_events_handler(info, block_events)
+        await recorder.record(info, block_events)
+
+    return handler
+
+
+def read_recording(path: Union[str, Path]) -> Iterator[dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            logger.warning("The recording %s is truncated", path)
+
+
+async def replay(
+    path: Union[str, Path],
+    db: Database,
+    starknet_network_url: str = config.starknet_network_url,
+    new_events_handler=default_new_events_handler,
+) -> int:
+    """Feed the blocks of a recording to `new_events_handler`, the contracts,
+    the DAOs and the timestamps come from the recording so the Starknet gateway
+    is only queried for what is missing. Returns the number of replayed
+    blocks."""
+    storage.init_db(db)
+
+    starknet_client = GatewayClient(starknet_network_url)
+    state_cache = StateCache(max_bytes=config.state_cache_max_bytes)
+    state_cache.warm(db)
+    block_timestamps = BlockTimestamps(db=db, client=starknet_client)
+    block_timestamps.load()
+
+    info = Info(
+        context={
+            "db": db,
+            "state_cache": state_cache,
+            "block_timestamps": block_timestamps,
+            "starknet_network_url": starknet_network_url,
+            "starknet_client": starknet_client,
+        },
+        storage=None,
+    )
+
+    blocks = 0
+    for entry in read_recording(path):
+        if entry["type"] == "contract":
+            decoder_registry.add_contract(
+                bytes.fromhex(entry["address"]),
+                Contract(
+                    address=int(entry["address"], 16),
+                    abi=entry["abi"],
+                    client=starknet_client,
+                ),
+            )
+            continue
+        if entry["type"] == "dao":
+            dao = Dao(
+                address=bytes.fromhex(entry["address"]),
+                bank_address=bytes.fromhex(entry["bankAddress"]),
+            )
+            info.context.setdefault("daos", {})[dao.address] = dao
+            continue
+
+        for number, timestamp in entry["timestamps"].items():
+            block_timestamps.add(int(number), datetime.fromisoformat(timestamp))
+
+        await new_events_handler(
+            info,
+            NewEvents(
+                block=decode_block(entry["block"]),
+                events=[decode_event(event) for event in entry["events"]],
+            ),
+        )
+        blocks += 1
+
+    logger.info("Replayed %s blocks from %s", blocks, path)
+    return blocks
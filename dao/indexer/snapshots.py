@@ -0,0 +1,155 @@
+import gzip
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import bson
+from bson.codec_options import CodecOptions
+from pymongo.database import Database
+
+from dao.indexer import logger, undo
+
+# Collections of the DAO state and of the history served by the GraphQL API
+# (votes, transactions), which can't be rebuilt from the state. The raw events
+# aren't part of the snapshots.
+SNAPSHOT_COLLECTIONS = (
+    "members",
+    "bank",
+    "proposals",
+    "proposal_params",
+    "block_timestamps",
+    "votes",
+    "transactions",
+)
+
+INSERT_BATCH_SIZE = 1000
+
+# A snapshot is a gzipped sequence of BSON documents: a header
+# {"blockNumber": ..., "counts": {collection: count}} followed by the current
+# version of the documents, as {"collection": ..., "document": {...}}
+SNAPSHOT_SUFFIX = ".bson.gz"
+
+
+def snapshot_path(directory: Union[str, Path], block_number: int) -> Path:
+    # Zero padded so the snapshots are sorted by block
+    return Path(directory) / f"snapshot-{block_number:012d}{SNAPSHOT_SUFFIX}"
+
+
+def list_snapshots(directory: Union[str, Path]) -> list[Path]:
+    """Snapshots of the directory, from the oldest"""
+    return sorted(Path(directory).glob(f"snapshot-*{SNAPSHOT_SUFFIX}"))
+
+
+def find_snapshot(path: Union[str, Path]) -> Path:
+    """Returns `path` if it's a snapshot, or the most recent snapshot of the
+    `path` directory"""
+    path = Path(path)
+    if not path.is_dir():
+        return path
+    if snapshots := list_snapshots(path):
+        return snapshots[-1]
+    raise FileNotFoundError(f"No snapshot in {path}")
+
+
+def write_snapshot(
+    db: Database, directory: Union[str, Path], block_number: int
+) -> Path:
+    """Write the current state of the DAO, as of `block_number`
+
+    The snapshot is written to a temporary file renamed once complete, a
+    snapshot interrupted by a crash is never restored.
+    """
+    path = snapshot_path(directory, block_number)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    counts = {
+        collection: db[collection].count_documents({"_chain.valid_to": None})
+        for collection in SNAPSHOT_COLLECTIONS
+    }
+    with gzip.open(tmp_path, "wb") as f:
+        f.write(bson.encode({"blockNumber": block_number, "counts": counts}))
+        for collection in SNAPSHOT_COLLECTIONS:
+            for doc in db[collection].find({"_chain.valid_to": None}):
+                f.write(bson.encode({"collection": collection, "document": doc}))
+    tmp_path.replace(path)
+
+    logger.info("Wrote snapshot %s of block=%s: %s", path, block_number, counts)
+    return path
+
+
+def read_snapshot(path: Union[str, Path]) -> Iterator[dict]:
+    """Yields the header of the snapshot, then its documents"""
+    with gzip.open(path, "rb") as f:
+        yield from bson.decode_file_iter(f, codec_options=CodecOptions(tz_aware=True))
+
+
+def restore_snapshot(db: Database, path: Union[str, Path], indexer_id: str) -> int:
+    """Replace the DAO state with the one of the snapshot and make apibara
+    resume the indexing from the block following it, returns this block"""
+    documents = read_snapshot(path)
+    header = next(documents)
+    block_number = header["blockNumber"]
+    logger.info("Restoring snapshot %s of block=%s", path, block_number)
+
+    for collection in SNAPSHOT_COLLECTIONS:
+        db.drop_collection(collection)
+    # The history written after the snapshot would be skipped when indexed
+    # again, the undo log references documents that don't exist anymore
+    for collection in db.list_collection_names():
+        if not collection.startswith("_"):
+            db[collection].delete_many({"_chain.valid_from": {"$gt": block_number}})
+    db.drop_collection(undo.UNDO_COLLECTION)
+    db["_backfill"].delete_one({"indexer_id": indexer_id})
+
+    batch: list[dict] = []
+    collection = None
+    for entry in documents:
+        if batch and entry["collection"] != collection:
+            db[collection].insert_many(batch)
+            batch = []
+        collection = entry["collection"]
+        batch.append(entry["document"])
+        if len(batch) == INSERT_BATCH_SIZE:
+            db[collection].insert_many(batch)
+            batch = []
+    if batch:
+        db[collection].insert_many(batch)
+
+    undo.set_flushed(db, block_number)
+    db["_apibara"].update_one(
+        {"indexer_id": indexer_id},
+        {"$set": {"indexed_to": block_number}},
+        upsert=True,
+    )
+    logger.info("Restored snapshot of block=%s: %s", block_number, header["counts"])
+    return block_number
+
+
+class Snapshots:
+    """Write a snapshot every `interval` blocks to `directory`, keeping the
+    `keep` most recent ones"""
+
+    def __init__(self, directory: Union[str, Path], interval: int, keep: int):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.keep = keep
+        self.last_block: Optional[int] = None
+
+        if snapshots := list_snapshots(self.directory):
+            self.last_block = next(read_snapshot(snapshots[-1]))["blockNumber"]
+
+    def end_block(self, db: Database, block_number: int):
+        """Called once the writes of `block_number` are flushed"""
+        if self.last_block is None:
+            # Counted from the first indexed block
+            self.last_block = block_number
+        elif block_number - self.last_block >= self.interval:
+            self.write(db, block_number)
+
+    def write(self, db: Database, block_number: int):
+        write_snapshot(db, self.directory, block_number)
+        self.last_block = block_number
+
+        for path in list_snapshots(self.directory)[: -self.keep]:
+            logger.info("Removing snapshot %s", path)
+            path.unlink()
@@ -2,10 +2,53 @@
 from typing import Optional
 
 from apibara import Info
-from apibara.model import BlockHeader
+from apibara.model import BlockHeader, StarkNetEvent
+from pymongo.database import Database
 
-from dao import config, utils
-from dao.indexer import logger
+from dao import utils
+from dao.indexer import logger, undo
+
+
+async def is_block_indexed(info: Info, block_number: int) -> bool:
+    """Check if the writes of a block were all flushed, the flushed block is
+    recorded after them"""
+    flushed_to = undo.get_flushed(info.context["db"])
+    return flushed_to is not None and block_number <= flushed_to
+
+
+def invalidate(db: Database, block_number: int):
+    """Remove the data written after `block_number`
+
+    The changes are reverted from the undo log when it has all of them,
+    otherwise every collection is scanned by block range like apibara does.
+    """
+    if not undo.is_journaled(db, block_number):
+        logger.warning(
+            "The undo log doesn't cover the blocks after block=%s,"
+            " scanning the collections",
+            block_number,
+        )
+        for collection in db.list_collection_names():
+            if collection.startswith("_"):
+                continue
+            db[collection].delete_many({"_chain.valid_from": {"$gt": block_number}})
+            db[collection].update_many(
+                {"_chain.valid_to": {"$gt": block_number}},
+                {"$set": {"_chain.valid_to": None}},
+            )
+    # Also reverts the documents updated in place with the delta versioning
+    undo.rollback(db, block_number)
+
+
+def rewind(db: Database, indexer_id: str, block_number: int):
+    """Remove the data written after `block_number` and make apibara resume the
+    indexing from the next block, the same way apibara invalidates the data of
+    reorganized blocks"""
+    logger.info("Rewinding indexer=%s to block=%s", indexer_id, block_number)
+    invalidate(db, block_number)
+    db["_apibara"].update_one(
+        {"indexer_id": indexer_id}, {"$set": {"indexed_to": block_number}}
+    )
 
 
 async def update_proposal(
@@ -38,6 +81,7 @@ async def update_member(
         update=update,
     )
     logger.debug("Existing member %s", existing)
+    return existing
 
 
 async def get_member(
@@ -62,14 +106,20 @@ async def update_bank(
     if filter is None:
         filter = {}
 
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = info.storage.dao.bank_address
 
     # Create bank if not exists
     if not await info.storage.find_one("bank", {"bankAddress": bank_address}):
-        logger.debug(
-            "Bank not found, creating it with %s", {"bankAddress": bank_address}
-        )
-        await info.storage.insert_one("bank", {"bankAddress": bank_address})
+        # With the totals of the members written before, by a version of the
+        # indexer which didn't maintain them
+        bank = {
+            "bankAddress": bank_address,
+            **member_totals(
+                info.context["db"], {"daoAddress": info.storage.dao.address}
+            ),
+        }
+        logger.debug("Bank not found, creating it with %s", bank)
+        await info.storage.insert_one("bank", bank)
 
     logger.debug("Updating bank with %s", update)
 
@@ -81,11 +131,150 @@ async def update_bank(
     logger.debug("Existing bank %s", existing)
 
 
+async def update_bank_totals(info: Info, shares: int, loot: int):
+    """Add the change of the shares and loot of a member to the totals of the
+    bank, written with the member"""
+    if shares or loot:
+        await update_bank(
+            info=info, update={"$inc": {"totalShares": shares, "totalLoot": loot}}
+        )
+
+
+def member_totals(db: Database, dao_filter: dict) -> dict:
+    """Totals of the shares and loot of the current members written to `db`"""
+    total = next(
+        db["members"].aggregate(
+            [
+                {"$match": {"_chain.valid_to": None, **dao_filter}},
+                {
+                    "$group": {
+                        "_id": None,
+                        "totalShares": {"$sum": "$shares"},
+                        "totalLoot": {"$sum": "$loot"},
+                    }
+                },
+            ]
+        ),
+        {"totalShares": 0, "totalLoot": 0},
+    )
+    return {"totalShares": total["totalShares"], "totalLoot": total["totalLoot"]}
+
+
+def init_bank_totals(db: Database):
+    """Compute the totals of the banks which don't match their members: the
+    banks indexed before the totals were maintained by the event handlers, or
+    created after members indexed without them"""
+    for bank in db["bank"].find({"_chain.valid_to": None}):
+        dao_filter = {"daoAddress": bank["daoAddress"]} if "daoAddress" in bank else {}
+        totals = member_totals(db, dao_filter)
+        if all(bank.get(field) == value for field, value in totals.items()):
+            continue
+        db["bank"].update_one({"_id": bank["_id"]}, {"$set": totals})
+        logger.info("Computed the totals of bank=%s: %s", bank["_id"], totals)
+
+
+def init_proposal_vote_totals(db: Database):
+    """Compute the vote totals of the proposals indexed before they were
+    maintained by VoteSubmitted. The shares of the voters when they voted
+    weren't recorded, their current shares are used."""
+    for proposal in db["proposals"].find(
+        {"_chain.valid_to": None, "yesVotesTotal": {"$exists": False}}
+    ):
+        dao_filter = (
+            {"daoAddress": proposal["daoAddress"]} if "daoAddress" in proposal else {}
+        )
+        totals = {}
+        for total, voters in (
+            ("yesVotesTotal", "yesVoters"),
+            ("noVotesTotal", "noVoters"),
+        ):
+            members = db["members"].find(
+                {
+                    "_chain.valid_to": None,
+                    "memberAddress": {"$in": proposal.get(voters, [])},
+                    **dao_filter,
+                },
+                projection={"shares": 1},
+            )
+            totals[total] = sum(member["shares"] for member in members)
+        db["proposals"].update_one({"_id": proposal["_id"]}, {"$set": totals})
+        logger.info(
+            "Computed the vote totals of proposal=%s: %s", proposal["_id"], totals
+        )
+
+
+def init_transactions(db: Database):
+    """Move the transactions embedded in the members and the banks indexed before
+    they had their own collection to the `transactions` collection
+
+    The transfers were pushed one by one, each transaction gets the block of the
+    first version of the document having it. The arrays are removed from all the
+    versions, a rollback doesn't bring them back.
+    """
+    for collection, owner_field in (
+        ("members", "memberAddress"),
+        ("bank", "bankAddress"),
+    ):
+        for doc in db[collection].find(
+            {"_chain.valid_to": None, "transactions": {"$exists": True}},
+            projection={owner_field: 1, "daoAddress": 1},
+        ):
+            owner_address = doc[owner_field]
+            dao_filter = (
+                {"daoAddress": doc["daoAddress"]} if "daoAddress" in doc else {}
+            )
+            versions_filter = {
+                owner_field: owner_address,
+                "transactions": {"$exists": True},
+                **dao_filter,
+            }
+
+            blocks: list[int] = []
+            transactions: list[dict] = []
+            for version in db[collection].find(
+                versions_filter,
+                projection={"transactions": 1, "_chain": 1},
+                sort=[("_chain.valid_from", 1)],
+            ):
+                transactions = version["transactions"]
+                new_count = len(transactions) - len(blocks)
+                blocks.extend([version["_chain"]["valid_from"]] * new_count)
+
+            # The transactions of a migration interrupted before the $unset
+            db["transactions"].delete_many(
+                {
+                    **dao_filter,
+                    "ownerAddress": owner_address,
+                    "transactionHash": {"$exists": False},
+                }
+            )
+            if transactions:
+                db["transactions"].insert_many(
+                    {
+                        **dao_filter,
+                        "ownerAddress": owner_address,
+                        **transaction,
+                        "blockNumber": block_number,
+                        "_chain": {"valid_from": block_number, "valid_to": None},
+                    }
+                    for transaction, block_number in zip(transactions, blocks)
+                )
+            db[collection].update_many(
+                versions_filter, {"$unset": {"transactions": ""}}
+            )
+            logger.info(
+                "Moved %s transactions of %s=%s to their collection",
+                len(transactions),
+                owner_field,
+                owner_address,
+            )
+
+
 async def get_bank(info: Info, filter: Optional[dict] = None):
     if filter is None:
         filter = {}
 
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = info.storage.dao.bank_address
     bank = await info.storage.find_one("bank", {"bankAddress": bank_address, **filter})
     return bank
 
@@ -95,7 +284,7 @@ async def add_token_if_not_exists(
 ):
     token_address_filter = {"balances.tokenAddress": token_address}
 
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = info.storage.dao.bank_address
     if member_address == bank_address:
         bank = await get_bank(info=info, filter=token_address_filter)
         # The bank doesn't have the token in its balances list
@@ -148,11 +337,12 @@ async def get_token_name(info: Info, token_address: bytes) -> Optional[str]:
 async def update_balance(
     info: Info,
     block: BlockHeader,
+    starknet_event: StarkNetEvent,
     member_address: bytes,
     token_address: bytes,
     amount: int,
 ):
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = info.storage.dao.bank_address
     token_name = await get_token_name(token_address=token_address, info=info)
 
     await add_token_if_not_exists(
@@ -163,16 +353,7 @@ async def update_balance(
     )
 
     add_amount_filter = {"balances.tokenAddress": token_address}
-    add_amount = {
-        "$inc": {"balances.$.amount": amount},
-        "$push": {
-            "transactions": {
-                "tokenAddress": token_address,
-                "timestamp": utils.get_block_datetime_utc(block),
-                "amount": amount,
-            },
-        },
-    }
+    add_amount = {"$inc": {"balances.$.amount": amount}}
 
     if member_address == bank_address:
         await update_bank(info=info, update=add_amount, filter=add_amount_filter)
@@ -183,3 +364,18 @@ async def update_balance(
             update=add_amount,
             filter=add_amount_filter,
         )
+
+    # Transactions have their own collection, the member and bank documents
+    # would grow with every transfer otherwise
+    await info.storage.insert_one(
+        "transactions",
+        {
+            "ownerAddress": member_address,
+            "tokenAddress": token_address,
+            "timestamp": utils.get_block_datetime_utc(block),
+            "amount": amount,
+            "blockNumber": block.number,
+            "transactionHash": starknet_event.transaction_hash,
+            "eventIndex": starknet_event.log_index,
+        },
+    )
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+from typing import Iterable, Optional, Union
+
+from apibara.model import BlockHeader
+from pymongo.database import Database
+from starknet_py.net.client_models import GatewayBlock
+from starknet_py.net.gateway_client import GatewayClient
+
+from dao import utils
+from dao.indexer import logger
+
+
+class BlockTimestamps:
+    """Timestamps of the blocks referenced by the BlockNumber fields
+
+    The timestamps are loaded from the `block_timestamps` collection and kept in
+    memory, every block header seen by the indexer is recorded so the Starknet
+    gateway is only queried for the blocks without DAO events.
+    """
+
+    def __init__(self, db: Database, client: GatewayClient):
+        self._db = db
+        self._client = client
+        self._timestamps: dict[int, datetime] = {}
+        self._new: dict[int, datetime] = {}
+
+    def load(self):
+        self._timestamps = {
+            doc["number"]: doc["timestamp"]
+            for doc in self._db["block_timestamps"].find({"_chain.valid_to": None})
+        }
+        self._new = {}
+        logger.info("Loaded %s block timestamps", len(self._timestamps))
+
+    def record(self, block: Union[BlockHeader, GatewayBlock]) -> datetime:
+        if isinstance(block, GatewayBlock):
+            number = block.block_number
+        else:
+            number = block.number
+
+        timestamp = utils.get_block_datetime_utc(block)
+        self.add(number, timestamp)
+        return timestamp
+
+    def add(self, block_number: int, timestamp: datetime):
+        if self._timestamps.get(block_number) != timestamp:
+            self._timestamps[block_number] = timestamp
+            self._new[block_number] = timestamp
+
+    async def _fetch(self, block_number: int) -> datetime:
+        logger.debug("Fetching the timestamp of block=%s", block_number)
+        block = await utils.get_block(block_number=block_number, client=self._client)
+        return self.record(block)
+
+    async def get(self, block_number: int) -> datetime:
+        if (timestamp := self._timestamps.get(block_number)) is not None:
+            return timestamp
+        return await self._fetch(block_number)
+
+    async def prefetch(
+        self,
+        block_numbers: Iterable[int],
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ):
+        """Fetch concurrently the timestamps of the unknown blocks, the number of
+        concurrent requests is bounded by `semaphore` if given"""
+
+        async def fetch(block_number: int):
+            if semaphore is None:
+                await self._fetch(block_number)
+            else:
+                async with semaphore:
+                    await self._fetch(block_number)
+
+        missing = {number for number in block_numbers if number not in self._timestamps}
+        if missing:
+            await asyncio.gather(*(fetch(number) for number in missing))
+
+    def take_new(self) -> list[dict]:
+        """Returns the timestamps recorded since the last call, to be persisted"""
+        new = [
+            {"number": number, "timestamp": timestamp}
+            for number, timestamp in self._new.items()
+        ]
+        self._new = {}
+        return new
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from typing import Any, Iterator, Optional
+
+from pymongo import DeleteMany, UpdateMany, UpdateOne
+from pymongo.database import Database
+
+from dao.indexer import logger
+
+Document = dict[str, Any]
+
+# Journal of the changes of each block, the entries have a `block`, the
+# `collection` changed and an `op`:
+# - "insert": `documentId` was inserted, as a new version of `previousId` if any
+# - "update": `documentId` was updated in place, `set` and `unset` revert it
+# - "append": documents were appended to the collection, see APPEND_ONLY_COLLECTIONS
+UNDO_COLLECTION = "_undo"
+
+# Last block whose changes were all written, updated after the other writes of
+# a flush. The blocks after it were not indexed, or only partly when a flush was
+# interrupted, see recover.
+FLUSHED_COLLECTION = "_flushed"
+
+# Fields managed by the storage, never part of a delta
+INTERNAL_FIELDS = ("_id", "_chain")
+
+_MISSING = object()
+
+
+def diff(old: Document, new: Document, prefix: str = "") -> Iterator[str]:
+    """Yields the dotted paths of the fields changed from `old` to `new`,
+    embedded documents are compared field by field and arrays as a whole"""
+    for key in new.keys() | old.keys():
+        if not prefix and key in INTERNAL_FIELDS:
+            continue
+        old_value = old.get(key, _MISSING)
+        new_value = new.get(key, _MISSING)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            yield from diff(old_value, new_value, prefix=f"{prefix}{key}.")
+        elif old_value != new_value:
+            yield prefix + key
+
+
+def get_path(doc: Document, path: str) -> Any:
+    value = doc
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def delta_update(old: Document, new: Document) -> tuple[dict, dict]:
+    """Returns the MongoDB update turning `old` into `new` and the undo entry
+    reverting it"""
+    update: dict = {}
+    undo: dict = {"set": [], "unset": []}
+
+    for path in sorted(diff(old, new)):
+        old_value = get_path(old, path)
+        new_value = get_path(new, path)
+
+        if new_value is _MISSING:
+            update.setdefault("$unset", {})[path] = ""
+        else:
+            update.setdefault("$set", {})[path] = new_value
+
+        # Field names can't contain dots, the paths are stored in lists
+        if old_value is _MISSING:
+            undo["unset"].append(path)
+        else:
+            undo["set"].append([path, old_value])
+
+    return update, undo
+
+
+def _update_reverting(entry: Document) -> dict:
+    update = {}
+    if entry["set"]:
+        update["$set"] = dict(entry["set"])
+    if entry["unset"]:
+        update["$unset"] = {path: "" for path in entry["unset"]}
+    return update
+
+
+def _revert_operations(entries: list[Document]) -> list:
+    """Operations reverting the undo entries of a collection, given from the
+    most recent"""
+    updates = [
+        UpdateOne({"_id": entry["documentId"]}, _update_reverting(entry))
+        for entry in entries
+        if entry["op"] == "update"
+    ]
+    inserted_ids = [entry["documentId"] for entry in entries if entry["op"] == "insert"]
+    previous_ids = [entry["previousId"] for entry in entries if "previousId" in entry]
+    if not inserted_ids:
+        return updates
+
+    # The inserted documents are deleted first, so only the previous versions
+    # from before `block_number` are current again
+    return updates + [
+        DeleteMany({"_id": {"$in": inserted_ids}}),
+        UpdateMany({"_id": {"$in": previous_ids}}, {"$set": {"_chain.valid_to": None}}),
+    ]
+
+
+def is_journaled(db: Database, block_number: int) -> bool:
+    """Check if the undo log has the changes of all the blocks after
+    `block_number`
+
+    Every flushed block is journaled, so it's the case when an entry of
+    `block_number` or before is still in the log. Data indexed before the undo
+    log existed, or older than `undo_log_depth` blocks, isn't journaled.
+    """
+    entry = db[UNDO_COLLECTION].find_one(
+        {"block": {"$lte": block_number}}, projection={"_id": 1}
+    )
+    return entry is not None
+
+
+def rollback(db: Database, block_number: int):
+    """Revert the changes recorded in the undo log after `block_number`, in the
+    reverse order they were made
+
+    Only the undo entries of these blocks are read, through the index on
+    `block`, so the cost depends on the depth of the reorganization and not on
+    the size of the collections.
+    """
+    entries = (
+        db[UNDO_COLLECTION]
+        .find({"block": {"$gt": block_number}})
+        .sort([("block", -1), ("_id", -1)])
+    )
+
+    entries_by_collection: dict[str, list[Document]] = defaultdict(list)
+    appended: set[str] = set()
+    count = 0
+    for entry in entries:
+        if entry["op"] == "append":
+            appended.add(entry["collection"])
+        else:
+            entries_by_collection[entry["collection"]].append(entry)
+        count += 1
+
+    # The changes of different collections are independent
+    for collection, collection_entries in entries_by_collection.items():
+        db[collection].bulk_write(_revert_operations(collection_entries), ordered=True)
+    for collection in appended:
+        db[collection].delete_many({"_chain.valid_from": {"$gt": block_number}})
+
+    db[UNDO_COLLECTION].delete_many({"block": {"$gt": block_number}})
+    db[FLUSHED_COLLECTION].update_one(
+        {"_id": FLUSHED_COLLECTION, "block": {"$gt": block_number}},
+        {"$set": {"block": block_number}},
+    )
+    logger.info("Rolled back %s changes after block=%s", count, block_number)
+
+
+def get_flushed(db: Database) -> Optional[int]:
+    """Last block whose changes were all written, None before the first flush"""
+    state = db[FLUSHED_COLLECTION].find_one({"_id": FLUSHED_COLLECTION})
+    return state["block"] if state is not None else None
+
+
+def set_flushed(db: Database, block_number: int):
+    db[FLUSHED_COLLECTION].update_one(
+        {"_id": FLUSHED_COLLECTION}, {"$set": {"block": block_number}}, upsert=True
+    )
+
+
+def recover(db: Database):
+    """Revert the changes of a flush interrupted by a crash
+
+    The undo log is written ahead of the changes, the entries after the last
+    flushed block belong to a flush that didn't complete. The block is received
+    again from apibara and indexed from the state before it.
+    """
+    flushed_to = get_flushed(db)
+    if flushed_to is None:
+        return
+    if db[UNDO_COLLECTION].find_one({"block": {"$gt": flushed_to}}) is not None:
+        logger.warning("Reverting the interrupted flush after block=%s", flushed_to)
+        rollback(db, flushed_to)
+
+
+def prune(db: Database, block_number: int):
+    """Drop the undo entries of the blocks before `block_number`, they can't be
+    reorganized anymore"""
+    db[UNDO_COLLECTION].delete_many({"block": {"$lt": block_number}})
@@ -5,11 +5,15 @@ from functools import wraps
 
 import click
 from apibara.model import EventFilter
+from pymongo import MongoClient
 from starknet_py.net.gateway_client import GatewayClient
 
 from dao import config, utils
+from dao.graphql import explain
 from dao.graphql import main as graphql_main
 from dao.indexer import main as indexer_main
+from dao.indexer import recording
+from dao.indexer.daos import Dao
 
 
 def async_command(coro):
@@ -55,8 +59,19 @@ def cli():
 )
 @click.option(
     "--contract-address",
+    "contract_addresses",
     required=True,
-    help="The contract address of the events.",
+    multiple=True,
+    help="The contract address of a DAO, repeat it to index several DAOs.",
+)
+@click.option(
+    "--bank-address",
+    "bank_addresses",
+    multiple=True,
+    help=(
+        "The bank address of each DAO, in the order of the contract addresses."
+        f" Defaults to {hex(config.bank_address)}."
+    ),
 )
 @click.option(
     "--events",
@@ -65,6 +80,37 @@ def cli():
         " contract address."
     ),
 )
+@click.option(
+    "--backfill",
+    is_flag=True,
+    show_default=True,
+    help=(
+        "Catch up with the chain faster by writing many blocks at once, without"
+        " validators and secondary indexes, until the chain head is reached."
+    ),
+)
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False),
+    help="Append the received blocks to this file, see the replay command.",
+)
+@click.option(
+    "--snapshot-dir",
+    type=click.Path(file_okay=False),
+    help=(
+        "Write a snapshot of the DAO state to this directory every"
+        f" {config.snapshot_interval} blocks."
+    ),
+)
+@click.option(
+    "--from-snapshot",
+    type=click.Path(exists=True),
+    help=(
+        "Restore this snapshot, or the latest one of this directory, and resume"
+        " indexing from its block. The events and transactions aren't part of"
+        " the snapshots."
+    ),
+)
 @async_command
 async def start_indexer(
     server_url,
@@ -72,19 +118,38 @@ async def start_indexer(
     starknet_network_url,
     restart,
     ssl,
-    contract_address,
+    contract_addresses,
+    bank_addresses=(),
     events=None,
+    backfill=False,
+    record=None,
+    snapshot_dir=None,
+    from_snapshot=None,
 ):
     """Start the Apibara indexer."""
-    starknet_client = GatewayClient(starknet_network_url)
+    if restart and from_snapshot is not None:
+        raise click.UsageError("--restart and --from-snapshot are exclusive")
 
-    contract = await utils.get_contract(contract_address, starknet_client)
-    contract_events = utils.get_contract_events(contract)
+    if bank_addresses and len(bank_addresses) != len(contract_addresses):
+        raise click.UsageError("Give one --bank-address per --contract-address")
 
-    if events is None:
-        events = contract_events.keys()
+    starknet_client = GatewayClient(starknet_network_url)
+
+    filters = []
+    daos = []
+    for index, contract_address in enumerate(contract_addresses):
+        contract = await utils.get_contract(contract_address, starknet_client)
+        contract_events = utils.get_contract_events(contract)
 
-    filters = [EventFilter.from_event_name(name, contract_address) for name in events]
+        filters.extend(
+            EventFilter.from_event_name(name, contract_address)
+            for name in (contract_events.keys() if events is None else events)
+        )
+        daos.append(
+            Dao.from_hex(
+                contract_address, bank_addresses[index] if bank_addresses else None
+            )
+        )
 
     await indexer_main.run_indexer(
         server_url=server_url,
@@ -93,6 +158,11 @@ async def start_indexer(
         restart=restart,
         ssl=ssl,
         filters=filters,
+        daos=daos,
+        backfill=backfill,
+        record=record,
+        snapshot_dir=snapshot_dir,
+        from_snapshot=from_snapshot,
     )
 
 
@@ -127,3 +197,74 @@ async def start_graphql(mongo_url, db_name, host, port):
         host=host,
         port=port,
     )
+
+
+@cli.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--mongo-url", default=config.mongo_url, show_default=True, help="MongoDB URL."
+)
+@click.option(
+    "--db-name",
+    default=config.indexer_id.replace("-", "_") + "_replay",
+    show_default=True,
+    help="MongoDB database name.",
+)
+@click.option(
+    "--starknet-network-url",
+    default=config.starknet_network_url,
+    show_default=True,
+    help="Starknet Network url, only used for what is missing in the recording.",
+)
+@click.option(
+    "--restart",
+    is_flag=True,
+    show_default=True,
+    help="Drop the database before replaying.",
+)
+@async_command
+async def replay(path, mongo_url, db_name, starknet_network_url, restart):
+    """Replay a recording of the indexer into MongoDB."""
+    mongo = MongoClient(mongo_url)
+    if restart:
+        mongo.drop_database(db_name)
+
+    blocks = await recording.replay(
+        path=path, db=mongo[db_name], starknet_network_url=starknet_network_url
+    )
+    click.echo(f"Replayed {blocks} blocks")
+
+
+@cli.command()
+@click.option(
+    "--mongo-url", default=config.mongo_url, show_default=True, help="MongoDB URL."
+)
+@click.option(
+    "--db-name",
+    default=config.indexer_id.replace("-", "_"),
+    show_default=True,
+    help="MongoDB database name.",
+)
+@click.option(
+    "--dao-address",
+    required=True,
+    help="The contract address of the DAO whose queries are explained.",
+)
+@async_command
+async def check_indexes(mongo_url, db_name, dao_address):
+    """Check with explain that the GraphQL queries are answered from an index."""
+    db = MongoClient(mongo_url)[db_name]
+
+    scans = 0
+    for query, indexes in await explain.check_indexes(
+        db, Dao.from_hex(dao_address).address
+    ):
+        if not indexes:
+            scans += 1
+        click.echo(
+            f"{query.name}: {query.collection}"
+            f" {', '.join(indexes) if indexes else 'COLLSCAN'}"
+        )
+
+    if scans:
+        raise click.ClickException(f"{scans} queries scan their collection")
@@ -1,11 +1,15 @@
+import asyncio
+import time
 from collections import ChainMap
+from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
 from functools import lru_cache, wraps
-from typing import Callable, Iterable, Union
+from typing import Any, Callable, Iterable, Optional, Union
 
 from apibara.model import BlockHeader
 from cachetools import LRUCache, keys
 from starknet_py.contract import Contract
+from starknet_py.net.client import Client
 from starknet_py.net.client_models import GatewayBlock
 from starknet_py.net.gateway_client import GatewayClient
 
@@ -64,45 +68,131 @@ def int_to_bytes(a: int) -> bytes:
 #     return bytes.fromhex(a)
 
 
-def async_cached(cache, key=keys.hashkey):
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Calls waiting for the result of an identical call already in flight
+    coalesced: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+def without_clients_key(*args, **kwargs):
+    """Cache key ignoring the Starknet client arguments, so the results are
+    shared between client instances"""
+    return keys.hashkey(
+        *(arg for arg in args if not isinstance(arg, Client)),
+        **{name: arg for name, arg in kwargs.items() if not isinstance(arg, Client)},
+    )
+
+
+# Result of a call interrupted before returning, see async_cached
+_RETRY = object()
+
+
+def async_cached(
+    cache,
+    key=keys.hashkey,
+    ttl: Optional[float] = None,
+    negative_ttl: Optional[float] = None,
+):
     """Returns decorator function to cache async function results.
 
     This is a replacement for `@cached()` decorator from cachetools.
     cachetools does not support async at the time of writing.
 
+    Concurrent calls with the same key share a single call of the decorated
+    function, if it's cancelled one of the waiting calls calls the function
+    again. Results expire after `ttl` seconds if given, exceptions are cached
+    for `negative_ttl` seconds if given, otherwise they are not cached. Hits,
+    misses and coalesced calls are counted in `wrapper.cache_stats`.
+
     Source: https://github.com/aiocoro/async-cached
     """
 
     def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            k = key(*args, **kwargs)
+        in_flight: dict[Any, asyncio.Future] = {}
+        stats = CacheStats()
+
+        def store(k, value, error, expires_in: Optional[float]):
+            expires_at = None if expires_in is None else time.monotonic() + expires_in
             try:
-                return cache[k]
+                cache[k] = (value, error, expires_at)
+            except ValueError:
+                pass
+
+        async def call(k, args, kwargs):
+            try:
+                value, error, expires_at = cache[k]
             except KeyError:
                 pass
-            v = await func(*args, **kwargs)
+            else:
+                if expires_at is None or time.monotonic() < expires_at:
+                    stats.hits += 1
+                    if error is not None:
+                        raise error
+                    return value
+                cache.pop(k, None)
+
+            if (future := in_flight.get(k)) is not None:
+                stats.coalesced += 1
+                return await asyncio.shield(future)
+
+            stats.misses += 1
+            future = asyncio.get_running_loop().create_future()
+            in_flight[k] = future
             try:
-                cache[k] = v
-            except ValueError:
+                v = await func(*args, **kwargs)
+            except Exception as error:
+                if negative_ttl is not None:
+                    store(k, None, error, negative_ttl)
+                future.set_exception(error)
+                # Mark the exception as retrieved when no call is waiting for it
+                future.exception()
+                raise
+            else:
+                store(k, v, None, ttl)
+                future.set_result(v)
+                return v
+            finally:
+                del in_flight[k]
+                # The call was cancelled or interrupted, it isn't the result of
+                # the waiting calls, they call the function again
+                if not future.done():
+                    future.set_result(_RETRY)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs)
+            while (result := await call(k, args, kwargs)) is _RETRY:
                 pass
-            return v
+            return result
 
+        wrapper.cache_stats = stats
         return wrapper
 
     return decorator
 
 
-@async_cached(cache=LRUCache(maxsize=128))
+@async_cached(cache=LRUCache(maxsize=128), key=without_clients_key)
 async def get_contract(address, client: GatewayClient) -> Contract:
     return await Contract.from_address(address, client=client)
 
 
-@async_cached(cache=LRUCache(maxsize=128))
+@async_cached(cache=LRUCache(maxsize=128), key=without_clients_key)
 async def get_block(block_number: int, client: GatewayClient) -> GatewayBlock:
     return await client.get_block(block_number=block_number)
 
 
+def gateway_cache_stats() -> dict[str, dict[str, int]]:
+    return {
+        "get_contract": get_contract.cache_stats.as_dict(),
+        "get_block": get_block.cache_stats.as_dict(),
+    }
+
+
 def get_block_datetime_utc(block: Union[GatewayBlock, BlockHeader]) -> datetime:
     if isinstance(block, GatewayBlock):
         return datetime.fromtimestamp(block.timestamp, timezone.utc)
@@ -12,6 +12,9 @@ import mongomock
 import pytest
 import requests
 from apibara import EventFilter
+from apibara.model import BlockHeader
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo import MongoClient
 from pymongo.database import Database
 from pytest import Item, MonkeyPatch
@@ -25,6 +28,7 @@ from starknet_py.net.signer.stark_curve_signer import KeyPair
 
 from dao import config
 from dao.graphql.main import run_graphql
+from dao.indexer.daos import Dao
 from dao.indexer.main import run_indexer
 
 from .integration.test_utils import (
@@ -68,6 +72,7 @@ class GraphQL:
 
 IndexerProcessRunner = Callable[[list[EventFilter], Any], Indexer]
 GraphQLProcessRunner = Callable[[Optional[str]], GraphQL]
+BlockHeaderFactory = Callable[..., BlockHeader]
 
 
 def pytest_addoption(parser):
@@ -262,6 +267,34 @@ def mongomock_client(monkeypatch: MonkeyPatch) -> MongoClient:
     return mongomock.MongoClient(config.mongo_url, tz_aware=True)
 
 
+@pytest.fixture
+def async_mongomock_db(mongomock_client: MongoClient) -> AsyncIOMotorDatabase:
+    """Async view of the `mongomock_client` database, used by the GraphQL
+    server"""
+    return AsyncMongoMockClient(mock_mongo_client=mongomock_client).db
+
+
+@pytest.fixture
+def dao() -> Dao:
+    """DAO of the documents written by the event handlers in the unit tests"""
+    return Dao(address=b"\x01", bank_address=b"\x0b")
+
+
+@pytest.fixture
+def block_header() -> BlockHeaderFactory:
+    def _create_block_header(
+        number: int, timestamp: Optional[datetime] = None
+    ) -> BlockHeader:
+        return BlockHeader(
+            hash=number.to_bytes(32, "big"),
+            parent_hash=(number - 1).to_bytes(32, "big"),
+            number=number,
+            timestamp=timestamp or datetime(2022, 11, 18, 0, number),
+        )
+
+    return _create_block_header
+
+
 @pytest.fixture
 def mongo_db(request: pytest.FixtureRequest, mongo_client: MongoClient) -> Database:
     db_name = (
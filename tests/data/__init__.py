@@ -2,12 +2,14 @@ from . import graphql_expected, graphql_queries, mongo_expected, mongo_validatio
 from .bank import BANK
 from .members import MEMBERS
 from .proposals import PROPOSAL_PARAMS, PROPOSALS
+from .transactions import TRANSACTIONS
 
 __all__ = [
     "MEMBERS",
     "PROPOSALS",
     "PROPOSAL_PARAMS",
     "BANK",
+    "TRANSACTIONS",
     "graphql_expected",
     "graphql_queries",
     "mongo_expected",
@@ -28,11 +28,4 @@ BANK = {
             "amount": common.AMOUNT,
         }
     ],
-    "transactions": [
-        {
-            "tokenAddress": common.TOKEN_ADDRESS.bytes,
-            "timestamp": common.START_TIME,
-            "amount": common.AMOUNT,
-        }
-    ],
 }
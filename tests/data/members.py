@@ -16,13 +16,6 @@ MEMBERS = [
                 "amount": common.AMOUNT,
             }
         ],
-        "transactions": [
-            {
-                "tokenAddress": common.TOKEN_ADDRESS.bytes,
-                "timestamp": common.START_TIME,
-                "amount": common.AMOUNT,
-            }
-        ],
     },
     {
         "memberAddress": common.ADDRESSES[1].bytes,
@@ -33,7 +26,6 @@ MEMBERS = [
         "jailedAt": common.VOTING_PERIOD_ENDING_AT,
         "exitedAt": None,
         "balances": [],
-        "transactions": [],
         "roles": [],
     },
     {
@@ -1,7 +1,7 @@
 from . import common
-from .members import MEMBERS
 
-# We call dict.copy() because pymongo insert queries adds _id field to the dicts
+# Vote totals of the proposals indexed without them, from the current shares of
+# the voters
 LIST_PROPOSALS = [
     {
         "id": 0,
@@ -17,15 +17,9 @@ LIST_PROPOSALS = [
         "majority": 50,
         "quorum": 80,
         "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "yesVotersMembers": [
-            MEMBERS[0].copy(),
-            MEMBERS[1].copy(),
-        ],
+        "yesVotesTotal": 15,
         "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
-        "noVotersMembers": [
-            MEMBERS[2].copy(),
-            MEMBERS[3].copy(),
-        ],
+        "noVotesTotal": 5,
     },
     {
         "id": 1,
@@ -46,15 +40,9 @@ LIST_PROPOSALS = [
         "majority": 50,
         "quorum": 80,
         "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "yesVotersMembers": [
-            MEMBERS[0].copy(),
-            MEMBERS[1].copy(),
-        ],
+        "yesVotesTotal": 15,
         "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
-        "noVotersMembers": [
-            MEMBERS[2].copy(),
-            MEMBERS[3].copy(),
-        ],
+        "noVotesTotal": 5,
     },
     {
         "id": 2,
@@ -71,15 +59,9 @@ LIST_PROPOSALS = [
         "majority": 50,
         "quorum": 80,
         "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "yesVotersMembers": [
-            MEMBERS[0].copy(),
-            MEMBERS[1].copy(),
-        ],
+        "yesVotesTotal": 15,
         "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
-        "noVotersMembers": [
-            MEMBERS[2].copy(),
-            MEMBERS[3].copy(),
-        ],
+        "noVotesTotal": 5,
     },
     {
         "id": 3,
@@ -97,15 +79,9 @@ LIST_PROPOSALS = [
         "majority": 50,
         "quorum": 80,
         "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "yesVotersMembers": [
-            MEMBERS[0].copy(),
-            MEMBERS[1].copy(),
-        ],
+        "yesVotesTotal": 15,
         "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
-        "noVotersMembers": [
-            MEMBERS[2].copy(),
-            MEMBERS[3].copy(),
-        ],
+        "noVotesTotal": 5,
     },
     {
         "id": 4,
@@ -123,15 +99,9 @@ LIST_PROPOSALS = [
         "majority": 50,
         "quorum": 80,
         "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "yesVotersMembers": [
-            MEMBERS[0].copy(),
-            MEMBERS[1].copy(),
-        ],
+        "yesVotesTotal": 15,
         "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
-        "noVotersMembers": [
-            MEMBERS[2].copy(),
-            MEMBERS[3].copy(),
-        ],
+        "noVotesTotal": 5,
     },
     {
         "id": 5,
@@ -151,14 +121,8 @@ LIST_PROPOSALS = [
         "majority": 50,
         "quorum": 80,
         "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "yesVotersMembers": [
-            MEMBERS[0].copy(),
-            MEMBERS[1].copy(),
-        ],
+        "yesVotesTotal": 15,
         "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
-        "noVotersMembers": [
-            MEMBERS[2].copy(),
-            MEMBERS[3].copy(),
-        ],
+        "noVotesTotal": 5,
     },
 ]
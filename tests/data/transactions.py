@@ -0,0 +1,16 @@
+from . import common
+
+TRANSACTIONS = [
+    {
+        "ownerAddress": owner_address,
+        "tokenAddress": common.TOKEN_ADDRESS.bytes,
+        "timestamp": common.START_TIME,
+        "amount": common.AMOUNT,
+        "blockNumber": 1,
+        "transactionHash": b"\x01",
+        "eventIndex": index,
+    }
+    for index, owner_address in enumerate(
+        [common.ADDRESSES[0].bytes, common.BANK_ADDRESS.bytes]
+    )
+]
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import timedelta
+from typing import Optional
+
+from aiohttp.test_utils import TestClient, TestServer
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import MongoClient
+from strawberry.http import GraphQLRequestData
+
+from dao import config, utils
+from dao.graphql.cache import IndexedHead, ResponseCache, cache_key
+from dao.graphql.main import create_app
+from dao.indexer import undo
+
+
+def request_data(query: str, variables: Optional[dict] = None) -> GraphQLRequestData:
+    return GraphQLRequestData(query=query, variables=variables, operation_name=None)
+
+
+def test_cache_key():
+    assert cache_key(request_data("{ members { shares } }")) == cache_key(
+        request_data("query {\n  members {\n    shares\n  }\n}")
+    )
+    assert cache_key(request_data("{ members { shares } }")) != cache_key(
+        request_data("{ members { shares } }", variables={"limit": 1})
+    )
+    assert cache_key(request_data("mutation { members { shares } }")) is None
+    assert cache_key(request_data("{ members ")) is None
+
+
+async def test_response_cache(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    db = mongomock_client.db
+    undo.set_flushed(db, 1)
+    head = IndexedHead(async_mongomock_db, interval=1)
+    await head.poll()
+    cache = ResponseCache(head, max_entries=10, stale_while_revalidate=5)
+
+    executions = 0
+    expires_at = None
+
+    async def execute():
+        nonlocal executions
+        executions += 1
+        return {"data": executions}, expires_at
+
+    assert await cache.get("key", execute) == ({"data": 1}, "MISS")
+    assert await cache.get("key", execute) == ({"data": 1}, "HIT")
+
+    # Apibara is ahead of the writes of a backfill, the head only moves once
+    # the blocks are flushed
+    db["_apibara"].insert_one({"indexer_id": config.indexer_id, "indexed_to": 5})
+    await head.poll()
+    assert head.block_number == 1
+
+    # Served while the query runs again for the new block
+    undo.set_flushed(db, 2)
+    await head.poll()
+    assert await cache.get("key", execute) == ({"data": 1}, "STALE")
+    await asyncio.sleep(0)
+    assert await cache.get("key", execute) == ({"data": 2}, "HIT")
+
+    # Too old to be served
+    undo.set_flushed(db, 3)
+    await head.poll()
+    head.changed_at -= timedelta(seconds=10)
+    assert await cache.get("key", execute) == ({"data": 3}, "MISS")
+
+    # A time dependent field changed
+    expires_at = utils.utcnow()
+    assert await cache.get("other", execute) == ({"data": 4}, "MISS")
+    assert await cache.get("other", execute) == ({"data": 4}, "STALE")
+
+    # The concurrent requests share one execution
+    responses = await asyncio.gather(*(cache.get("new", execute) for _ in range(3)))
+    assert responses == [({"data": 6}, "MISS")] * 3
+
+
+async def test_cached_responses(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    mongomock_client.db["members"].insert_one(
+        {
+            "daoAddress": b"\x01",
+            "memberAddress": b"\x0a",
+            "shares": 10,
+            "loot": 0,
+            "onboardedAt": utils.utcnow(),
+            "_chain": {"valid_from": 1, "valid_to": None},
+        }
+    )
+    query = {"query": "{ members { memberAddress shares } }"}
+
+    async with TestClient(TestServer(create_app(async_mongomock_db))) as client:
+        for expected in ("MISS", "HIT"):
+            response = await client.post("/graphql", json=query)
+            assert response.headers["X-Cache"] == expected
+            assert (await response.json())["data"] == {
+                "members": [{"memberAddress": "0x0a", "shares": 10}]
+            }
+
+        # Not cached
+        response = await client.post("/graphql", json={"query": "{ members "})
+        assert "X-Cache" not in response.headers
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from graphql import parse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pytest import MonkeyPatch
+
+from dao import config
+from dao.graphql.cost import Admission, QueryCostError, query_cost
+from dao.graphql.schema import schema
+
+
+def cost(query: str, variables=None) -> tuple[int, int]:
+    # pylint: disable=protected-access
+    return query_cost(schema._schema, parse(query), None, variables)
+
+
+def test_query_cost():
+    # One query for the members, one for the transactions of each member
+    assert cost("{ members { shares transactions { amount } } }") == (11, 3)
+    assert cost(
+        "{ members(limit: 100) { percentageOfTreasury transactions { amount } } }"
+    ) == (201, 3)
+    assert cost(
+        "query ($limit: Int!) { proposals(limit: $limit) { id currentQuorum } }",
+        variables={"limit": 5},
+    ) == (11, 2)
+    # The fields of the proposal types are weighted on the interface
+    query = """{
+      proposals {
+        ...Fields
+        ... on Onboard { shares }
+      }
+    }
+    fragment Fields on Proposal { status totalVotableShares }"""
+    assert cost(query) == (41, 2)
+    # Not limited
+    assert cost("{ members(limit: 0) { transactions { amount } } }") == (
+        1 + config.graphql_query_unbounded_list_size,
+        3,
+    )
+    # Introspection is free
+    assert cost("{ __schema { types { name } } }") == (0, 0)
+
+
+async def test_query_cost_limits(
+    async_mongomock_db: AsyncIOMotorDatabase, monkeypatch: MonkeyPatch
+):
+    context_value = {"db": async_mongomock_db}
+
+    result = await schema.execute(
+        "{ bank { totalShares } }", context_value=context_value
+    )
+    assert result.extensions["cost"] == {
+        "requested": 1,
+        "maximum": config.graphql_query_max_cost,
+        "depth": 2,
+    }
+
+    monkeypatch.setattr(config, "graphql_query_max_cost", 100)
+    result = await schema.execute(
+        "{ members(limit: 100) { transactions(limit: 100) { amount } } }",
+        context_value=context_value,
+    )
+    assert result.data is None
+    assert result.errors[0].message == "The query cost 101 is over the limit of 100"
+    assert result.extensions["cost"]["requested"] == 101
+
+    monkeypatch.setattr(config, "graphql_query_max_depth", 2)
+    result = await schema.execute(
+        "{ members { balances { amount } } }", context_value=context_value
+    )
+    assert result.errors[0].message == "The query depth 3 is over the limit of 2"
+
+    # The variables of the wrong type are rejected by the execution
+    result = await schema.execute(
+        "query ($limit: Int!) { members(limit: $limit) { shares } }",
+        variable_values={"limit": "abc"},
+        context_value=context_value,
+    )
+    assert result.data is None
+    assert result.errors[0].message.startswith(
+        "Variable '$limit' got invalid value 'abc'"
+    )
+
+
+async def test_admission():
+    admission = Admission(capacity=10, timeout=0.05)
+
+    await admission.acquire(8)
+    # Queued until the first query ends
+    second = asyncio.ensure_future(admission.acquire(5))
+    await asyncio.sleep(0.01)
+    assert not second.done()
+    await admission.release(8)
+    await second
+    assert admission.available == 5
+
+    # Rejected after the timeout
+    with pytest.raises(QueryCostError):
+        await admission.acquire(6)
+
+    # More than the capacity, runs alone
+    await admission.release(5)
+    await admission.acquire(50)
+    assert admission.available == 0
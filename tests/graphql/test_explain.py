@@ -0,0 +1,65 @@
+from unittest.mock import Mock
+
+from dao.graphql import explain
+
+DAO_ADDRESS = b"\x01"
+
+INDEX_PLAN = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "daoAddress_1_id_1"},
+        },
+        "rejectedPlans": [{"stage": "COLLSCAN"}],
+    }
+}
+COLLSCAN_PLAN = {
+    "stages": [
+        {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}},
+        {"$group": {}},
+    ]
+}
+
+
+async def test_record_queries():
+    queries = await explain.record_queries(DAO_ADDRESS)
+
+    assert {query.collection for query in queries} == {
+        "members",
+        "proposals",
+        "transactions",
+        "bank",
+    }
+    for query in queries:
+        filter = query.filter if query.pipeline is None else query.pipeline[0]["$match"]
+        if query.collection != "transactions":
+            # Only the current versions are read, see storage.CURRENT_VERSION
+            assert filter["_chain.valid_to"] is None
+
+    members = next(query for query in queries if query.name == "list_members after")
+    assert members.command()["sort"] == {"onboardedAt": 1, "memberAddress": 1}
+    assert members.command()["limit"] == explain.PAGE_SIZE
+    assert members.command()["filter"]["daoAddress"] == DAO_ADDRESS
+
+
+def test_plan_indexes():
+    assert explain.plan_indexes(INDEX_PLAN) == ["daoAddress_1_id_1"]
+    assert explain.plan_indexes(COLLSCAN_PLAN) == []
+
+
+async def test_check_indexes():
+    db = Mock()
+    db.command.side_effect = lambda _, command, **kwargs: (
+        COLLSCAN_PLAN if "aggregate" in command else INDEX_PLAN
+    )
+
+    results = await explain.check_indexes(db, DAO_ADDRESS)
+
+    scans = {query.name for query, indexes in results if not indexes}
+    assert scans == {
+        "list_proposals",
+        "list_proposals after",
+        "list_proposals of all the DAOs",
+        "list_proposals of all the DAOs after",
+        "load_totals",
+    }
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import MongoClient
+
+from dao import utils
+from dao.graphql.schema import schema
+
+CURRENT = {"_chain": {"valid_from": 1, "valid_to": None}}
+
+
+async def read_pages(
+    db: AsyncIOMotorDatabase, field: str, selection: str, limit: int, args: str = ""
+) -> list[list[dict]]:
+    pages = []
+    after = None
+    while True:
+        cursor_arg = "" if after is None else f', after: "{after}"'
+        query = (
+            f"{{ {field}(limit: {limit}{cursor_arg}{args}) {{ {selection} cursor }} }}"
+        )
+        result = await schema.execute(query, context_value={"db": db})
+        assert result.errors is None
+
+        page = result.data[field]
+        if not page:
+            return pages
+        pages.append([{k: v for k, v in doc.items() if k != "cursor"} for doc in page])
+        after = page[-1]["cursor"]
+
+
+async def test_proposals_pages(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    now = utils.utcnow()
+    mongomock_client.db.proposals.insert_many(
+        [
+            {
+                "daoAddress": dao_address,
+                "id": id_,
+                "title": "",
+                "type": "Signaling",
+                "link": "",
+                # Two proposals submitted at the same time in each DAO
+                "submittedAt": now + timedelta(minutes=id_ // 2),
+                "submittedBy": b"\x01",
+                "majority": 50,
+                "quorum": 50,
+                "votingDuration": 1,
+                "graceDuration": 1,
+                "rawStatus": "submitted",
+                "rawStatusHistory": [],
+                **CURRENT,
+            }
+            for dao_address in (b"\x01", b"\x02")
+            for id_ in range(5)
+        ]
+        # Previous version
+        + [{"daoAddress": b"\x01", "id": 4, "_chain": {"valid_to": 1}}]
+    )
+
+    pages = await read_pages(
+        async_mongomock_db, "proposals", "id", limit=2, args=', daoAddress: "0x01"'
+    )
+    assert pages == [[{"id": 4}, {"id": 3}], [{"id": 2}, {"id": 1}], [{"id": 0}]]
+
+    # Same ids and submission times in both DAOs
+    pages = await read_pages(async_mongomock_db, "proposals", "daoAddress id", limit=3)
+    proposals = [(p["daoAddress"], p["id"]) for page in pages for p in page]
+    assert proposals == [
+        ("0x02", 4),
+        ("0x01", 4),
+        ("0x02", 3),
+        ("0x02", 2),
+        ("0x01", 3),
+        ("0x01", 2),
+        ("0x02", 1),
+        ("0x02", 0),
+        ("0x01", 1),
+        ("0x01", 0),
+    ]
+
+
+async def test_members_pages(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    now = utils.utcnow()
+    mongomock_client.db.members.insert_many(
+        [
+            {
+                "daoAddress": b"\x01",
+                "memberAddress": bytes([address]),
+                "shares": 1,
+                "loot": 0,
+                "onboardedAt": now - timedelta(days=address % 3),
+                **CURRENT,
+            }
+            for address in range(1, 8)
+        ]
+    )
+
+    pages = await read_pages(async_mongomock_db, "members", "memberAddress", limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    addresses = [member["memberAddress"] for page in pages for member in page]
+    assert addresses == ["0x02", "0x05", "0x01", "0x04", "0x07", "0x03", "0x06"]
+
+
+async def test_invalid_cursor(async_mongomock_db: AsyncIOMotorDatabase):
+    result = await schema.execute(
+        '{ members(after: "not a cursor") { memberAddress } }',
+        context_value={"db": async_mongomock_db},
+    )
+
+    assert result.errors[0].message == "Invalid cursor 'not a cursor'"
@@ -1,5 +1,7 @@
 # pylint: disable=too-many-arguments,too-many-locals
+import asyncio
 from datetime import timedelta
+from types import SimpleNamespace
 
 from pytest import MonkeyPatch
 
@@ -22,8 +24,8 @@ def test_proposal_basic():
     graceDuration = 5
     yesVoters = []
     noVoters = []
-    yesVotersMembers = []
-    noVotersMembers = []
+    yesVotesTotal = 0
+    noVotesTotal = 0
     rawStatus = ProposalRawStatus.SUBMITTED.value
     rawStatusHistory = [(rawStatus, submittedAt)]
 
@@ -40,8 +42,8 @@ def test_proposal_basic():
         graceDuration=graceDuration,
         yesVoters=yesVoters,
         noVoters=noVoters,
-        yesVotersMembers=yesVotersMembers,
-        noVotersMembers=noVotersMembers,
+        yesVotesTotal=yesVotesTotal,
+        noVotesTotal=noVotesTotal,
         rawStatus=rawStatus,
         rawStatusHistory=rawStatusHistory,
     )
@@ -58,8 +60,8 @@ def test_proposal_basic():
     assert proposal.graceDuration == graceDuration
     assert proposal.yesVoters == yesVoters
     assert proposal.noVoters == noVoters
-    assert proposal.yesVotersMembers == yesVotersMembers
-    assert proposal.noVotersMembers == noVotersMembers
+    assert proposal.yesVotesTotal == yesVotesTotal
+    assert proposal.noVotesTotal == noVotesTotal
     assert proposal.rawStatus == rawStatus
     assert proposal.rawStatusHistory == rawStatusHistory
 
@@ -67,7 +69,7 @@ def test_proposal_basic():
 
 
 # pylint: disable=too-many-statements
-def test_proposal_status(monkeypatch: MonkeyPatch):
+async def test_proposal_status(monkeypatch: MonkeyPatch):
     proposal = test_proposal_basic()
 
     votingPeriodEndingAt = proposal.submittedAt + timedelta(
@@ -82,72 +84,76 @@ def test_proposal_status(monkeypatch: MonkeyPatch):
     assert proposal.votingPeriodEndingAt() == votingPeriodEndingAt
     assert proposal.gracePeriodEndingAt() == gracePeriodEndingAt
 
-    assert proposal.approvedAt(info) is None
-    assert proposal.rejectedAt(info) is None
-    assert proposal.approvedToProcessAt(info) is None
-    assert proposal.rejectedToProcessAt(info) is None
+    assert await proposal.approvedAt(info) is None
+    assert await proposal.rejectedAt(info) is None
+    assert await proposal.approvedToProcessAt(info) is None
+    assert await proposal.rejectedToProcessAt(info) is None
 
     assert proposal.get_raw_status_time(ProposalRawStatus.FORCED) is None
 
     # Proposal is at voting period since voting duration hasn't ended yet
-    assert proposal.status(info) == ProposalStatus.VOTING_PERIOD
-    assert proposal.active(info) is True
+    assert await proposal.status(info) == ProposalStatus.VOTING_PERIOD
+    assert await proposal.active(info) is True
     now = utils.utcnow()
     monkeypatch.setattr(utils, "utcnow", lambda: now)
-    assert proposal.timeRemaining(info) == int(
+    assert await proposal.timeRemaining(info) == int(
         (now - votingPeriodEndingAt).total_seconds()
     )
 
     # After the voting period, the proposal should be rejected ready to process
     # since the quorum and majority conditions aren't met
     monkeypatch.setattr(utils, "utcnow", lambda: votingPeriodEndingAt)
-    assert proposal.status(info) == ProposalStatus.REJECTED_READY
-    assert proposal.active(info) is True
-    assert proposal.rejectedToProcessAt(info) == votingPeriodEndingAt
-    assert proposal.timeRemaining(info) is None
+    assert await proposal.status(info) == ProposalStatus.REJECTED_READY
+    assert await proposal.active(info) is True
+    assert await proposal.rejectedToProcessAt(info) == votingPeriodEndingAt
+    assert await proposal.timeRemaining(info) is None
 
     # When the majority and quorum conditions are met, the proposal should be
     # in grace period until the current time is gracePeriodEndingAt
     proposal.currentMajority = lambda: proposal.majority
-    proposal.currentQuorum = lambda info: proposal.quorum
-    assert proposal.status(info) == ProposalStatus.GRACE_PERIOD
-    assert proposal.active(info) is True
+
+    async def current_quorum(_info):
+        return proposal.quorum
+
+    proposal.currentQuorum = current_quorum
+    assert await proposal.status(info) == ProposalStatus.GRACE_PERIOD
+    assert await proposal.active(info) is True
     now = utils.utcnow()
     monkeypatch.setattr(utils, "utcnow", lambda: now)
-    assert proposal.timeRemaining(info) == int(
+    assert await proposal.timeRemaining(info) == int(
         (now - gracePeriodEndingAt).total_seconds()
     )
 
     # After the grace period, the proposal should be approved ready to process
     # since the quorum and majority conditions are met
     monkeypatch.setattr(utils, "utcnow", lambda: gracePeriodEndingAt)
-    assert proposal.status(info) == ProposalStatus.APPROVED_READY
-    assert proposal.active(info) is True
-    assert proposal.approvedToProcessAt(info) == gracePeriodEndingAt
-    assert proposal.timeRemaining(info) is None
+    assert await proposal.status(info) == ProposalStatus.APPROVED_READY
+    assert await proposal.active(info) is True
+    assert await proposal.approvedToProcessAt(info) == gracePeriodEndingAt
+    assert await proposal.timeRemaining(info) is None
 
     # simulate ProposalStatusUpdated with status=ACCEPTED
     proposal.rawStatus = ProposalRawStatus.APPROVED.value
     approvedAt = utils.utcnow()
     proposal.rawStatusHistory.append((ProposalRawStatus.APPROVED.value, approvedAt))
-    assert proposal.status(info) == ProposalStatus.APPROVED
-    assert proposal.active(info) is False
-    assert proposal.approvedAt(info) == approvedAt
-    assert proposal.processedAt(info) == approvedAt
-    assert proposal.timeRemaining(info) is None
+    assert await proposal.status(info) == ProposalStatus.APPROVED
+    assert await proposal.active(info) is False
+    assert await proposal.approvedAt(info) == approvedAt
+    assert await proposal.processedAt(info) == approvedAt
+    assert await proposal.timeRemaining(info) is None
 
     # simulate ProposalStatusUpdated with status=REJECTED
     proposal.rawStatus = ProposalRawStatus.REJECTED.value
     rejectedAt = utils.utcnow()
     proposal.rawStatusHistory.append((ProposalRawStatus.REJECTED.value, rejectedAt))
-    assert proposal.status(info) == ProposalStatus.REJECTED
-    assert proposal.active(info) is False
-    assert proposal.rejectedAt(info) == rejectedAt
-    assert proposal.processedAt(info) == rejectedAt
-    assert proposal.timeRemaining(info) is None
+    assert await proposal.status(info) == ProposalStatus.REJECTED
+    assert await proposal.active(info) is False
+    assert await proposal.rejectedAt(info) == rejectedAt
+    assert await proposal.processedAt(info) == rejectedAt
+    assert await proposal.timeRemaining(info) is None
 
     proposal.rawStatus = ProposalRawStatus.FORCED.value
-    assert proposal.status(info) == ProposalStatus.UNKNOWN
+    assert await proposal.status(info) == ProposalStatus.UNKNOWN
 
 
 def test_proposal_member_did_vote():
@@ -172,19 +178,20 @@ def test_proposal_memeber_did_vote():
     assert proposal.memberCanVote(memberAddress) is True
 
 
-def test_proposal_majority_quorum(monkeypatch: MonkeyPatch):
+async def test_proposal_majority_quorum(monkeypatch: MonkeyPatch):
     proposal = test_proposal_basic()
 
     info = None
 
-    monkeypatch.setattr(
-        storage, "list_votable_members", lambda info, *args, **kwargs: []
-    )
+    async def list_no_votable_members(info, *args, **kwargs):
+        return []
+
+    monkeypatch.setattr(storage, "list_votable_members", list_no_votable_members)
 
     assert proposal.currentMajority() == 0
-    assert proposal.currentQuorum(info) == 0
-    assert proposal.yesVotesTotal() == 0
-    assert proposal.noVotesTotal() == 0
+    assert await proposal.currentQuorum(info) == 0
+    assert proposal.yesVotesTotal == 0
+    assert proposal.noVotesTotal == 0
 
     now = utils.utcnow()
 
@@ -207,17 +214,73 @@ def test_proposal_majority_quorum(monkeypatch: MonkeyPatch):
 
     members = yesVotersMembers + noVotersMembers + otherMembers
 
-    monkeypatch.setattr(
-        storage, "list_votable_members", lambda info, *args, **kwargs: members
-    )
+    async def list_votable_members(info, *args, **kwargs):
+        return members
 
-    proposal.yesVoters = [member["memberAddress"] for member in yesVotersMembers]
+    monkeypatch.setattr(storage, "list_votable_members", list_votable_members)
 
-    proposal.yesVotersMembers = yesVotersMembers
+    proposal.yesVoters = [member["memberAddress"] for member in yesVotersMembers]
+    proposal.yesVotesTotal = sum(member["shares"] for member in yesVotersMembers)
 
     proposal.noVoters = [member["memberAddress"] for member in noVotersMembers]
-    proposal.noVotersMembers = noVotersMembers
+    proposal.noVotesTotal = sum(member["shares"] for member in noVotersMembers)
 
-    assert proposal.currentQuorum(info) == 80
-    assert proposal.totalVotableShares(info) == 25
+    assert await proposal.currentQuorum(info) == 80
+    assert await proposal.totalVotableShares(info) == 25
     assert proposal.currentMajority() == 75
+
+
+async def test_proposal_fields_memoized(monkeypatch: MonkeyPatch):
+    proposal = test_proposal_basic()
+    info = SimpleNamespace(context={})
+
+    calls = 0
+
+    async def list_votable_members(info, *args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return []
+
+    monkeypatch.setattr(storage, "list_votable_members", list_votable_members)
+
+    # Each call of utcnow is a second later
+    start = proposal.votingPeriodEndingAt()
+    clock = iter(start + timedelta(seconds=second) for second in range(100))
+    monkeypatch.setattr(utils, "utcnow", lambda: next(clock))
+
+    fields = await asyncio.gather(
+        proposal.status(info),
+        proposal.active(info),
+        proposal.rejectedToProcessAt(info),
+        proposal.processedAt(info),
+        proposal.currentQuorum(info),
+        proposal.timeRemaining(info),
+        proposal.status(info),
+    )
+
+    assert fields == [
+        ProposalStatus.REJECTED_READY,
+        True,
+        start,
+        None,
+        0,
+        None,
+        ProposalStatus.REJECTED_READY,
+    ]
+    assert calls == 1
+    # The request has a single clock
+    assert info.context["now"] == start
+
+
+async def test_proposal_cache_hints():
+    proposal = test_proposal_basic()
+
+    info = SimpleNamespace(context={})
+    assert await proposal.status(info) is ProposalStatus.VOTING_PERIOD
+    # The status changes at the end of the voting period
+    assert info.context["cache_expires_at"] == proposal.votingPeriodEndingAt()
+
+    await proposal.timeRemaining(info)
+    assert info.context["cache_expires_at"] == info.context["now"] + timedelta(
+        seconds=1
+    )
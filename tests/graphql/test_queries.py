@@ -1,12 +1,18 @@
+from collections import Counter
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo import MongoClient
+from pytest import MonkeyPatch
 
+from dao.graphql import storage
 from dao.graphql.schema import schema
 
 from .. import data
 
 
-def test_empty_query(mongomock_client: MongoClient):
-    context_value = {"db": mongomock_client.db}
+async def test_empty_query(async_mongomock_db: AsyncIOMotorDatabase):
+    context_value = {"db": async_mongomock_db}
 
     query = """
         query Proposals {
@@ -16,47 +22,195 @@ def test_empty_query(mongomock_client: MongoClient):
         }
     """
 
-    result = schema.execute_sync(query, context_value=context_value)
+    result = await schema.execute(query, context_value=context_value)
 
     assert result.errors is None
     assert result.data["proposals"] == []
 
 
-def test_proposals_query(mongomock_client: MongoClient):
-    context_value = {"db": mongomock_client.db}
+async def test_proposals_query(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    context_value = {"db": async_mongomock_db}
 
     mongomock_client.db.proposals.insert_many(data.PROPOSALS)
     mongomock_client.db.members.insert_many(data.MEMBERS)
 
-    result = schema.execute_sync(
+    result = await schema.execute(
         data.graphql_queries.LIST_PROPOSALS, context_value=context_value
     )
 
     assert result.errors is None
-    assert result.data["proposals"] == data.graphql_expected.LIST_PROPOSALS
+    # Newest first, the proposals are submitted at the same time
+    assert result.data["proposals"] == data.graphql_expected.LIST_PROPOSALS[::-1]
 
 
-def test_members_query(mongomock_client: MongoClient):
-    context_value = {"db": mongomock_client.db}
+async def test_members_query(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    context_value = {"db": async_mongomock_db}
 
     mongomock_client.db.bank.insert_one(data.BANK)
     mongomock_client.db.members.insert_many(data.MEMBERS)
+    mongomock_client.db.transactions.insert_many(data.TRANSACTIONS)
+
+    result = await schema.execute(
+        data.graphql_queries.LIST_MEMBERS, context_value=context_value
+    )
+
+    assert result.errors is None
+    # By onboarding time, then by address
+    assert result.data["members"] == sorted(
+        data.graphql_expected.LIST_MEMBERS,
+        key=lambda member: (member["onboardedAt"], member["memberAddress"]),
+    )
+
+
+async def test_members_query_loads_bank_once(
+    mongomock_client: MongoClient,
+    async_mongomock_db: AsyncIOMotorDatabase,
+    monkeypatch: MonkeyPatch,
+):
+    context_value = {"db": async_mongomock_db}
+
+    mongomock_client.db.bank.insert_one(data.BANK)
+    mongomock_client.db.members.insert_many(data.MEMBERS)
+
+    calls = Counter()
 
-    result = schema.execute_sync(
+    def counted(name, load_fn):
+        async def wrapper(db, keys):
+            calls[name] += 1
+            return await load_fn(db, keys)
+
+        return wrapper
+
+    for name in ("load_banks", "load_totals"):
+        monkeypatch.setattr(storage, name, counted(name, getattr(storage, name)))
+
+    result = await schema.execute(
         data.graphql_queries.LIST_MEMBERS, context_value=context_value
     )
 
     assert result.errors is None
-    assert result.data["members"] == data.graphql_expected.LIST_MEMBERS
+    # percentageOfTreasury and votingWeight of every member share the bank
+    assert calls == {"load_banks": 1, "load_totals": 1}
+
+
+async def test_bank_query_indexed_totals(
+    mongomock_client: MongoClient,
+    async_mongomock_db: AsyncIOMotorDatabase,
+    monkeypatch: MonkeyPatch,
+):
+    context_value = {"db": async_mongomock_db}
+
+    mongomock_client.db.bank.insert_one(
+        {**data.BANK, "totalShares": 1000, "totalLoot": 10}
+    )
+    mongomock_client.db.members.insert_many(data.MEMBERS)
+
+    async def load_totals(db, keys):
+        raise AssertionError("The totals are maintained by the indexer")
+
+    monkeypatch.setattr(storage, "load_totals", load_totals)
+
+    result = await schema.execute(
+        "{ bank { totalShares totalLoot } }", context_value=context_value
+    )
+
+    assert result.errors is None
+    assert result.data["bank"] == {"totalShares": 1000, "totalLoot": 10}
 
 
-def test_bank_query(mongomock_client: MongoClient):
-    context_value = {"db": mongomock_client.db}
+async def test_bank_query(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    context_value = {"db": async_mongomock_db}
 
     mongomock_client.db.bank.insert_one(data.BANK)
     mongomock_client.db.members.insert_many(data.MEMBERS)
+    mongomock_client.db.transactions.insert_many(data.TRANSACTIONS)
 
-    result = schema.execute_sync(data.graphql_queries.BANK, context_value=context_value)
+    result = await schema.execute(
+        data.graphql_queries.BANK, context_value=context_value
+    )
 
     assert result.errors is None
     assert result.data["bank"] == data.graphql_expected.BANK
+
+
+async def test_member_transactions_pagination(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    context_value = {"db": async_mongomock_db}
+
+    mongomock_client.db.bank.insert_one(data.BANK)
+    mongomock_client.db.members.insert_one(data.MEMBERS[0])
+    mongomock_client.db.transactions.insert_many(
+        [
+            {
+                **data.TRANSACTIONS[0],
+                "_id": ObjectId(),
+                "eventIndex": index,
+                "amount": index,
+            }
+            for index in range(5)
+        ]
+    )
+
+    query = """
+        query Members {
+            members {
+                transactions(skip: 1, limit: 2) {
+                    amount
+                }
+            }
+        }
+    """
+
+    result = await schema.execute(query, context_value=context_value)
+
+    assert result.errors is None
+    assert result.data["members"] == [{"transactions": [{"amount": 1}, {"amount": 2}]}]
+
+
+async def test_dao_queries(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    context_value = {"db": async_mongomock_db}
+
+    for dao_address, shares in ((b"\x01", 10), (b"\x02", 30)):
+        mongomock_client.db.bank.insert_one(
+            {**data.BANK, "_id": ObjectId(), "daoAddress": dao_address}
+        )
+        mongomock_client.db.members.insert_one(
+            {
+                **data.MEMBERS[0],
+                "_id": ObjectId(),
+                "daoAddress": dao_address,
+                "shares": shares,
+                "loot": 0,
+            }
+        )
+
+    query = """
+        query Dao {
+            members(daoAddress: "0x02") {
+                daoAddress
+                shares
+                votingWeight
+            }
+            bank(daoAddress: "0x02") {
+                daoAddress
+                totalShares
+            }
+        }
+    """
+
+    result = await schema.execute(query, context_value=context_value)
+
+    assert result.errors is None
+    assert result.data == {
+        "members": [{"daoAddress": "0x02", "shares": 30, "votingWeight": 1.0}],
+        "bank": {"daoAddress": "0x02", "totalShares": 30},
+    }
@@ -0,0 +1,225 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import MongoClient
+from pytest import MonkeyPatch
+
+from dao import utils
+from dao.graphql.cache import IndexedHead
+from dao.graphql.main import create_app
+from dao.graphql.schema import schema
+from dao.graphql.subscriptions import IndexerTail, SubscriptionOverflowError
+from dao.indexer import undo
+
+
+def proposal(id_: int, block_number: int, valid_to=None) -> dict:
+    return {
+        "daoAddress": b"\x01",
+        "id": id_,
+        "title": "",
+        "type": "Signaling",
+        "link": "",
+        "submittedAt": utils.utcnow(),
+        "submittedBy": b"\x0a",
+        "majority": 50,
+        "quorum": 50,
+        "votingDuration": 60,
+        "graceDuration": 60,
+        "rawStatus": "submitted",
+        "rawStatusHistory": [],
+        "_chain": {"valid_from": block_number, "valid_to": valid_to},
+    }
+
+
+async def subscribe(context: dict, query: str, subscribers: int) -> list:
+    """Start the subscriptions, their first result is awaited by the tasks"""
+    results = [
+        await schema.subscribe(query, context_value={**context})
+        for _ in range(subscribers)
+    ]
+    tasks = [asyncio.ensure_future(result.__anext__()) for result in results]
+    # The subscriptions register with the tail
+    await asyncio.sleep(0.01)
+    return tasks
+
+
+async def test_subscriptions(
+    mongomock_client: MongoClient,
+    async_mongomock_db: AsyncIOMotorDatabase,
+    monkeypatch: MonkeyPatch,
+):
+    db = mongomock_client.db
+    tail = IndexerTail(async_mongomock_db, queue_size=10, max_blocks=10)
+    await tail.follow(1)
+    context = {"db": async_mongomock_db, "tail": tail}
+
+    reads = 0
+    read = tail.read
+
+    async def counted_read(after, to):
+        nonlocal reads
+        reads += 1
+        return await read(after, to)
+
+    monkeypatch.setattr(tail, "read", counted_read)
+
+    proposals = await subscribe(
+        context, "subscription { proposalUpdated { id status } }", subscribers=3
+    )
+    votes = await subscribe(
+        context,
+        "subscription { voteSubmitted(proposalId: 2) { voterAddress shares } }",
+        subscribers=1,
+    )
+
+    # Block 2 submits proposal 1, block 3 updates it and records a vote on
+    # proposal 2
+    db.proposals.insert_many([proposal(1, 2, valid_to=3), proposal(1, 3)])
+    ids = [doc["_id"] for doc in db.proposals.find({}, sort=[("_id", 1)])]
+    db.votes.insert_many(
+        [
+            {
+                "daoAddress": b"\x01",
+                "proposalId": proposal_id,
+                "voterAddress": b"\x0a",
+                "callerAddress": b"\x0a",
+                "vote": True,
+                "shares": shares,
+                "votedAt": utils.utcnow(),
+                "_chain": {"valid_from": 3, "valid_to": None},
+            }
+            for proposal_id, shares in ((1, 5), (2, 10))
+        ]
+    )
+    db["_undo"].insert_many(
+        [
+            {
+                "block": 2,
+                "collection": "proposals",
+                "op": "insert",
+                "documentId": ids[0],
+            },
+            {
+                "block": 3,
+                "collection": "proposals",
+                "op": "insert",
+                "documentId": ids[1],
+            },
+            {"block": 3, "collection": "votes", "op": "append"},
+        ]
+    )
+    await tail.follow(3)
+
+    for task in proposals:
+        result = await asyncio.wait_for(task, timeout=1)
+        assert result.errors is None
+        assert result.data == {"proposalUpdated": {"id": 1, "status": "VOTING_PERIOD"}}
+    result = await asyncio.wait_for(votes[0], timeout=1)
+    assert result.data == {"voteSubmitted": {"voterAddress": "0x0a", "shares": 10}}
+
+    # The blocks are read once for all the subscribers
+    assert reads == 1
+
+    # A rewind doesn't publish anything
+    await tail.follow(2)
+    assert (tail.block_number, reads) == (2, 1)
+
+
+async def test_subscriptions_follow_flushed_blocks(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    db = mongomock_client.db
+    undo.set_flushed(db, 1)
+    head = IndexedHead(async_mongomock_db, interval=1)
+    tail = IndexerTail(async_mongomock_db, queue_size=10, max_blocks=10)
+    head.listeners.append(tail.follow)
+    await head.poll()
+
+    votes = await subscribe(
+        {"db": async_mongomock_db, "tail": tail},
+        "subscription { voteSubmitted { shares } }",
+        subscribers=1,
+    )
+
+    # A backfill moved apibara to block 2 before flushing it
+    db["_apibara"].insert_one({"indexer_id": "test", "indexed_to": 2})
+    await head.poll()
+    assert tail.block_number == 1
+
+    db.votes.insert_one(
+        {
+            "daoAddress": b"\x01",
+            "proposalId": 1,
+            "voterAddress": b"\x0a",
+            "callerAddress": b"\x0a",
+            "vote": True,
+            "shares": 4,
+            "votedAt": utils.utcnow(),
+            "_chain": {"valid_from": 2, "valid_to": None},
+        }
+    )
+    db["_undo"].insert_one({"block": 2, "collection": "votes", "op": "append"})
+    undo.set_flushed(db, 2)
+    await head.poll()
+
+    result = await asyncio.wait_for(votes[0], timeout=1)
+    assert result.data == {"voteSubmitted": {"shares": 4}}
+
+
+async def test_subscription_overflow(async_mongomock_db: AsyncIOMotorDatabase):
+    tail = IndexerTail(async_mongomock_db, queue_size=1, max_blocks=10)
+    documents = tail.subscribe("votes")
+    first = asyncio.ensure_future(documents.__anext__())
+    await asyncio.sleep(0)
+
+    tail.publish("votes", [{"shares": 1}])
+    assert await first == {"shares": 1}
+
+    tail.publish("votes", [{"shares": 2}, {"shares": 3}])
+    with pytest.raises(SubscriptionOverflowError):
+        await documents.__anext__()
+
+
+async def test_websocket_subscription(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    db = mongomock_client.db
+    undo.set_flushed(db, 1)
+
+    async with TestClient(TestServer(create_app(async_mongomock_db))) as client:
+        ws = await client.ws_connect("/graphql", protocols=["graphql-transport-ws"])
+        await ws.send_json({"type": "connection_init"})
+        assert await ws.receive_json() == {"type": "connection_ack"}
+        await ws.send_json(
+            {
+                "type": "subscribe",
+                "id": "1",
+                "payload": {
+                    "query": "subscription { balanceChanged { ownerAddress amount } }"
+                },
+            }
+        )
+        await asyncio.sleep(0.01)
+
+        db.transactions.insert_one(
+            {
+                "daoAddress": b"\x01",
+                "ownerAddress": b"\x0a",
+                "tokenAddress": b"\x0b",
+                "amount": 7,
+                "timestamp": utils.utcnow(),
+                "_chain": {"valid_from": 2, "valid_to": None},
+            }
+        )
+        db["_undo"].insert_one(
+            {"block": 2, "collection": "transactions", "op": "append"}
+        )
+        undo.set_flushed(db, 2)
+
+        message = await asyncio.wait_for(ws.receive_json(), timeout=5)
+        assert message["payload"] == {
+            "data": {"balanceChanged": {"ownerAddress": "0x0a", "amount": 7}}
+        }
+        await ws.close()
@@ -0,0 +1,116 @@
+from datetime import datetime
+from unittest.mock import Mock
+
+from pymongo import MongoClient
+from pytest import MonkeyPatch
+
+from dao.graphql import storage as graphql_storage
+from dao.indexer import main as indexer_main
+from dao.indexer.backfill import Backfill, recover
+
+from ..conftest import BlockHeaderFactory
+
+
+def create_backfill(db) -> Backfill:
+    backfill = Backfill(
+        db=db,
+        indexer_id="test",
+        blocks_per_flush=2,
+        head_distance=600,
+        idle_timeout=60,
+    )
+    backfill.start()
+    return backfill
+
+
+async def test_backfill_batches_blocks(
+    mongomock_client: MongoClient, block_header: BlockHeaderFactory
+):
+    db = mongomock_client.db
+    backfill = create_backfill(db)
+
+    batch = backfill.get_batch(block_number=1)
+    await batch.insert_one("members", {"memberAddress": b"\x01", "shares": 1})
+    await backfill.end_block(block_header(1))
+
+    # Nothing is written before `blocks_per_flush` blocks are handled
+    assert not list(db.members.find())
+    # The lookups of the indexer by key keep their index
+    indexes = db.members.index_information()
+    assert "daoAddress_1_memberAddress_1" in indexes
+    assert "daoAddress_1_onboardedAt_1_memberAddress_1" not in indexes
+
+    batch = backfill.get_batch(block_number=2)
+    await batch.find_one_and_update(
+        "members", {"memberAddress": b"\x01"}, {"$inc": {"shares": 1}}
+    )
+    await backfill.end_block(block_header(2))
+
+    members = list(db.members.find({}, {"_id": 0}))
+    assert members == [
+        {
+            "memberAddress": b"\x01",
+            "shares": 2,
+            "_chain": {"valid_from": 1, "valid_to": None},
+        }
+    ]
+    assert db["_backfill"].find_one({"indexer_id": "test"})["flushed_to"] == 2
+
+    # The backfill ends at the chain head
+    batch = backfill.get_batch(block_number=3)
+    await batch.insert_one("members", {"memberAddress": b"\x02", "shares": 1})
+    await backfill.end_block(block_header(3, timestamp=datetime.utcnow()))
+
+    assert not backfill.active
+    assert db.members.count_documents({"_chain.valid_to": None}) == 2
+    assert (
+        "daoAddress_1_onboardedAt_1_memberAddress_1" in db.members.index_information()
+    )
+    assert db["_backfill"].find_one({"indexer_id": "test"}) is None
+
+
+async def test_recover(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db["_apibara"].insert_one({"indexer_id": "test", "indexed_to": 5})
+    db["_backfill"].insert_one({"indexer_id": "test", "flushed_to": 2})
+    db.members.insert_many(
+        [
+            {"shares": 1, "_chain": {"valid_from": 1, "valid_to": 3}},
+            {"shares": 2, "_chain": {"valid_from": 3, "valid_to": None}},
+        ]
+    )
+
+    recover(db, "test")
+
+    members = list(db.members.find({}, {"_id": 0}))
+    assert members == [{"shares": 1, "_chain": {"valid_from": 1, "valid_to": None}}]
+    assert db["_apibara"].find_one({"indexer_id": "test"})["indexed_to"] == 2
+
+
+async def test_run_indexer_backfill(
+    mongomock_client: MongoClient, monkeypatch: MonkeyPatch
+):
+    db = mongomock_client.db
+    # Indexes of a database indexed before the backfill
+    graphql_storage.init_db(db)
+    indexes = {}
+
+    async def run():
+        indexes.update(db.members.index_information())
+
+    runner = Mock(_indexer_storage=Mock(db=db), run=run)
+    monkeypatch.setattr(indexer_main, "IndexerRunner", Mock(return_value=runner))
+    monkeypatch.setattr(indexer_main, "GatewayClient", Mock())
+
+    await indexer_main.run_indexer(
+        server_url="",
+        mongo_url="",
+        starknet_network_url="",
+        filters=[],
+        backfill=True,
+    )
+
+    # The secondary indexes are only restored when the backfill ends
+    assert "daoAddress_1_memberAddress_1" in indexes
+    assert "daoAddress_1_onboardedAt_1_memberAddress_1" not in indexes
+    assert "memberAddress_1" not in indexes
@@ -0,0 +1,102 @@
+from apibara import Info
+from pymongo import MongoClient
+
+from dao.indexer import storage
+from dao.indexer.batch import BlockBatch
+from dao.indexer.daos import Dao, DaoStorage
+from dao.indexer.members import MemberAdded, MemberUpdated
+
+from ..conftest import BlockHeaderFactory
+
+
+def current_bank(db) -> dict:
+    return db.bank.find_one(
+        {"_chain.valid_to": None}, {"_id": 0, "totalShares": 1, "totalLoot": 1}
+    )
+
+
+async def test_bank_totals(
+    mongomock_client: MongoClient, dao: Dao, block_header: BlockHeaderFactory
+):
+    db = mongomock_client.db
+
+    events = {
+        1: [
+            MemberAdded(memberAddress=b"\x0a", shares=10, loot=2, onboardedAt=1),
+            MemberAdded(memberAddress=b"\x0c", shares=5, loot=0, onboardedAt=1),
+        ],
+        2: [
+            MemberUpdated(
+                memberAddress=b"\x0a",
+                delegateAddress=b"\x0a",
+                shares=4,
+                loot=3,
+                jailed=False,
+                lastProposalYesVote=0,
+                onboardedAt=1,
+            )
+        ],
+    }
+    for block_number, block_events in events.items():
+        batch = BlockBatch(db=db, block_number=block_number)
+        info = Info(context={"db": db}, storage=DaoStorage(batch, dao))
+        for event in block_events:
+            await event._handle(info, block_header(block_number), None)
+        await batch.flush()
+
+        if block_number == 1:
+            assert current_bank(db) == {"totalShares": 15, "totalLoot": 2}
+
+    assert current_bank(db) == {"totalShares": 9, "totalLoot": 3}
+
+    # The totals are versioned with the bank
+    storage.invalidate(db, 1)
+    assert current_bank(db) == {"totalShares": 15, "totalLoot": 2}
+
+
+def test_init_bank_totals(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    chain = {"valid_from": 1, "valid_to": None}
+    db.bank.insert_one({"daoAddress": b"\x01", "bankAddress": b"\x0b", "_chain": chain})
+    db.members.insert_many(
+        [
+            {"daoAddress": b"\x01", "shares": 10, "loot": 1, "_chain": chain},
+            {"daoAddress": b"\x01", "shares": 3, "loot": 0, "_chain": chain},
+            {"daoAddress": b"\x02", "shares": 7, "loot": 7, "_chain": chain},
+        ]
+    )
+
+    storage.init_bank_totals(db)
+
+    assert current_bank(db) == {"totalShares": 13, "totalLoot": 1}
+
+    # Totals which don't match the members are computed again
+    db.bank.update_one({}, {"$set": {"totalShares": 5}})
+    storage.init_bank_totals(db)
+    assert current_bank(db) == {"totalShares": 13, "totalLoot": 1}
+
+
+async def test_bank_created_after_members(
+    mongomock_client: MongoClient, dao: Dao, block_header: BlockHeaderFactory
+):
+    db = mongomock_client.db
+    # Members indexed before the totals, without a bank
+    db.members.insert_one(
+        {
+            "daoAddress": dao.address,
+            "memberAddress": b"\x0a",
+            "shares": 10,
+            "loot": 2,
+            "_chain": {"valid_from": 1, "valid_to": None},
+        }
+    )
+    storage.init_bank_totals(db)
+
+    batch = BlockBatch(db=db, block_number=2)
+    info = Info(context={"db": db}, storage=DaoStorage(batch, dao))
+    await MemberAdded(memberAddress=b"\x0c", shares=5, loot=1, onboardedAt=2)._handle(
+        info, block_header(2), None
+    )
+    await batch.flush()
+
+    assert current_bank(db) == {"totalShares": 15, "totalLoot": 3}
@@ -0,0 +1,142 @@
+from pymongo import MongoClient
+
+from dao.graphql import storage
+from dao.indexer.batch import BlockBatch, apply_update, match
+
+
+def test_match():
+    doc = {
+        "memberAddress": b"\x01",
+        "roles": ["admin"],
+        "balances": [{"tokenAddress": b"\x02", "amount": 1}],
+    }
+
+    assert match(doc, {"memberAddress": b"\x01"})
+    assert match(doc, {"roles": "admin"})
+    assert match(doc, {"balances.tokenAddress": b"\x02"})
+    assert match(doc, {"jailedAt": None})
+    assert not match(doc, {"memberAddress": b"\x02"})
+    assert not match(doc, {"balances.tokenAddress": b"\x03"})
+
+
+def test_apply_update():
+    doc = {
+        "roles": ["admin", "govern"],
+        "balances": [
+            {"tokenAddress": b"\x01", "amount": 1},
+            {"tokenAddress": b"\x02", "amount": 2},
+        ],
+    }
+
+    apply_update(
+        doc,
+        {
+            "$inc": {"balances.$.amount": 10},
+            "$push": {"transactions": {"amount": 10}},
+            "$pull": {"roles": "admin"},
+            "$set": {"shares": 5},
+        },
+        filter={"balances.tokenAddress": b"\x02"},
+    )
+
+    assert doc == {
+        "roles": ["govern"],
+        "balances": [
+            {"tokenAddress": b"\x01", "amount": 1},
+            {"tokenAddress": b"\x02", "amount": 12},
+        ],
+        "transactions": [{"amount": 10}],
+        "shares": 5,
+    }
+
+
+async def test_block_batch_read_your_writes(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    batch = BlockBatch(db=db, block_number=10)
+
+    await batch.insert_one("members", {"memberAddress": b"\x01", "shares": 1})
+    await batch.find_one_and_update(
+        "members", {"memberAddress": b"\x01"}, {"$inc": {"shares": 2}}
+    )
+
+    member = await batch.find_one("members", {"memberAddress": b"\x01"})
+    assert member["shares"] == 3
+
+    # Nothing is written before the flush
+    assert not list(db.members.find())
+
+    await batch.flush()
+
+    members = list(db.members.find({}, {"_id": 0}))
+    assert members == [
+        {
+            "memberAddress": b"\x01",
+            "shares": 3,
+            "_chain": {"valid_from": 10, "valid_to": None},
+        }
+    ]
+
+
+async def test_block_batch_versions(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.members.insert_one(
+        {
+            "memberAddress": b"\x01",
+            "shares": 1,
+            "_chain": {"valid_from": 1, "valid_to": None},
+        }
+    )
+
+    batch = BlockBatch(db=db, block_number=10)
+
+    # Several updates during the same block produce a single new version
+    existing = await batch.find_one_and_update(
+        "members", {"memberAddress": b"\x01"}, {"$inc": {"shares": 1}}
+    )
+    assert existing["shares"] == 1
+    await batch.find_one_and_update(
+        "members", {"memberAddress": b"\x01"}, {"$push": {"roles": "admin"}}
+    )
+    assert (
+        await batch.find_one_and_update(
+            "members", {"memberAddress": b"\x02"}, {"$inc": {"shares": 1}}
+        )
+        is None
+    )
+
+    await batch.flush()
+
+    members = list(db.members.find({}, {"_id": 0}).sort("_chain.valid_from"))
+    assert members == [
+        {
+            "memberAddress": b"\x01",
+            "shares": 1,
+            "_chain": {"valid_from": 1, "valid_to": 10},
+        },
+        {
+            "memberAddress": b"\x01",
+            "shares": 2,
+            "roles": ["admin"],
+            "_chain": {"valid_from": 10, "valid_to": None},
+        },
+    ]
+
+
+async def test_block_batch_append_only(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    storage.create_indexes(db)
+
+    events = [
+        {"name": "MemberAdded", "blockNumber": 10, "transactionHash": b"\x01"},
+        {"name": "MemberUpdated", "blockNumber": 10, "transactionHash": b"\x01"},
+    ]
+
+    # The same block is written twice, the second time is a no-op
+    for _ in range(2):
+        batch = BlockBatch(db=db, block_number=10)
+        for index, event in enumerate(events):
+            await batch.insert_one("events", {**event, "eventIndex": index})
+        await batch.flush()
+
+    names = [event["name"] for event in db.events.find().sort("eventIndex")]
+    assert names == ["MemberAdded", "MemberUpdated"]
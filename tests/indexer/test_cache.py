@@ -0,0 +1,75 @@
+from pymongo import MongoClient
+
+from dao.indexer.batch import BlockBatch
+from dao.indexer.cache import StateCache
+
+
+def _member(address: bytes, valid_to=None) -> dict:
+    return {
+        "memberAddress": address,
+        "shares": 1,
+        "_chain": {"valid_from": 1, "valid_to": valid_to},
+    }
+
+
+def test_state_cache_warm(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.members.insert_many([_member(b"\x01"), _member(b"\x02", valid_to=2)])
+
+    cache = StateCache(max_bytes=1_000_000)
+    cache.warm(db)
+
+    assert cache.find_one(db, "members", b"\x01")["memberAddress"] == b"\x01"
+    # The collection is complete, unknown members don't exist
+    assert cache.find_one(db, "members", b"\x02") is None
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 0
+    assert cache.stats["documents"] == 1
+
+
+def test_state_cache_bound(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    members = [_member(bytes([i])) for i in range(10)]
+    db.members.insert_many(members)
+
+    max_bytes = sum(len(str(member)) for member in members[:3])
+    cache = StateCache(max_bytes=max_bytes)
+    cache.warm(db)
+
+    assert cache.stats["bytes"] <= max_bytes
+    assert cache.stats["evictions"] > 0
+
+    # Evicted members are read from MongoDB since the cache isn't complete
+    assert cache.find_one(db, "members", b"\x00")["memberAddress"] == b"\x00"
+    assert cache.stats["misses"] == 1
+
+
+def test_state_cache_start_block():
+    cache = StateCache(max_bytes=1_000_000)
+    cache.put("members", _member(b"\x01"))
+
+    cache.start_block(10)
+    cache.start_block(11)
+    assert cache.stats["documents"] == 1
+
+    # Going back to an already indexed block drops the cached state
+    cache.start_block(11)
+    assert cache.stats["documents"] == 0
+
+
+async def test_block_batch_write_through(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    cache = StateCache(max_bytes=1_000_000)
+    cache.warm(db)
+
+    batch = BlockBatch(db=db, block_number=10, cache=cache)
+    await batch.insert_one("members", {"memberAddress": b"\x01", "shares": 1})
+    await batch.flush()
+
+    db.members.drop()
+
+    batch = BlockBatch(db=db, block_number=11, cache=cache)
+    member = await batch.find_one("members", {"memberAddress": b"\x01"})
+    assert member["shares"] == 1
+    assert await batch.find_one("members", {"memberAddress": b"\x02"}) is None
+    assert cache.stats["misses"] == 0
@@ -0,0 +1,68 @@
+from unittest.mock import Mock
+
+from pymongo import MongoClient
+
+from dao import config, utils
+from dao.indexer.batch import BlockBatch
+from dao.indexer.cache import StateCache
+from dao.indexer.daos import Dao, DaoStorage, assign_dao, get_dao
+
+DAO_1 = Dao(address=b"\x01", bank_address=b"\x0b")
+DAO_2 = Dao(address=b"\x02", bank_address=b"\x0b")
+
+
+def test_get_dao():
+    # Event addresses are padded to 32 bytes
+    starknet_event = Mock(address=(2).to_bytes(32, "big"))
+
+    info = Mock(context={"daos": {DAO_1.address: DAO_1, DAO_2.address: DAO_2}})
+    assert get_dao(info, starknet_event) is DAO_2
+
+    info = Mock(context={})
+    assert get_dao(info, starknet_event) == Dao(
+        address=b"\x02", bank_address=utils.int_to_bytes(config.bank_address)
+    )
+
+
+async def test_dao_storage(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    cache = StateCache(max_bytes=1024 * 1024)
+    cache.warm(db)
+
+    for block_number, shares in ((1, 0), (2, 10)):
+        batch = BlockBatch(db=db, block_number=block_number, cache=cache)
+        storage_1, storage_2 = DaoStorage(batch, DAO_1), DaoStorage(batch, DAO_2)
+        if block_number == 1:
+            # The same member in both DAOs
+            for storage in (storage_1, storage_2):
+                await storage.insert_one(
+                    "members", {"memberAddress": b"\x0a", "shares": 1}
+                )
+        else:
+            await storage_2.find_one_and_update(
+                "members", {"memberAddress": b"\x0a"}, {"$inc": {"shares": shares}}
+            )
+            member = await storage_1.find_one("members", {"memberAddress": b"\x0a"})
+            assert member["shares"] == 1
+        await batch.flush()
+
+    members = db.members.find({"_chain.valid_to": None}, {"_id": 0, "_chain": 0})
+    assert sorted(members, key=lambda member: member["daoAddress"]) == [
+        {"memberAddress": b"\x0a", "shares": 1, "daoAddress": b"\x01"},
+        {"memberAddress": b"\x0a", "shares": 11, "daoAddress": b"\x02"},
+    ]
+    assert cache.find_one(db, "members", b"\x0a", dao_address=b"\x02")["shares"] == 11
+
+
+def test_assign_dao(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.members.insert_many(
+        [{"memberAddress": b"\x0a"}, {"memberAddress": b"\x0b", "daoAddress": b"\x02"}]
+    )
+
+    assign_dao(db, DAO_1)
+
+    assert [member["daoAddress"] for member in db.members.find()] == [
+        b"\x01",
+        b"\x02",
+    ]
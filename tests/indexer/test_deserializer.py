@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from pytest import MonkeyPatch
+
+from dao import utils
+from dao.indexer import deserializer
+from dao.indexer.deserializer import DecoderRegistry
+
+
+@dataclass
+class SampleEvent:
+    memberAddress: bytes
+    tokenName: str
+    amount: int
+
+
+SAMPLE_EVENT_ABI = {
+    "name": "SampleEvent",
+    "type": "event",
+    "keys": [],
+    "data": [
+        {"name": "memberAddress", "type": "felt"},
+        {"name": "tokenName", "type": "felt"},
+        {"name": "amount", "type": "felt"},
+    ],
+}
+
+
+@pytest.fixture
+def cairo_serializer(monkeypatch: MonkeyPatch) -> Mock:
+    cairo_serializer = Mock()
+    cairo_serializer.to_python.return_value = Mock(
+        memberAddress=1, tokenName=utils.str_to_felt("Token"), amount=10
+    )
+    cairo_serializer_class = Mock(return_value=cairo_serializer)
+    monkeypatch.setattr(deserializer, "CairoSerializer", cairo_serializer_class)
+    return cairo_serializer_class
+
+
+async def test_decoder_registry(cairo_serializer: Mock, monkeypatch: MonkeyPatch):
+    contract = Mock()
+    contract.data.abi = [SAMPLE_EVENT_ABI]
+    get_contract_mock = AsyncMock(return_value=contract)
+    monkeypatch.setattr(deserializer, "get_contract", get_contract_mock)
+
+    registry = DecoderRegistry()
+    info = Mock(context={"starknet_client": Mock()})
+    starknet_event = Mock(address=b"\x01", data=[b"\x01", b"\x02", b"\x03"])
+    starknet_event.name = "SampleEvent"
+
+    for _ in range(3):
+        kwargs = await registry.decode(
+            event_class=SampleEvent,
+            info=info,
+            block=Mock(),
+            starknet_event=starknet_event,
+        )
+        assert kwargs == {"memberAddress": b"\x01", "tokenName": "Token", "amount": 10}
+
+    # The contract and the serializer are created once
+    get_contract_mock.assert_called_once()
+    cairo_serializer.assert_called_once()
+    cairo_serializer.return_value.to_python.assert_called_with(
+        value_types=SAMPLE_EVENT_ABI["data"], values=[1, 2, 3]
+    )
+
+
+async def test_decoder_registry_missing_attribute(cairo_serializer: Mock):
+    @dataclass
+    class OtherEvent:
+        other: int
+
+    contract = Mock()
+    contract.data.abi = [{**SAMPLE_EVENT_ABI, "name": "OtherEvent"}]
+
+    registry = DecoderRegistry()
+    registry.add_contract(b"\x01", contract)
+
+    starknet_event = Mock(address=b"\x01")
+    starknet_event.name = "OtherEvent"
+
+    with pytest.raises(AttributeError, match="doesn't have attribute named other"):
+        await registry.decode(
+            event_class=OtherEvent,
+            info=Mock(),
+            block=Mock(),
+            starknet_event=starknet_event,
+        )
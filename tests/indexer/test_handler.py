@@ -1,16 +1,22 @@
+import asyncio
+from dataclasses import dataclass
 from unittest.mock import Mock
 
+from pymongo import MongoClient
 from pytest import LogCaptureFixture, MonkeyPatch
 
-from dao.indexer import handler
+from dao.indexer import handler, undo
+from dao.indexer.base_event import BaseEvent
 
 
 async def test_default_new_events_handler_edge_cases(
-    monkeypatch: MonkeyPatch, caplog: LogCaptureFixture
+    monkeypatch: MonkeyPatch,
+    caplog: LogCaptureFixture,
+    mongomock_client: MongoClient,
 ):
-    info = Mock()
+    info = Mock(context={"db": mongomock_client.db})
     event_mock = Mock()
-    block_events = Mock(events=[event_mock])
+    block_events = Mock(events=[event_mock], block=Mock(number=1))
     get_mock = Mock(return_value=None)
     all_events_mock = Mock(get=get_mock)
 
@@ -23,3 +29,63 @@ async def test_default_new_events_handler_edge_cases(
     get_mock.assert_called_once_with(event_mock.name)
 
     assert "Cannot find event class for" in caplog.text
+
+
+async def test_default_new_events_handler_indexed_block(
+    monkeypatch: MonkeyPatch, mongomock_client: MongoClient
+):
+    undo.set_flushed(mongomock_client.db, 1)
+    info = Mock(context={"db": mongomock_client.db})
+    block_events = Mock(events=[Mock()], block=Mock(number=1))
+    get_mock = Mock(return_value=None)
+
+    monkeypatch.setattr(handler, "ALL_EVENTS", Mock(get=get_mock))
+
+    await handler.default_new_events_handler(info=info, block_events=block_events)
+
+    get_mock.assert_not_called()
+
+
+async def test_default_new_events_handler_order(
+    monkeypatch: MonkeyPatch, mongomock_client: MongoClient
+):
+    handled = []
+
+    @dataclass
+    class SampleEvent(BaseEvent):
+        index: int
+
+        async def handle(self, info, block, starknet_event):
+            handled.append(self.index)
+
+    class Plan:
+        def parse(self, starknet_event):
+            return starknet_event.log_index
+
+        def block_numbers(self, python_data):
+            return []
+
+        async def decode(self, info, block, starknet_event, python_data):
+            # The first events take longer to decode
+            await asyncio.sleep(0.01 * (5 - python_data))
+            return {"index": python_data}
+
+    async def get_plan(event_class, info, starknet_event):
+        return Plan()
+
+    monkeypatch.setattr(handler.decoder_registry, "get_plan", get_plan)
+
+    starknet_events = [Mock(log_index=index, address=b"\x01") for index in range(5)]
+    for starknet_event in starknet_events:
+        starknet_event.name = "SampleEvent"
+
+    info = Mock(context={"db": mongomock_client.db})
+    block_events = Mock(events=starknet_events, block=Mock(number=1))
+
+    await handler.default_new_events_handler(
+        info=info,
+        block_events=block_events,
+        event_classes={"SampleEvent": SampleEvent},
+    )
+
+    assert handled == [0, 1, 2, 3, 4]
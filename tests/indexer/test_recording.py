@@ -0,0 +1,99 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+
+from apibara import Info
+from apibara.model import BlockHeader, NewEvents, StarkNetEvent
+from pymongo import MongoClient
+from pytest import MonkeyPatch
+
+from dao.indexer import recording
+from dao.indexer.daos import Dao, get_dao
+from dao.indexer.deserializer import decoder_registry
+
+ABI = [{"name": "MemberAdded", "type": "event", "keys": [], "data": []}]
+
+
+def new_events(number: int) -> NewEvents:
+    return NewEvents(
+        block=BlockHeader(
+            hash=number.to_bytes(32, "big"),
+            parent_hash=(number - 1).to_bytes(32, "big"),
+            number=number,
+            timestamp=datetime(2022, 11, 18, 0, number),
+        ),
+        events=[
+            StarkNetEvent(
+                address=b"\x0d\xa0",
+                log_index=index,
+                topics=[b"\x01"],
+                data=[b"\x02", index.to_bytes(32, "big")],
+                transaction_hash=b"\x03",
+                name="MemberAdded",
+            )
+            for index in range(2)
+        ],
+    )
+
+
+async def test_record_and_replay(
+    tmp_path, monkeypatch: MonkeyPatch, mongomock_client: MongoClient
+):
+    path = tmp_path / "recording.jsonl.gz"
+    get_contract_mock = AsyncMock(return_value=Mock(data=Mock(abi=ABI)))
+    monkeypatch.setattr(decoder_registry, "get_contract", get_contract_mock)
+
+    inner_handler = AsyncMock()
+    recorder = recording.EventsRecorder(path, event_classes={})
+    handler = recording.recording_handler(recorder, inner_handler)
+
+    blocks = [new_events(1), new_events(2)]
+    # A DAO whose bank isn't the configured one
+    dao = Dao(address=b"\x0d\xa0", bank_address=b"\x0b")
+    info = Info(context={"daos": {dao.address: dao}}, storage=None)
+    for block_events in blocks:
+        await handler(info, block_events)
+    recorder.close()
+
+    assert inner_handler.call_count == 2
+    # The contract is only recorded once
+    get_contract_mock.assert_awaited_once()
+    assert [entry["type"] for entry in recording.read_recording(path)] == [
+        "contract",
+        "dao",
+        "block",
+        "block",
+    ]
+
+    add_contract_mock = Mock()
+    monkeypatch.setattr(decoder_registry, "add_contract", add_contract_mock)
+    monkeypatch.setattr(recording, "Contract", Mock())
+    replayed_handler = AsyncMock()
+
+    replayed = await recording.replay(
+        path, mongomock_client.db, new_events_handler=replayed_handler
+    )
+
+    assert replayed == 2
+    add_contract_mock.assert_called_once()
+    assert [call.args[1] for call in replayed_handler.call_args_list] == blocks
+    replayed_info = replayed_handler.call_args.args[0]
+    assert get_dao(replayed_info, blocks[0].events[0]) == dao
+
+
+def test_read_truncated_recording(tmp_path):
+    path = tmp_path / "recording.jsonl.gz"
+    recorder = recording.EventsRecorder(path)
+    for number in range(1, 4):
+        # pylint: disable=protected-access
+        recorder._write(
+            {"type": "block", "block": recording.encode_block(new_events(number).block)}
+        )
+        recorder._file.flush()
+    content = path.read_bytes()
+    recorder.close()
+
+    # The recorder stopped without writing the end of the gzip file
+    path.write_bytes(content)
+
+    entries = list(recording.read_recording(path))
+    assert [entry["block"]["number"] for entry in entries] == [1, 2, 3]
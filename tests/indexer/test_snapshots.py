@@ -0,0 +1,76 @@
+from pymongo import MongoClient
+
+from dao.indexer import undo
+from dao.indexer.batch import BlockBatch
+from dao.indexer.snapshots import (
+    Snapshots,
+    find_snapshot,
+    list_snapshots,
+    restore_snapshot,
+    write_snapshot,
+)
+
+
+async def index_block(db, block_number: int):
+    batch = BlockBatch(db=db, block_number=block_number)
+    if block_number == 1:
+        await batch.insert_one("members", {"memberAddress": b"\x01", "shares": 0})
+    else:
+        await batch.find_one_and_update(
+            "members", {"memberAddress": b"\x01"}, {"$inc": {"shares": 1}}
+        )
+    await batch.insert_one("votes", {"proposalId": 1, "shares": block_number})
+    await batch.insert_one("transactions", {"amount": block_number})
+    await batch.insert_one("events", {"blockNumber": block_number})
+    await batch.flush()
+
+
+async def test_write_and_restore_snapshot(mongomock_client: MongoClient, tmp_path):
+    db = mongomock_client.db
+    for block_number in (1, 2):
+        await index_block(db, block_number)
+
+    path = write_snapshot(db, tmp_path, block_number=2)
+    current_members = list(db.members.find({"_chain.valid_to": None}))
+    votes = list(db.votes.find())
+    transactions = list(db.transactions.find())
+
+    await index_block(db, 3)
+    db["_apibara"].insert_one({"indexer_id": "test", "indexed_to": 3})
+
+    assert restore_snapshot(db, path, indexer_id="test") == 2
+
+    # Only the current version of the documents is restored
+    assert list(db.members.find()) == current_members
+    assert list(db.votes.find()) == votes
+    assert list(db.transactions.find()) == transactions
+    assert [event["blockNumber"] for event in db.events.find()] == [1, 2]
+    assert db["_apibara"].find_one({"indexer_id": "test"})["indexed_to"] == 2
+    assert db["_undo"].count_documents({}) == 0
+    assert undo.get_flushed(db) == 2
+
+    # A new replica
+    replica = mongomock_client.replica
+    restore_snapshot(replica, find_snapshot(tmp_path), indexer_id="test")
+    assert list(replica.members.find()) == current_members
+    # With the history of the votes and transactions, not the raw events
+    assert list(replica.votes.find()) == votes
+    assert list(replica.transactions.find()) == transactions
+    assert "events" not in replica.list_collection_names()
+    assert replica["_apibara"].find_one({"indexer_id": "test"})["indexed_to"] == 2
+
+
+async def test_snapshots_interval(mongomock_client: MongoClient, tmp_path):
+    db = mongomock_client.db
+    snapshots = Snapshots(directory=tmp_path, interval=2, keep=2)
+
+    for block_number in range(1, 8):
+        await index_block(db, block_number)
+        snapshots.end_block(db, block_number)
+
+    assert [path.name for path in list_snapshots(tmp_path)] == [
+        "snapshot-000000000005.bson.gz",
+        "snapshot-000000000007.bson.gz",
+    ]
+    # The interval is counted from the last snapshot after a restart
+    assert Snapshots(directory=tmp_path, interval=2, keep=2).last_block == 7
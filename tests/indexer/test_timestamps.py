@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock, call
+
+from apibara.model import BlockHeader
+from pymongo import MongoClient
+from pytest import MonkeyPatch
+from starknet_py.net.client_models import GatewayBlock
+
+from dao import utils
+from dao.indexer.timestamps import BlockTimestamps
+
+TIMESTAMP = datetime(2022, 11, 18, tzinfo=timezone.utc)
+
+
+def gateway_block(block_number: int) -> Mock:
+    return Mock(
+        spec=GatewayBlock,
+        block_number=block_number,
+        timestamp=int(TIMESTAMP.timestamp()) + block_number,
+    )
+
+
+async def test_block_timestamps(
+    mongomock_client: MongoClient, monkeypatch: MonkeyPatch
+):
+    get_block_mock = AsyncMock(
+        side_effect=lambda block_number, client: gateway_block(block_number)
+    )
+    monkeypatch.setattr(utils, "get_block", get_block_mock)
+
+    client = Mock()
+    block_timestamps = BlockTimestamps(db=mongomock_client.db, client=client)
+    block = BlockHeader(
+        hash=b"\x01", parent_hash=b"\x00", number=1, timestamp=TIMESTAMP
+    )
+    block_timestamps.record(block)
+
+    assert await block_timestamps.get(1) == TIMESTAMP
+    get_block_mock.assert_not_called()
+
+    await block_timestamps.prefetch([1, 2, 3, 3])
+    assert get_block_mock.call_count == 2
+    get_block_mock.assert_has_calls(
+        [
+            call(block_number=2, client=client),
+            call(block_number=3, client=client),
+        ],
+        any_order=True,
+    )
+
+    assert await block_timestamps.get(3) == datetime.fromtimestamp(
+        TIMESTAMP.timestamp() + 3, timezone.utc
+    )
+    assert get_block_mock.call_count == 2
+
+    new = block_timestamps.take_new()
+    assert sorted(doc["number"] for doc in new) == [1, 2, 3]
+    assert not block_timestamps.take_new()
+
+
+async def test_block_timestamps_load(
+    mongomock_client: MongoClient, monkeypatch: MonkeyPatch
+):
+    get_block_mock = AsyncMock()
+    monkeypatch.setattr(utils, "get_block", get_block_mock)
+
+    mongomock_client.db.block_timestamps.insert_one(
+        {
+            "number": 5,
+            "timestamp": TIMESTAMP,
+            "_chain": {"valid_from": 5, "valid_to": None},
+        }
+    )
+
+    block_timestamps = BlockTimestamps(db=mongomock_client.db, client=Mock())
+    block_timestamps.load()
+
+    assert await block_timestamps.get(5) == TIMESTAMP
+    get_block_mock.assert_not_called()
+
+
+async def test_block_timestamps_prefetch_concurrency(
+    mongomock_client: MongoClient, monkeypatch: MonkeyPatch
+):
+    running = 0
+    max_running = 0
+
+    async def get_block(block_number, client):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return gateway_block(block_number)
+
+    monkeypatch.setattr(utils, "get_block", get_block)
+
+    block_timestamps = BlockTimestamps(db=mongomock_client.db, client=Mock())
+    await block_timestamps.prefetch(range(10), semaphore=asyncio.Semaphore(3))
+
+    assert max_running == 3
+    assert len(block_timestamps.take_new()) == 10
@@ -0,0 +1,94 @@
+from datetime import datetime, timezone
+
+from pymongo import MongoClient
+
+from dao.graphql import storage as graphql_storage
+from dao.indexer import storage
+
+TIMESTAMP = datetime(2022, 11, 18, tzinfo=timezone.utc)
+
+
+def transaction(amount: int) -> dict:
+    return {"tokenAddress": b"\x0c", "timestamp": TIMESTAMP, "amount": amount}
+
+
+def test_init_transactions(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    graphql_storage.init_db(db)
+    # A member receiving a transfer during blocks 1 and 3, and a bank from before
+    # the documents were partitioned by DAO
+    db.members.insert_many(
+        [
+            {
+                "daoAddress": b"\x01",
+                "memberAddress": b"\x0a",
+                "transactions": [transaction(1)],
+                "_chain": {"valid_from": 1, "valid_to": 3},
+            },
+            {
+                "daoAddress": b"\x01",
+                "memberAddress": b"\x0a",
+                "transactions": [transaction(1), transaction(2)],
+                "_chain": {"valid_from": 3, "valid_to": None},
+            },
+        ]
+    )
+    db.bank.insert_one(
+        {
+            "bankAddress": b"\x0b",
+            "transactions": [transaction(-3), transaction(4)],
+            "_chain": {"valid_from": 2, "valid_to": None},
+        }
+    )
+    db.transactions.insert_one(
+        {
+            "ownerAddress": b"\x0b",
+            **transaction(5),
+            "blockNumber": 4,
+            "transactionHash": b"\x04",
+            "eventIndex": 0,
+            "_chain": {"valid_from": 4, "valid_to": None},
+        }
+    )
+
+    # Run twice, like a migration interrupted before removing the arrays
+    storage.init_transactions(db)
+    db.members.update_many({}, {"$set": {"transactions": [transaction(1)]}})
+    db.members.update_one(
+        {"_chain.valid_to": None},
+        {"$set": {"transactions": [transaction(1), transaction(2)]}},
+    )
+    storage.init_transactions(db)
+
+    transactions = db.transactions.find(
+        {}, projection={"_id": 0, "tokenAddress": 0, "timestamp": 0}
+    ).sort([("ownerAddress", 1), ("blockNumber", 1)])
+    assert list(transactions) == [
+        {
+            "daoAddress": b"\x01",
+            "ownerAddress": b"\x0a",
+            "amount": amount,
+            "blockNumber": block_number,
+            "_chain": {"valid_from": block_number, "valid_to": None},
+        }
+        for amount, block_number in ((1, 1), (2, 3))
+    ] + [
+        {
+            "ownerAddress": b"\x0b",
+            "amount": amount,
+            "blockNumber": 2,
+            "_chain": {"valid_from": 2, "valid_to": None},
+        }
+        for amount in (-3, 4)
+    ] + [
+        {
+            "ownerAddress": b"\x0b",
+            "amount": 5,
+            "blockNumber": 4,
+            "transactionHash": b"\x04",
+            "eventIndex": 0,
+            "_chain": {"valid_from": 4, "valid_to": None},
+        }
+    ]
+    assert not db.members.find_one({"transactions": {"$exists": True}})
+    assert not db.bank.find_one({"transactions": {"$exists": True}})
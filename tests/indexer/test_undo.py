@@ -0,0 +1,202 @@
+from unittest.mock import Mock
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
+from pytest import MonkeyPatch
+
+from dao.indexer import storage, undo
+from dao.indexer.batch import COPY_VERSIONING, DELTA_VERSIONING, BlockBatch
+from dao.indexer.main import on_invalidate, replace_invalidate
+
+
+def test_delta_update():
+    old = {
+        "_id": 1,
+        "shares": 1,
+        "roles": ["admin"],
+        "proposal": {"id": 1, "status": "submitted"},
+        "jailedAt": None,
+    }
+    new = {
+        "_id": 1,
+        "shares": 2,
+        "roles": ["admin"],
+        "proposal": {"id": 1, "status": "approved"},
+        "loot": 3,
+    }
+
+    update, undo_entry = undo.delta_update(old, new)
+
+    assert update == {
+        "$set": {"loot": 3, "proposal.status": "approved", "shares": 2},
+        "$unset": {"jailedAt": ""},
+    }
+    assert undo_entry == {
+        "set": [["jailedAt", None], ["proposal.status", "submitted"], ["shares", 1]],
+        "unset": ["loot"],
+    }
+
+
+async def test_delta_versioning_rollback(mongomock_client: MongoClient):
+    db = mongomock_client.db
+
+    batch = BlockBatch(db=db, block_number=1, versioning=DELTA_VERSIONING)
+    await batch.insert_one("members", {"memberAddress": b"\x01", "shares": 1})
+    await batch.flush()
+
+    for block_number in (2, 3):
+        batch = BlockBatch(
+            db=db, block_number=block_number, versioning=DELTA_VERSIONING
+        )
+        await batch.find_one_and_update(
+            "members",
+            {"memberAddress": b"\x01"},
+            {"$inc": {"shares": 1}, "$push": {"roles": f"role{block_number}"}},
+        )
+        await batch.insert_one("members", {"memberAddress": bytes([block_number])})
+        await batch.flush()
+
+    # Only the current version is stored
+    members = list(db.members.find({"memberAddress": b"\x01"}, {"_id": 0}))
+    assert members == [
+        {
+            "memberAddress": b"\x01",
+            "shares": 3,
+            "roles": ["role2", "role3"],
+            "_chain": {"valid_from": 1, "valid_to": None},
+        }
+    ]
+    assert db["_undo"].count_documents({}) == 5
+
+    undo.rollback(db, block_number=1)
+
+    members = list(db.members.find({}, {"_id": 0}))
+    assert members == [
+        {
+            "memberAddress": b"\x01",
+            "shares": 1,
+            "_chain": {"valid_from": 1, "valid_to": None},
+        }
+    ]
+    assert db["_undo"].count_documents({}) == 1
+
+
+def snapshot(db) -> dict:
+    return {
+        collection: sorted(db[collection].find(), key=lambda doc: doc["_id"])
+        for collection in db.list_collection_names()
+        if not collection.startswith("_")
+    }
+
+
+async def index_blocks(db, versioning: str, last_block: int) -> dict[int, dict]:
+    """Index a member updated by every block, returns the state after each
+    block"""
+    snapshots = {}
+    for block_number in range(1, last_block + 1):
+        batch = BlockBatch(db=db, block_number=block_number, versioning=versioning)
+        if block_number == 1:
+            await batch.insert_one("members", {"memberAddress": b"\x01", "shares": 0})
+        else:
+            await batch.find_one_and_update(
+                "members", {"memberAddress": b"\x01"}, {"$inc": {"shares": 1}}
+            )
+        await batch.insert_one("events", {"blockNumber": block_number})
+        await batch.flush()
+        snapshots[block_number] = snapshot(db)
+    return snapshots
+
+
+@pytest.mark.parametrize("versioning", [COPY_VERSIONING, DELTA_VERSIONING])
+@pytest.mark.parametrize("depth", [1, 3, 9])
+async def test_reorg_rollback(mongomock_client: MongoClient, versioning, depth):
+    db = mongomock_client.db
+    snapshots = await index_blocks(db, versioning, last_block=10)
+
+    assert undo.is_journaled(db, 10 - depth)
+    storage.invalidate(db, 10 - depth)
+
+    assert snapshot(db) == snapshots[10 - depth]
+    assert not db["_undo"].find_one({"block": {"$gt": 10 - depth}})
+
+
+@pytest.mark.parametrize("versioning", [COPY_VERSIONING, DELTA_VERSIONING])
+async def test_apibara_invalidate(mongomock_client: MongoClient, versioning):
+    db = mongomock_client.db
+    snapshots = await index_blocks(db, versioning, last_block=3)
+    db["_apibara"].insert_one({"indexer_id": "test", "indexed_to": 3})
+
+    apibara_storage = Mock()
+    callback = Mock()
+    replace_invalidate(apibara_storage, db, "test")
+    on_invalidate(apibara_storage, callback)
+
+    # Block 3 is reorganized, apibara invalidates it and the blocks after it
+    apibara_storage.invalidate(3)
+
+    callback.assert_called_once_with(3)
+    assert snapshot(db) == snapshots[2]
+    assert undo.get_flushed(db) == 2
+    assert db["_apibara"].find_one({"indexer_id": "test"})["indexed_to"] == 2
+
+    # The block replacing it isn't skipped
+    info = Mock(context={"db": db})
+    assert not await storage.is_block_indexed(info, 3)
+    batch = BlockBatch(db=db, block_number=3, versioning=versioning)
+    await batch.find_one_and_update(
+        "members", {"memberAddress": b"\x01"}, {"$inc": {"shares": 5}}
+    )
+    await batch.flush()
+    assert await storage.is_block_indexed(info, 3)
+    assert db.members.find_one({"_chain.valid_to": None})["shares"] == 6
+
+
+async def test_invalidate_without_undo_log(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    snapshots = await index_blocks(db, COPY_VERSIONING, last_block=5)
+    # Blocks indexed before the undo log existed
+    db["_undo"].delete_many({})
+
+    assert not undo.is_journaled(db, 2)
+    storage.invalidate(db, 2)
+
+    assert snapshot(db) == snapshots[2]
+    assert undo.get_flushed(db) == 2
+
+
+@pytest.mark.parametrize("versioning", [COPY_VERSIONING, DELTA_VERSIONING])
+async def test_recover_interrupted_flush(
+    mongomock_client: MongoClient, monkeypatch: MonkeyPatch, versioning
+):
+    db = mongomock_client.db
+    snapshots = await index_blocks(db, versioning, last_block=2)
+    assert undo.get_flushed(db) == 2
+
+    async def index_block_3(flush_error=None):
+        batch = BlockBatch(db=db, block_number=3, versioning=versioning)
+        await batch.find_one_and_update(
+            "members", {"memberAddress": b"\x01"}, {"$inc": {"shares": 1}}
+        )
+        await batch.insert_one("events", {"blockNumber": 3})
+        if flush_error is not None:
+            monkeypatch.setattr(
+                batch, "_insert_appended", Mock(side_effect=flush_error)
+            )
+        await batch.flush()
+
+    # The state of block 3 is written but not its events
+    with pytest.raises(ConnectionFailure):
+        await index_block_3(flush_error=ConnectionFailure())
+
+    info = Mock(context={"db": db})
+    assert not await storage.is_block_indexed(info, 3)
+
+    undo.recover(db)
+    assert snapshot(db) == snapshots[2]
+
+    # Received again, the update is applied once
+    await index_block_3()
+    assert await storage.is_block_indexed(info, 3)
+    assert db.members.find_one({"_chain.valid_to": None})["shares"] == 2
+    assert db.events.count_documents({"blockNumber": 3}) == 1
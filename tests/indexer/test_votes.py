@@ -0,0 +1,142 @@
+# pylint: disable=redefined-outer-name
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+from unittest.mock import Mock
+
+import pytest
+from apibara import Info
+from pymongo import MongoClient
+
+from dao.indexer import storage
+from dao.indexer.batch import BlockBatch
+from dao.indexer.daos import Dao, DaoStorage
+from dao.indexer.members import MemberUpdated, VoteSubmitted
+
+from ..conftest import BlockHeaderFactory
+
+IndexBlock = Callable[[int, list], Awaitable[None]]
+
+
+def vote(address: bytes, vote_: bool) -> VoteSubmitted:
+    return VoteSubmitted(
+        callerAddress=address, proposalId=1, vote=vote_, onBehalfAddress=address
+    )
+
+
+def current_proposal(db) -> dict:
+    return db.proposals.find_one(
+        {"_chain.valid_to": None},
+        {"_id": 0, "yesVoters": 1, "yesVotesTotal": 1, "noVotesTotal": 1},
+    )
+
+
+@pytest.fixture
+def index_block(
+    mongomock_client: MongoClient, dao: Dao, block_header: BlockHeaderFactory
+) -> IndexBlock:
+    db = mongomock_client.db
+
+    async def _index_block(block_number: int, events: list):
+        batch = BlockBatch(db=db, block_number=block_number)
+        info = Info(context={"db": db}, storage=DaoStorage(batch, dao))
+        for index, event in enumerate(events):
+            starknet_event = Mock(transaction_hash=b"\x01", log_index=index)
+            await event._handle(info, block_header(block_number), starknet_event)
+        await batch.flush()
+
+    return _index_block
+
+
+async def test_vote_submitted(
+    mongomock_client: MongoClient, dao: Dao, index_block: IndexBlock
+):
+    db = mongomock_client.db
+    chain = {"valid_from": 1, "valid_to": None}
+    db.proposals.insert_one(
+        {
+            "daoAddress": dao.address,
+            "id": 1,
+            "yesVotesTotal": 0,
+            "noVotesTotal": 0,
+            "_chain": chain,
+        }
+    )
+    db.members.insert_many(
+        [
+            {
+                "daoAddress": dao.address,
+                "memberAddress": address,
+                "shares": shares,
+                "loot": 0,
+                "_chain": chain,
+            }
+            for address, shares in ((b"\x0a", 10), (b"\x0c", 3))
+        ]
+    )
+
+    await index_block(2, [vote(b"\x0a", True), vote(b"\x0c", False)])
+    # The votes keep the shares the members had when voting
+    await index_block(
+        3,
+        [
+            MemberUpdated(
+                memberAddress=b"\x0a",
+                delegateAddress=b"\x0a",
+                shares=1,
+                loot=0,
+                jailed=False,
+                lastProposalYesVote=1,
+                onboardedAt=1,
+            )
+        ],
+    )
+
+    assert current_proposal(db) == {
+        "yesVoters": [b"\x0a"],
+        "yesVotesTotal": 10,
+        "noVotesTotal": 3,
+    }
+    votes = db.votes.find({}, {"_id": 0, "voterAddress": 1, "vote": 1, "shares": 1})
+    assert list(votes) == [
+        {"voterAddress": b"\x0a", "vote": True, "shares": 10},
+        {"voterAddress": b"\x0c", "vote": False, "shares": 3},
+    ]
+    assert db.votes.find_one({})["votedAt"].replace(tzinfo=timezone.utc) == (
+        datetime(2022, 11, 18, 0, 2, tzinfo=timezone.utc)
+    )
+
+    storage.invalidate(db, 1)
+    assert current_proposal(db) == {"yesVotesTotal": 0, "noVotesTotal": 0}
+    assert db.votes.count_documents({}) == 0
+
+
+def test_init_proposal_vote_totals(mongomock_client: MongoClient, dao: Dao):
+    db = mongomock_client.db
+    chain = {"valid_from": 1, "valid_to": None}
+    db.proposals.insert_one(
+        {
+            "daoAddress": dao.address,
+            "id": 1,
+            "yesVoters": [b"\x0a", b"\x0c"],
+            "noVoters": [b"\x0d"],
+            "_chain": chain,
+        }
+    )
+    db.members.insert_many(
+        [
+            {
+                "daoAddress": dao.address,
+                "memberAddress": address,
+                "shares": shares,
+                "_chain": chain,
+            }
+            for address, shares in ((b"\x0a", 10), (b"\x0c", 3), (b"\x0d", 4))
+        ]
+        # The same member in another DAO
+        + [{"daoAddress": b"\x02", "memberAddress": b"\x0a", "shares": 100}]
+    )
+
+    storage.init_proposal_vote_totals(db)
+
+    proposal = current_proposal(db)
+    assert (proposal["yesVotesTotal"], proposal["noVotesTotal"]) == (13, 4)
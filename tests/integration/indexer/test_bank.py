@@ -116,6 +116,17 @@ async def test_token_unwhitelisted(
     }
 
 
+def get_transactions(mongo_db, owner_address: int) -> list[dict]:
+    return list(
+        mongo_db["transactions"]
+        .find(
+            {"ownerAddress": utils.int_to_bytes(owner_address)},
+            {"_id": 0, "tokenAddress": 1, "timestamp": 1, "amount": 1},
+        )
+        .sort([("timestamp", 1), ("blockNumber", 1), ("eventIndex", 1)])
+    )
+
+
 @pytest.mark.parametrize(
     "member_address", [constants.ACCOUNT_ADDRESS, config.bank_address]
 )
@@ -163,12 +174,12 @@ async def test_balance_increased(
         bank = list(mongo_db["bank"].find({"_chain.valid_to": None}))
         assert len(bank) == 1
         balances = bank[0]["balances"]
-        transactions = bank[0]["transactions"]
     else:
         members = list(mongo_db["members"].find({"_chain.valid_to": None}))
         assert len(members) == 1
         balances = members[0]["balances"]
-        transactions = members[0]["transactions"]
+
+    transactions = get_transactions(mongo_db, member_address)
 
     assert balances == [
         {
@@ -234,12 +245,12 @@ async def test_balance_decreased(
         bank = list(mongo_db["bank"].find({"_chain.valid_to": None}))
         assert len(bank) == 1
         balances = bank[0]["balances"]
-        transactions = bank[0]["transactions"]
     else:
         members = list(mongo_db["members"].find({"_chain.valid_to": None}))
         assert len(members) == 1
         balances = members[0]["balances"]
-        transactions = members[0]["transactions"]
+
+    transactions = get_transactions(mongo_db, member_address)
 
     assert balances == [
         {
@@ -345,12 +356,12 @@ async def test_balance_changes_multiple_times(
         bank = list(mongo_db["bank"].find({"_chain.valid_to": None}))
         assert len(bank) == 1
         balances = bank[0]["balances"]
-        transactions = bank[0]["transactions"]
     else:
         members = list(mongo_db["members"].find({"_chain.valid_to": None}))
         assert len(members) == 1
         balances = members[0]["balances"]
-        transactions = members[0]["transactions"]
+
+    transactions = get_transactions(mongo_db, member_address)
 
     assert balances == [
         {
@@ -1,12 +1,14 @@
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, MagicMock, Mock
 
 from apibara.model import EventFilter
 from click.testing import CliRunner
 from pytest import LogCaptureFixture, MonkeyPatch
 
 from dao import config, utils
+from dao.graphql import explain
 from dao.graphql import main as graphql_main
 from dao.indexer import main as indexer_main
+from dao.indexer.daos import Dao
 from dao.main import cli
 
 
@@ -68,8 +70,13 @@ def test_start_indexer(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture):
         mongo_url=config.mongo_url,
         starknet_network_url=config.starknet_network_url,
         filters=filters,
+        daos=[Dao.from_hex(contract_address)],
         restart=True,
         ssl=True,
+        backfill=False,
+        record=None,
+        snapshot_dir=None,
+        from_snapshot=None,
     )
 
     assert result.exit_code == 0
@@ -118,3 +125,30 @@ def test_start_graphql(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture):
         mongo_url=config.mongo_url, db_name=db_name, host=host, port=int(port)
     )
     assert result.exit_code == 0
+
+
+def test_check_indexes(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture):
+    # Workaround a Click testing bug
+    # See https://github.com/pallets/click/issues/824#issuecomment-562581313
+    caplog.set_level(10000)
+
+    runner = CliRunner()
+
+    check_indexes_mock = AsyncMock(
+        return_value=[
+            (explain.Query(name="list_members", collection="members"), ["index"]),
+            (explain.Query(name="load_totals", collection="members"), []),
+        ]
+    )
+    monkeypatch.setattr(explain, "check_indexes", check_indexes_mock)
+    monkeypatch.setattr("dao.main.MongoClient", MagicMock())
+
+    result = runner.invoke(cli, ["check-indexes", "--dao-address", "0x01"])
+
+    assert check_indexes_mock.call_args.args[1] == b"\x01"
+    assert result.output.splitlines() == [
+        "list_members: members index",
+        "load_totals: members COLLSCAN",
+        "Error: 1 queries scan their collection",
+    ]
+    assert result.exit_code == 1
@@ -1,6 +1,7 @@
 from datetime import timedelta
 from unittest.mock import Mock
 
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo import MongoClient
 
 from dao import utils
@@ -9,10 +10,12 @@ from dao.graphql import storage
 from . import data
 
 
-def test_list_members(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_members(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
-    members = storage.list_members(info)
+    members = await storage.list_members(info)
 
     assert not list(members)
 
@@ -23,19 +26,22 @@ def test_list_members(mongomock_client: MongoClient):
     ]
     mongomock_client.db.members.insert_many(new_members)
 
-    members = storage.list_members(info)
+    members = await storage.list_members(info)
 
     assert list(members) == new_members
 
 
-def test_list_members_query(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_members_query(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
     now = utils.utcnow()
 
+    # Members are listed by onboarding time
     onboarded_before_members = [
-        {"memberAddress": "0x1", "onboardedAt": now},
         {"memberAddress": "0x2", "onboardedAt": now - timedelta(days=1)},
+        {"memberAddress": "0x1", "onboardedAt": now},
     ]
     onboarded_after_members = [
         {"memberAddress": "0x3", "onboardedAt": now + timedelta(days=1)},
@@ -47,18 +53,20 @@ def test_list_members_query(mongomock_client: MongoClient):
 
     query = {"onboardedAt": {"$lte": now}}
 
-    members = storage.list_members(info, filter=query)
+    members = await storage.list_members(info, filter=query)
 
     assert list(members) == onboarded_before_members
 
 
-def test_list_votable_members(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_votable_members(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
     submitted_at = utils.utcnow()
     voting_period_ending_at = submitted_at + timedelta(days=7)
 
-    members = storage.list_votable_members(
+    members = await storage.list_votable_members(
         info=info,
         voting_period_ending_at=voting_period_ending_at,
         submitted_at=submitted_at,
@@ -73,7 +81,9 @@ def test_list_votable_members(mongomock_client: MongoClient):
     ]
     mongomock_client.db.members.insert_many(new_members)
 
-    members = storage.list_votable_members(
+    # The lookups are cached for the duration of a request
+    info = Mock(context={"db": async_mongomock_db})
+    members = await storage.list_votable_members(
         info=info,
         voting_period_ending_at=voting_period_ending_at,
         submitted_at=submitted_at,
@@ -82,8 +92,10 @@ def test_list_votable_members(mongomock_client: MongoClient):
     assert list(members) == new_members
 
 
-def test_list_votable_members_onboarded_at(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_votable_members_onboarded_at(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
     submitted_at = utils.utcnow()
     voting_period_ending_at = submitted_at + timedelta(days=7)
@@ -105,7 +117,7 @@ def test_list_votable_members_onboarded_at(mongomock_client: MongoClient):
     all_members = votable_members + non_votable_members
     mongomock_client.db.members.insert_many(all_members)
 
-    members = storage.list_votable_members(
+    members = await storage.list_votable_members(
         info=info,
         voting_period_ending_at=voting_period_ending_at,
         submitted_at=submitted_at,
@@ -114,8 +126,10 @@ def test_list_votable_members_onboarded_at(mongomock_client: MongoClient):
     assert list(members) == votable_members
 
 
-def test_list_votable_members_jailed_at(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_votable_members_jailed_at(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
     submitted_at = utils.utcnow()
     voting_period_ending_at = submitted_at + timedelta(days=7)
@@ -168,7 +182,7 @@ def test_list_votable_members_jailed_at(mongomock_client: MongoClient):
     all_members = votable_members + non_votable_members
     mongomock_client.db.members.insert_many(all_members)
 
-    members = storage.list_votable_members(
+    members = await storage.list_votable_members(
         info=info,
         voting_period_ending_at=voting_period_ending_at,
         submitted_at=submitted_at,
@@ -177,8 +191,10 @@ def test_list_votable_members_jailed_at(mongomock_client: MongoClient):
     assert list(members) == votable_members
 
 
-def test_list_votable_members_exited_at(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_votable_members_exited_at(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
     submitted_at = utils.utcnow()
     voting_period_ending_at = submitted_at + timedelta(days=7)
@@ -231,7 +247,7 @@ def test_list_votable_members_exited_at(mongomock_client: MongoClient):
     all_members = votable_members + non_votable_members
     mongomock_client.db.members.insert_many(all_members)
 
-    members = storage.list_votable_members(
+    members = await storage.list_votable_members(
         info=info,
         voting_period_ending_at=voting_period_ending_at,
         submitted_at=submitted_at,
@@ -240,8 +256,10 @@ def test_list_votable_members_exited_at(mongomock_client: MongoClient):
     assert list(members) == votable_members
 
 
-def test_list_votable_members_jailed_at_and_exited_at(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_votable_members_jailed_at_and_exited_at(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
     submitted_at = utils.utcnow()
     voting_period_ending_at = submitted_at + timedelta(days=7)
@@ -306,7 +324,7 @@ def test_list_votable_members_jailed_at_and_exited_at(mongomock_client: MongoCli
     all_members = votable_members + non_votable_members
     mongomock_client.db.members.insert_many(all_members)
 
-    members = storage.list_votable_members(
+    members = await storage.list_votable_members(
         info=info,
         voting_period_ending_at=voting_period_ending_at,
         submitted_at=submitted_at,
@@ -315,20 +333,21 @@ def test_list_votable_members_jailed_at_and_exited_at(mongomock_client: MongoCli
     assert list(members) == votable_members
 
 
-def test_list_proposals(mongomock_client: MongoClient):
-    info = Mock(context={"db": mongomock_client.db})
+async def test_list_proposals(
+    mongomock_client: MongoClient, async_mongomock_db: AsyncIOMotorDatabase
+):
+    info = Mock(context={"db": async_mongomock_db})
 
     mongomock_client.db.proposals.insert_many(data.PROPOSALS)
     mongomock_client.db.members.insert_many(data.MEMBERS)
 
-    proposals = storage.list_proposals(info)
+    proposals = await storage.list_proposals(info)
     proposals = list(proposals)
 
     # Remove MongoDB auto generated _id from the result to be able to compare it
     # to the expected one
     for proposal in proposals:
         del proposal["_id"]
-        for member in proposal["yesVotersMembers"] + proposal["noVotersMembers"]:
-            del member["_id"]
 
-    assert proposals == data.mongo_expected.LIST_PROPOSALS
+    # Newest first, the proposals are submitted at the same time
+    assert proposals == data.mongo_expected.LIST_PROPOSALS[::-1]
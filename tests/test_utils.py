@@ -0,0 +1,128 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+from cachetools import LRUCache
+from starknet_py.net.gateway_client import GatewayClient
+
+from dao import utils
+
+
+async def test_async_cached_single_flight():
+    calls = []
+
+    @utils.async_cached(cache=LRUCache(maxsize=10))
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    results = await asyncio.gather(*(fetch(1) for _ in range(5)), fetch(2))
+
+    assert results == [2, 2, 2, 2, 2, 4]
+    assert calls == [1, 2]
+    assert await fetch(1) == 2
+    assert fetch.cache_stats.as_dict() == {"hits": 1, "misses": 2, "coalesced": 4}
+
+
+async def test_async_cached_leader_cancelled():
+    calls = []
+
+    @utils.async_cached(cache=LRUCache(maxsize=10))
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    leader = asyncio.ensure_future(fetch(1))
+    await asyncio.sleep(0)
+    waiters = asyncio.gather(*(fetch(1) for _ in range(3)))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    # One of the waiting calls calls the function again for the others
+    assert await waiters == [2, 2, 2]
+    assert leader.cancelled()
+    assert calls == [1, 1]
+
+
+async def test_async_cached_leader_interrupted():
+    class Interrupted(BaseException):
+        pass
+
+    error_mock = Mock(side_effect=[Interrupted(), 2])
+
+    @utils.async_cached(cache=LRUCache(maxsize=10))
+    async def fetch(value):
+        await asyncio.sleep(0.01)
+        return error_mock(value)
+
+    leader = asyncio.ensure_future(fetch(1))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(fetch(1))
+
+    with pytest.raises(Interrupted):
+        await leader
+    assert await asyncio.wait_for(waiter, timeout=1) == 2
+    assert error_mock.call_count == 2
+
+
+async def test_async_cached_ttl(monkeypatch: pytest.MonkeyPatch):
+    now = 1000.0
+    monkeypatch.setattr(utils.time, "monotonic", lambda: now)
+    calls = []
+
+    @utils.async_cached(cache=LRUCache(maxsize=10), ttl=5)
+    async def fetch(value):
+        calls.append(value)
+        return value
+
+    await fetch(1)
+    await fetch(1)
+    assert calls == [1]
+
+    now += 5
+    await fetch(1)
+    assert calls == [1, 1]
+
+
+async def test_async_cached_negative_ttl():
+    error_mock = Mock(side_effect=ValueError("not found"))
+
+    @utils.async_cached(cache=LRUCache(maxsize=10), negative_ttl=60)
+    async def fetch(value):
+        return error_mock(value)
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="not found"):
+            await fetch(1)
+
+    error_mock.assert_called_once_with(1)
+
+
+async def test_async_cached_errors_not_cached():
+    error_mock = Mock(side_effect=ValueError("not found"))
+
+    @utils.async_cached(cache=LRUCache(maxsize=10))
+    async def fetch(value):
+        return error_mock(value)
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await fetch(1)
+
+    assert error_mock.call_count == 2
+
+
+async def test_async_cached_without_clients_key():
+    calls = []
+
+    @utils.async_cached(cache=LRUCache(maxsize=10), key=utils.without_clients_key)
+    async def fetch(block_number, client):
+        calls.append(block_number)
+        return block_number
+
+    await fetch(1, client=GatewayClient("http://localhost"))
+    await fetch(1, client=GatewayClient("http://localhost"))
+
+    assert calls == [1]